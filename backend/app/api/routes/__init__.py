@@ -1,3 +1,3 @@
-from . import auth, chat, tasks, calendar, email, voice, search, health, agent, suggestions, notifications
+from . import auth, chat, tasks, calendar, email, voice, search, health, agent, suggestions, notifications, sync, realtime, jobs
 
-__all__ = ["auth", "chat", "tasks", "calendar", "email", "voice", "search", "health", "agent", "suggestions", "notifications"] 
\ No newline at end of file
+__all__ = ["auth", "chat", "tasks", "calendar", "email", "voice", "search", "health", "agent", "suggestions", "notifications", "sync", "realtime", "jobs"] 
\ No newline at end of file
@@ -7,6 +7,7 @@ from datetime import datetime
 from app.core.database import get_db
 from app.models.chat_message import ChatMessage, MessageRole, MessageType
 from app.models.user import User
+from app.models.sync_change import record_reset
 from app.services.ai_service import AIService
 from app.api.dependencies import get_current_user
 
@@ -134,6 +135,7 @@ async def clear_chat_history(
         db.query(ChatMessage).filter(
             ChatMessage.user_id == current_user.id
         ).delete()
+        record_reset(db, current_user.id, "chat_message")
         db.commit()
         return {"message": "Chat history cleared successfully"}
     except Exception as e:
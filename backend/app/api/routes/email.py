@@ -1,14 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session, undefer_group
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
-import requests
 from app.core.database import get_db
+from app.models.email_attachment import EmailAttachment
 from app.models.email_message import EmailMessage
+from app.models.email_thread import EmailThread
+from app.models.outbound_email import OutboundEmail
 from app.models.user import User
 from app.api.dependencies import get_current_user
 from app.core.config import settings
+from app.services.attachments import AttachmentTooLarge, fetch_attachment, list_attachments
+from app.services.gmail_sync import load_gmail_body
+from app.services.mail_outbox import queue_reply
+from app.services.job_queue import enqueue, PRIORITY_INTERACTIVE, PRIORITY_DEFAULT
 import logging
 
 router = APIRouter()
@@ -20,6 +27,7 @@ class EmailMessageResponse(BaseModel):
     recipients: Optional[list]
     body: Optional[str]
     body_plain: Optional[str]
+    body_pending: bool = False
     is_read: bool
     is_important: bool
     is_starred: bool
@@ -40,44 +48,98 @@ class EmailMessagesResponse(BaseModel):
 
 class EmailReplyRequest(BaseModel):
     reply_text: str
-    email_id: str
+    email_id: Optional[str] = None  # Deprecated; the path parameter identifies the email
 
-def refresh_google_token(user: User, db):
-    if not user.google_refresh_token:
-        return False
-    data = {
-        "client_id": settings.GOOGLE_CLIENT_ID,
-        "client_secret": settings.GOOGLE_CLIENT_SECRET,
-        "refresh_token": user.google_refresh_token,
-        "grant_type": "refresh_token",
-    }
-    resp = requests.post("https://oauth2.googleapis.com/token", data=data)
-    if resp.ok:
-        tokens = resp.json()
-        user.update_google_token(tokens["access_token"], tokens["expires_in"])
-        db.commit()
-        return True
-    logging.error(f"Failed to refresh Google token: {resp.text}")
-    return False
+class EmailAttachmentResponse(BaseModel):
+    id: str
+    filename: str
+    content_type: Optional[str]
+    size: Optional[int]
+    is_inline: bool
+    downloaded: bool
+
+class OutboundEmailResponse(BaseModel):
+    id: str
+    email_id: Optional[str]
+    provider: str
+    recipients: Optional[list]
+    subject: Optional[str]
+    status: str
+    attempts: int
+    last_error: Optional[str]
+    created_at: datetime
+    sent_at: Optional[datetime]
 
-def refresh_outlook_token(user: User, db):
-    if not user.outlook_refresh_token:
-        return False
-    data = {
-        "client_id": settings.OUTLOOK_CLIENT_ID,
-        "client_secret": settings.OUTLOOK_CLIENT_SECRET,
-        "refresh_token": user.outlook_refresh_token,
-        "grant_type": "refresh_token",
-        "scope": "https://graph.microsoft.com/.default offline_access",
+class EmailThreadResponse(BaseModel):
+    id: str
+    provider: str
+    thread_id: str
+    subject: str
+    participants: Optional[list]
+    message_count: int
+    unread_count: int
+    last_sender: Optional[str]
+    snippet: Optional[str]
+    last_message_at: datetime
+
+class EmailThreadsResponse(BaseModel):
+    threads: List[EmailThreadResponse]
+    total: int
+    limit: int
+    offset: int
+    has_more: bool
+
+class EmailThreadDetailResponse(EmailThreadResponse):
+    messages: List[EmailMessageResponse]
+
+def _email_response(email: EmailMessage) -> EmailMessageResponse:
+    return EmailMessageResponse(
+        id=email.id,
+        subject=email.subject,
+        sender=email.sender,
+        recipients=email.recipients,
+        body=email.body,
+        body_plain=email.body_plain,
+        body_pending=bool(email.body_pending),
+        is_read=email.is_read,
+        is_important=email.is_important,
+        is_starred=email.is_starred,
+        ai_summary=email.ai_summary,
+        ai_suggested_reply=email.ai_suggested_reply,
+        ai_priority_score=email.ai_priority_score,
+        ai_action_required=email.ai_action_required,
+        received_at=email.received_at,
+        created_at=email.created_at,
+        updated_at=email.updated_at
+    )
+
+def _outbound_response(item: OutboundEmail) -> OutboundEmailResponse:
+    return OutboundEmailResponse(
+        id=item.id,
+        email_id=item.email_id,
+        provider=item.provider,
+        recipients=item.recipients,
+        subject=item.subject,
+        status=item.status,
+        attempts=item.attempts,
+        last_error=item.last_error,
+        created_at=item.created_at,
+        sent_at=item.sent_at
+    )
+
+def _thread_fields(thread: EmailThread) -> dict:
+    return {
+        "id": thread.id,
+        "provider": thread.provider,
+        "thread_id": thread.thread_id,
+        "subject": thread.subject,
+        "participants": thread.participants,
+        "message_count": thread.message_count,
+        "unread_count": thread.unread_count,
+        "last_sender": thread.last_sender,
+        "snippet": thread.snippet,
+        "last_message_at": thread.last_message_at
     }
-    resp = requests.post("https://login.microsoftonline.com/common/oauth2/v2.0/token", data=data)
-    if resp.ok:
-        tokens = resp.json()
-        user.update_outlook_token(tokens["access_token"], tokens["expires_in"])
-        db.commit()
-        return True
-    logging.error(f"Failed to refresh Outlook token: {resp.text}")
-    return False
 
 @router.get("/", response_model=EmailMessagesResponse)
 async def get_emails(
@@ -97,35 +159,111 @@ async def get_emails(
     total = query.count()
     
     # Apply pagination
-    emails = query.order_by(EmailMessage.received_at.desc()).offset(offset).limit(limit).all()
+    emails = query.options(undefer_group("body")).order_by(
+        EmailMessage.received_at.desc()
+    ).offset(offset).limit(limit).all()
     
     return EmailMessagesResponse(
-        emails=[
-            EmailMessageResponse(
-                id=email.id,
-                subject=email.subject,
-                sender=email.sender,
-                recipients=email.recipients,
-                body=email.body,
-                body_plain=email.body_plain,
-                is_read=email.is_read,
-                is_important=email.is_important,
-                is_starred=email.is_starred,
-                ai_summary=email.ai_summary,
-                ai_suggested_reply=email.ai_suggested_reply,
-                ai_priority_score=email.ai_priority_score,
-                ai_action_required=email.ai_action_required,
-                received_at=email.received_at,
-                created_at=email.created_at,
-                updated_at=email.updated_at
-            ) for email in emails
-        ],
+        emails=[_email_response(email) for email in emails],
         total=total,
         limit=limit,
         offset=offset,
         has_more=offset + limit < total
     )
 
+@router.get("/sync")
+async def sync_email(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Start a background mailbox sync; poll /api/jobs/{job_id} for progress"""
+    job = enqueue(  # commits
+        db,
+        "email_sync",
+        user_id=current_user.id,
+        priority=PRIORITY_DEFAULT,
+        dedup_key=f"email_sync:{current_user.id}",
+        max_attempts=5
+    )
+    return {"job_id": job.id, "status": job.status}
+
+@router.get("/outbox", response_model=List[OutboundEmailResponse])
+async def get_outbox(
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Recently queued replies and their delivery status"""
+    items = db.query(OutboundEmail).filter(
+        OutboundEmail.user_id == current_user.id
+    ).order_by(OutboundEmail.created_at.desc()).limit(limit).all()
+    return [_outbound_response(item) for item in items]
+
+@router.get("/outbox/{outbound_id}", response_model=OutboundEmailResponse)
+async def get_outbound_email(
+    outbound_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Delivery status of a queued reply"""
+    item = db.query(OutboundEmail).filter(
+        OutboundEmail.id == outbound_id,
+        OutboundEmail.user_id == current_user.id
+    ).first()
+    if not item:
+        raise HTTPException(status_code=404, detail="Outbound email not found")
+    return _outbound_response(item)
+
+@router.get("/threads", response_model=EmailThreadsResponse)
+async def get_threads(
+    unread_only: bool = Query(False),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get conversations, most recently active first"""
+    query = db.query(EmailThread).filter(EmailThread.user_id == current_user.id)
+    
+    if unread_only:
+        query = query.filter(EmailThread.unread_count > 0)
+    
+    total = query.count()
+    threads = query.order_by(
+        EmailThread.last_message_at.desc()
+    ).offset(offset).limit(limit).all()
+    
+    return EmailThreadsResponse(
+        threads=[EmailThreadResponse(**_thread_fields(thread)) for thread in threads],
+        total=total,
+        limit=limit,
+        offset=offset,
+        has_more=offset + limit < total
+    )
+
+@router.get("/threads/{thread_id}", response_model=EmailThreadDetailResponse)
+async def get_thread(
+    thread_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get a conversation with its messages, oldest first"""
+    thread = db.query(EmailThread).filter(
+        EmailThread.id == thread_id,
+        EmailThread.user_id == current_user.id
+    ).first()
+    
+    if not thread:
+        raise HTTPException(status_code=404, detail="Thread not found")
+    
+    messages = db.query(EmailMessage).options(undefer_group("body")).filter(
+        EmailMessage.user_id == current_user.id,
+        EmailMessage.provider == thread.provider,
+        EmailMessage.thread_id == thread.thread_id
+    ).order_by(EmailMessage.received_at).all()
+    
+    return EmailThreadDetailResponse(
+        **_thread_fields(thread),
+        messages=[_email_response(email) for email in messages]
+    )
+
 @router.get("/{email_id}", response_model=EmailMessageResponse)
 async def get_email(
     email_id: str,
@@ -141,42 +279,98 @@ async def get_email(
     if not email:
         raise HTTPException(status_code=404, detail="Email not found")
     
-    return EmailMessageResponse(
-        id=email.id,
-        subject=email.subject,
-        sender=email.sender,
-        recipients=email.recipients,
-        body=email.body,
-        body_plain=email.body_plain,
-        is_read=email.is_read,
-        is_important=email.is_important,
-        is_starred=email.is_starred,
-        ai_summary=email.ai_summary,
-        ai_suggested_reply=email.ai_suggested_reply,
-        ai_priority_score=email.ai_priority_score,
-        ai_action_required=email.ai_action_required,
-        received_at=email.received_at,
-        created_at=email.created_at,
-        updated_at=email.updated_at
-    )
+    if email.body_pending:
+        try:
+            await load_gmail_body(db, current_user, email)
+        except Exception as e:
+            db.rollback()
+            logging.error(f"Error loading body for email {email.id}: {e}")
+    
+    return _email_response(email)
+
+def _get_user_email(db: Session, user: User, email_id: str) -> EmailMessage:
+    email = db.query(EmailMessage).filter(
+        EmailMessage.id == email_id,
+        EmailMessage.user_id == user.id
+    ).first()
+    if not email:
+        raise HTTPException(status_code=404, detail="Email not found")
+    return email
 
-@router.post("/{email_id}/reply")
+@router.get("/{email_id}/attachments", response_model=List[EmailAttachmentResponse])
+async def get_email_attachments(
+    email_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """List an email's attachments"""
+    email = _get_user_email(db, current_user, email_id)
+    try:
+        attachments = await list_attachments(db, current_user, email)
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Error listing attachments for email {email.id}: {e}")
+        raise HTTPException(status_code=502, detail="Could not load attachments from the mail provider")
+    return [
+        EmailAttachmentResponse(
+            id=attachment.id,
+            filename=attachment.filename,
+            content_type=attachment.content_type,
+            size=attachment.size,
+            is_inline=bool(attachment.is_inline),
+            downloaded=attachment.sha256 is not None
+        ) for attachment in attachments
+    ]
+
+@router.get("/{email_id}/attachments/{attachment_id}")
+async def download_email_attachment(
+    email_id: str,
+    attachment_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Download an attachment, fetching it from the provider on first use"""
+    email = _get_user_email(db, current_user, email_id)
+    attachment = db.query(EmailAttachment).filter(
+        EmailAttachment.id == attachment_id,
+        EmailAttachment.email_id == email.id
+    ).first()
+    if not attachment:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    try:
+        path = await fetch_attachment(db, current_user, attachment)
+    except AttachmentTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Error downloading attachment {attachment.id}: {e}")
+        raise HTTPException(status_code=502, detail="Could not download the attachment")
+    return FileResponse(path, media_type=attachment.content_type or "application/octet-stream", filename=attachment.filename)
+
+@router.post("/{email_id}/reply", status_code=202)
 async def reply_to_email(
+    email_id: str,
     reply_request: EmailReplyRequest,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Send a reply to an email"""
-    # TODO: Implement Gmail API reply functionality
-    return {"message": "Email reply sent successfully"}
+    """Queue a reply to an email; poll /api/email/outbox/{outbound_id} for delivery"""
+    email = _get_user_email(db, current_user, email_id)
+    if email.provider not in ("google", "outlook") or not email.external_id:
+        raise HTTPException(status_code=400, detail="This email cannot be replied to through its provider")
+    if not reply_request.reply_text.strip():
+        raise HTTPException(status_code=400, detail="Reply text is empty")
+    outbound = queue_reply(db, current_user, email, reply_request.reply_text)
+    return {"outbound_id": outbound.id, "job_id": outbound.job_id, "status": outbound.status}
 
 @router.post("/{email_id}/suggest-reply")
 async def suggest_email_reply(
     email_id: str,
+    regenerate: bool = Query(False),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get AI-suggested reply for an email"""
+    """Get the AI-suggested reply for an email, drafting it in the background if needed"""
     email = db.query(EmailMessage).filter(
         EmailMessage.id == email_id,
         EmailMessage.user_id == current_user.id
@@ -185,111 +379,43 @@ async def suggest_email_reply(
     if not email:
         raise HTTPException(status_code=404, detail="Email not found")
     
-    try:
-        # This part of the code was not provided in the edit_specification,
-        # so it's kept as is, assuming AIService is available or will be added.
-        # from app.services.ai_service import AIService
-        # ai_service = AIService()
-        # suggested_reply = await ai_service.suggest_email_reply(
-        #     email.body_plain or email.body or ""
-        # )
-        
-        # Update email with suggested reply
-        # email.ai_suggested_reply = suggested_reply
-        # db.commit()
-        
-        return {"suggested_reply": "This feature is not yet implemented."}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating reply: {str(e)}")
+    if email.ai_suggested_reply and not regenerate:
+        return {"suggested_reply": email.ai_suggested_reply, "status": "ready"}
+    
+    job = enqueue(  # commits
+        db,
+        "email_reply_draft",
+        payload={"email_id": email.id},
+        user_id=current_user.id,
+        priority=PRIORITY_INTERACTIVE,
+        dedup_key=f"email_reply_draft:{email.id}"
+    )
+    return {"suggested_reply": None, "status": job.status, "job_id": job.id}
 
-@router.get("/sync")
-async def sync_email(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    results = {}
-    # Gmail
-    if current_user.google_access_token:
-        if current_user.is_google_token_expired():
-            refresh_google_token(current_user, db)
-        try:
-            headers = {"Authorization": f"Bearer {current_user.google_access_token}"}
-            resp = requests.get("https://gmail.googleapis.com/gmail/v1/users/me/messages?maxResults=10", headers=headers)
-            if resp.status_code == 401:
-                if refresh_google_token(current_user, db):
-                    headers = {"Authorization": f"Bearer {current_user.google_access_token}"}
-                    resp = requests.get("https://gmail.googleapis.com/gmail/v1/users/me/messages?maxResults=10", headers=headers)
-            if resp.ok:
-                messages = resp.json().get("messages", [])
-                for msg in messages:
-                    msg_id = msg["id"]
-                    msg_resp = requests.get(f"https://gmail.googleapis.com/gmail/v1/users/me/messages/{msg_id}", headers=headers)
-                    if not msg_resp.ok:
-                        continue
-                    data = msg_resp.json()
-                    headers_list = data.get("payload", {}).get("headers", [])
-                    subject = next((h["value"] for h in headers_list if h["name"] == "Subject"), "(No Subject)")
-                    sender = next((h["value"] for h in headers_list if h["name"] == "From"), "")
-                    recipients = [h["value"] for h in headers_list if h["name"] == "To"]
-                    body = ""
-                    if data.get("payload", {}).get("body", {}).get("data"):
-                        import base64
-                        body = base64.urlsafe_b64decode(data["payload"]["body"]["data"]).decode(errors="ignore")
-                    received_at = datetime.utcfromtimestamp(int(data.get("internalDate", "0")) / 1000)
-                    em = db.query(EmailMessage).filter_by(gmail_id=msg_id).first()
-                    if not em:
-                        em = EmailMessage(user_id=current_user.id, gmail_id=msg_id)
-                        db.add(em)
-                    em.subject = subject
-                    em.sender = sender
-                    em.recipients = recipients
-                    em.body = body
-                    em.body_plain = body
-                    em.is_read = "UNREAD" not in data.get("labelIds", [])
-                    em.is_important = "IMPORTANT" in data.get("labelIds", [])
-                    em.is_starred = "STARRED" in data.get("labelIds", [])
-                    em.received_at = received_at
-                    em.updated_at = datetime.utcnow()
-                db.commit()
-                results["gmail"] = len(messages)
-            else:
-                results["gmail_error"] = resp.text
-        except Exception as e:
-            db.rollback()
-            logging.error(f"Gmail sync error: {e}")
-            results["gmail_error"] = str(e)
-    # Outlook
-    if current_user.outlook_access_token:
-        if current_user.is_outlook_token_expired():
-            refresh_outlook_token(current_user, db)
-        try:
-            headers = {"Authorization": f"Bearer {current_user.outlook_access_token}"}
-            resp = requests.get("https://graph.microsoft.com/v1.0/me/messages?$top=10", headers=headers)
-            if resp.status_code == 401:
-                if refresh_outlook_token(current_user, db):
-                    headers = {"Authorization": f"Bearer {current_user.outlook_access_token}"}
-                    resp = requests.get("https://graph.microsoft.com/v1.0/me/messages?$top=10", headers=headers)
-            if resp.ok:
-                messages = resp.json().get("value", [])
-                for msg in messages:
-                    msg_id = msg["id"]
-                    em = db.query(EmailMessage).filter_by(gmail_id=msg_id).first()
-                    if not em:
-                        em = EmailMessage(user_id=current_user.id, gmail_id=msg_id)
-                        db.add(em)
-                    em.subject = msg.get("subject", "(No Subject)")
-                    em.sender = msg.get("from", {}).get("emailAddress", {}).get("address", "")
-                    em.recipients = [r.get("emailAddress", {}).get("address", "") for r in msg.get("toRecipients", [])]
-                    em.body = msg.get("body", {}).get("content", "")
-                    em.body_plain = msg.get("bodyPreview", "")
-                    em.is_read = msg.get("isRead", False)
-                    em.is_important = msg.get("importance", "normal") == "high"
-                    em.is_starred = msg.get("flag", {}).get("flagStatus") == "flagged"
-                    em.received_at = msg.get("receivedDateTime", datetime.utcnow())
-                    em.updated_at = datetime.utcnow()
-                db.commit()
-                results["outlook"] = len(messages)
-            else:
-                results["outlook_error"] = resp.text
-        except Exception as e:
-            db.rollback()
-            logging.error(f"Outlook sync error: {e}")
-            results["outlook_error"] = str(e)
-    return results 
\ No newline at end of file
+@router.post("/{email_id}/summarize")
+async def summarize_email(
+    email_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Queue an AI summary of an email"""
+    email = db.query(EmailMessage).filter(
+        EmailMessage.id == email_id,
+        EmailMessage.user_id == current_user.id
+    ).first()
+    
+    if not email:
+        raise HTTPException(status_code=404, detail="Email not found")
+    
+    if email.ai_summary:
+        return {"summary": email.ai_summary, "status": "ready"}
+    
+    job = enqueue(  # commits
+        db,
+        "email_summary",
+        payload={"email_id": email.id},
+        user_id=current_user.id,
+        priority=PRIORITY_DEFAULT,
+        dedup_key=f"email_summary:{email.id}"
+    )
+    return {"summary": None, "status": job.status, "job_id": job.id}
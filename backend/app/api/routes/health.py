@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.core.config import settings
+from app.services.llm_guard import llm_guard
 import requests
 import time
 from typing import Dict, Any
@@ -110,6 +111,9 @@ async def health_check(db: Session = Depends(get_db)) -> Dict[str, Any]:
             "status": "not_configured"
         }
     
+    # Shared LLM limiter state (circuit, adaptive concurrency, counters)
+    health_status["services"]["llm_guard"] = llm_guard.snapshot()
+    
     return health_status
 
 @router.get("/health/simple")
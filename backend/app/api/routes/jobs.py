@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import Any, Optional
+from pydantic import BaseModel
+from datetime import datetime
+
+from app.core.database import get_db
+from app.models.background_job import BackgroundJob
+from app.models.user import User
+from app.api.dependencies import get_current_user
+
+router = APIRouter()
+
+class JobStatusResponse(BaseModel):
+    id: str
+    kind: str
+    status: str
+    priority: int
+    attempts: int
+    progress: Optional[Any]
+    result: Optional[Any]
+    last_error: Optional[str]
+    created_at: datetime
+    finished_at: Optional[datetime]
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Status, progress and result of a background job"""
+    job = db.query(BackgroundJob).filter(
+        BackgroundJob.id == job_id,
+        BackgroundJob.user_id == current_user.id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobStatusResponse(
+        id=job.id,
+        kind=job.kind,
+        status=job.status,
+        priority=job.priority,
+        attempts=job.attempts,
+        progress=job.progress,
+        result=job.result,
+        last_error=job.last_error,
+        created_at=job.created_at,
+        finished_at=job.finished_at
+    )
@@ -5,6 +5,7 @@ from app.core.database import get_db
 from app.models.push_subscription import PushSubscription
 from app.models.user import User
 from app.api.dependencies import get_current_user
+from app.services.push_service import web_push_sender
 
 router = APIRouter()
 
@@ -31,5 +32,15 @@ async def subscribe_push(
             p256dh=sub.p256dh,
             auth=sub.auth
         ))
-        db.commit()
-    return {"message": "Push subscription registered"} 
\ No newline at end of file
+    else:
+        # Browsers may rotate keys for an existing endpoint
+        exists.p256dh = sub.p256dh
+        exists.auth = sub.auth
+    db.commit()
+    return {"message": "Push subscription registered"}
+
+@router.get("/notifications/vapid-public-key")
+async def get_vapid_public_key():
+    if not web_push_sender.enabled:
+        raise HTTPException(status_code=404, detail="Web Push is not configured")
+    return {"public_key": web_push_sender.public_key} 
\ No newline at end of file
@@ -0,0 +1,59 @@
+from fastapi import APIRouter, WebSocket, Query, status
+import asyncio
+
+from app.core.database import SessionLocal
+from app.models.user import User
+from app.api.dependencies import verify_token
+from app.services.realtime import realtime_hub
+
+router = APIRouter()
+
+HEARTBEAT_SECONDS = 30
+
+async def _push(websocket: WebSocket, queue: asyncio.Queue):
+    while True:
+        try:
+            message = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+        except asyncio.TimeoutError:
+            message = {"type": "ping"}
+        await websocket.send_json(message)
+
+async def _wait_for_disconnect(websocket: WebSocket):
+    # Clients have nothing to say; reading is how a close is noticed promptly
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+@router.websocket("/realtime/ws")
+async def realtime_socket(websocket: WebSocket, token: str = Query(...)):
+    """Push suggestions, sync completions and AI-created items to the client.
+
+    Browsers cannot set headers on WebSocket handshakes, so the access
+    token is passed as a query parameter.
+    """
+    user_id = verify_token(token)
+    if user_id is not None:
+        db = SessionLocal()
+        try:
+            if db.query(User.id).filter(User.id == user_id).first() is None:
+                user_id = None
+        finally:
+            db.close()
+    if user_id is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    queue = realtime_hub.subscribe(user_id)
+    tasks = [
+        asyncio.create_task(_push(websocket, queue)),
+        asyncio.create_task(_wait_for_disconnect(websocket))
+    ]
+    try:
+        # Either side ending, whether by a disconnect or a failed send, ends both
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.exception()  # a send to a closed socket; nothing left to tell the client
+    finally:
+        for task in tasks:
+            task.cancel()
+        realtime_hub.unsubscribe(user_id, queue)
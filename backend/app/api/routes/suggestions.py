@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import String, and_, cast, or_
+from typing import List, Optional
 from pydantic import BaseModel
 from app.core.database import get_db
 from app.models.suggestion import Suggestion
 from app.models.user import User
+from app.models.sync_change import record_changes, record_reset
 from app.api.dependencies import get_current_user
+from app.services.suggestion_service import adjust_unread_count, get_unread_count
 from datetime import datetime
+import base64
 
 router = APIRouter()
 
@@ -16,37 +20,104 @@ class SuggestionResponse(BaseModel):
     message: str
     is_read: bool
     created_at: datetime
-    related_task_id: str = None
-    related_email_id: str = None
-    related_event_id: str = None
-
-@router.get("/suggestions", response_model=List[SuggestionResponse])
-async def get_suggestions(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    suggestions = db.query(Suggestion).filter(Suggestion.user_id == current_user.id).order_by(Suggestion.created_at.desc()).all()
-    return [
-        SuggestionResponse(
-            id=s.id,
-            type=s.type,
-            message=s.message,
-            is_read=s.is_read,
-            created_at=s.created_at,
-            related_task_id=s.related_task_id,
-            related_email_id=s.related_email_id,
-            related_event_id=s.related_event_id
-        ) for s in suggestions
-    ]
+    related_task_id: Optional[str] = None
+    related_email_id: Optional[str] = None
+    related_event_id: Optional[str] = None
+
+class SuggestionsPage(BaseModel):
+    suggestions: List[SuggestionResponse]
+    next_cursor: Optional[str]
+    has_more: bool
+
+def _encode_cursor(created_at: str, suggestion_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{created_at}|{suggestion_id}".encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, suggestion_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return created_at, suggestion_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/suggestions", response_model=SuggestionsPage)
+async def get_suggestions(
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    unread_only: bool = Query(False),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Newest-first suggestions, paginated by an opaque keyset cursor"""
+    # Keyset on the stored timestamp text: rows written by the database
+    # (second precision) and by Python (microseconds) then still sort and
+    # compare consistently.
+    created_key = cast(Suggestion.created_at, String)
+    query = db.query(Suggestion, created_key.label("created_key")).filter(
+        Suggestion.user_id == current_user.id,
+        Suggestion.archived_at.is_(None)
+    )
+    if unread_only:
+        query = query.filter(Suggestion.is_read == False)
+    if cursor:
+        created_at, suggestion_id = _decode_cursor(cursor)
+        query = query.filter(or_(
+            created_key < created_at,
+            and_(created_key == created_at, Suggestion.id < suggestion_id)
+        ))
+    rows = query.order_by(created_key.desc(), Suggestion.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return SuggestionsPage(
+        suggestions=[
+            SuggestionResponse(
+                id=s.id,
+                type=s.type,
+                message=s.message,
+                is_read=s.is_read,
+                created_at=s.created_at,
+                related_task_id=s.related_task_id,
+                related_email_id=s.related_email_id,
+                related_event_id=s.related_event_id
+            ) for s, _ in rows
+        ],
+        next_cursor=_encode_cursor(rows[-1].created_key, rows[-1][0].id) if has_more else None,
+        has_more=has_more
+    )
+
+@router.get("/suggestions/unread-count")
+async def get_unread_suggestion_count(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    return {"unread": get_unread_count(db, current_user)}
+
+@router.post("/suggestions/read-all")
+async def mark_all_suggestions_read(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    ids = [row.id for row in db.query(Suggestion.id).filter(
+        Suggestion.user_id == current_user.id,
+        Suggestion.is_read == False
+    )]
+    if ids:
+        db.query(Suggestion).filter(Suggestion.id.in_(ids)).update(
+            {Suggestion.is_read: True}, synchronize_session=False
+        )
+        record_changes(db, current_user.id, "suggestion", ids)
+    current_user.unread_suggestion_count = 0
+    db.commit()
+    return {"message": f"{len(ids)} suggestions marked as read"}
 
 @router.post("/suggestions/{suggestion_id}/read")
 async def mark_suggestion_read(suggestion_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     suggestion = db.query(Suggestion).filter(Suggestion.id == suggestion_id, Suggestion.user_id == current_user.id).first()
     if not suggestion:
         raise HTTPException(status_code=404, detail="Suggestion not found")
-    suggestion.is_read = True
+    if not suggestion.is_read:
+        suggestion.is_read = True
+        adjust_unread_count(db, current_user.id, -1)
     db.commit()
     return {"message": "Suggestion marked as read"}
 
 @router.delete("/suggestions/clear")
 async def clear_suggestions(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     db.query(Suggestion).filter(Suggestion.user_id == current_user.id).delete()
+    record_reset(db, current_user.id, "suggestion")
+    current_user.unread_suggestion_count = 0
     db.commit()
-    return {"message": "All suggestions cleared"} 
\ No newline at end of file
+    return {"message": "All suggestions cleared"}
@@ -0,0 +1,118 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session, undefer_group
+from sqlalchemy import func
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+from datetime import datetime
+import enum
+
+from app.core.database import get_db
+from app.models.sync_change import SyncChange, sync_horizon
+from app.models.task import Task
+from app.models.calendar_event import CalendarEvent
+from app.models.email_message import EmailMessage
+from app.models.email_thread import EmailThread
+from app.models.suggestion import Suggestion
+from app.models.chat_message import ChatMessage
+from app.models.user import User
+from app.api.dependencies import get_current_user
+
+router = APIRouter()
+
+SYNC_MODELS = {
+    "task": Task,
+    "calendar_event": CalendarEvent,
+    "email": EmailMessage,
+    "email_thread": EmailThread,
+    "suggestion": Suggestion,
+    "chat_message": ChatMessage,
+}
+
+class SyncChangesResponse(BaseModel):
+    cursor: int
+    has_more: bool
+    reset: List[str]
+    changed: Dict[str, List[Dict[str, Any]]]
+    deleted: Dict[str, List[str]]
+
+def _serialize(obj) -> Dict[str, Any]:
+    data = {}
+    for column in obj.__table__.columns:
+        value = getattr(obj, column.name)
+        if isinstance(value, bytes):
+            continue  # compressed storage; the text is exposed under the column's logical name
+        if isinstance(value, enum.Enum):
+            value = value.value
+        data[column.name] = value
+    return data
+
+@router.get("/sync/changes", response_model=SyncChangesResponse)
+async def get_changes(
+    since: Optional[int] = Query(None, ge=0, description="Cursor returned by the previous call"),
+    limit: int = Query(500, ge=1, le=2000),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Return everything created, updated or deleted since the cursor.
+
+    Clients drop their local copies of any type listed in `reset` before
+    applying `changed` and `deleted`. Without a cursor, or with one older
+    than the retained change log, only the current position is returned,
+    flagged as a reset of every entity type so the client performs one
+    full load first.
+    """
+    if since is None or since < sync_horizon(db):
+        head = db.query(func.max(SyncChange.id)).filter(SyncChange.user_id == current_user.id).scalar()
+        return SyncChangesResponse(
+            cursor=head or 0,
+            has_more=False,
+            reset=list(SYNC_MODELS.keys()),
+            changed={},
+            deleted={}
+        )
+
+    entries = db.query(SyncChange).filter(
+        SyncChange.user_id == current_user.id,
+        SyncChange.id > since
+    ).order_by(SyncChange.id).limit(limit).all()
+
+    # Collapse the log to the latest operation per entity
+    latest: Dict[str, Dict[str, str]] = {entity_type: {} for entity_type in SYNC_MODELS}
+    reset = []
+    for entry in entries:
+        if entry.op == "reset":
+            latest[entry.entity_type] = {}
+            if entry.entity_type not in reset:
+                reset.append(entry.entity_type)
+        else:
+            latest[entry.entity_type][entry.entity_id] = entry.op
+
+    changed: Dict[str, List[Dict[str, Any]]] = {}
+    deleted: Dict[str, List[str]] = {}
+    for entity_type, ops in latest.items():
+        upserted = [entity_id for entity_id, op in ops.items() if op == "upsert"]
+        gone = [entity_id for entity_id, op in ops.items() if op == "delete"]
+        if upserted:
+            model = SYNC_MODELS[entity_type]
+            query = db.query(model).filter(
+                model.user_id == current_user.id,
+                model.id.in_(upserted)
+            )
+            if model is EmailMessage:
+                # The feed carries full bodies; load them with the rows, not one SELECT per email
+                query = query.options(undefer_group("body"), undefer_group("legacy_body"))
+            rows = query.all()
+            changed[entity_type] = [_serialize(row) for row in rows]
+            # Rows removed after the logged upsert are reported as deleted
+            found = {row.id for row in rows}
+            gone.extend(entity_id for entity_id in upserted if entity_id not in found)
+        if gone:
+            deleted[entity_type] = gone
+
+    return SyncChangesResponse(
+        cursor=entries[-1].id if entries else since,
+        has_more=len(entries) == limit,
+        reset=reset,
+        changed=changed,
+        deleted=deleted
+    )
@@ -1,13 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
+from sqlalchemy import update
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from enum import Enum
+import uuid
 
 from app.core.database import get_db
 from app.models.task import Task, TaskPriority, TaskStatus
 from app.models.user import User
+from app.models.sync_change import record_changes
 from app.api.dependencies import get_current_user
 
 router = APIRouter()
@@ -54,6 +57,29 @@ class TaskResponse(BaseModel):
     created_at: datetime
     updated_at: Optional[datetime]
 
+class TaskBulkUpdate(TaskUpdate):
+    id: str
+
+class TaskBulkRequest(BaseModel):
+    creates: List[TaskCreate] = Field(default_factory=list, max_length=500)
+    updates: List[TaskBulkUpdate] = Field(default_factory=list, max_length=500)
+    completes: List[str] = Field(default_factory=list, max_length=500)
+    deletes: List[str] = Field(default_factory=list, max_length=500)
+
+class TaskBulkItemResult(BaseModel):
+    op: str
+    id: Optional[str]
+    index: int
+    success: bool
+    error: Optional[str] = None
+
+class TaskBulkResponse(BaseModel):
+    results: List[TaskBulkItemResult]
+    created: int
+    updated: int
+    completed: int
+    deleted: int
+
 @router.post("/", response_model=TaskResponse)
 async def create_task(
     task_data: TaskCreate,
@@ -130,6 +156,131 @@ async def get_tasks(
         ) for task in tasks
     ]
 
+@router.post("/bulk", response_model=TaskBulkResponse)
+async def bulk_tasks(
+    bulk: TaskBulkRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Apply many creates, updates, completes and deletes in one transaction"""
+    results: List[TaskBulkItemResult] = []
+    now = datetime.utcnow()
+
+    # Resolve ownership of every referenced task with a single query
+    referenced = {u.id for u in bulk.updates} | set(bulk.completes) | set(bulk.deletes)
+    owned = set()
+    if referenced:
+        owned = {
+            row.id for row in db.query(Task.id).filter(
+                Task.user_id == current_user.id,
+                Task.id.in_(referenced)
+            )
+        }
+
+    # Tasks deleted in this batch are not updated or completed first
+    deleting = [task_id for task_id in dict.fromkeys(bulk.deletes) if task_id in owned]
+    deleting_set = set(deleting)
+
+    insert_rows = []
+    for index, task_data in enumerate(bulk.creates):
+        task_id = str(uuid.uuid4())
+        insert_rows.append({
+            "id": task_id,
+            "user_id": current_user.id,
+            "title": task_data.title,
+            "description": task_data.description,
+            "priority": TaskPriority(task_data.priority.value),
+            "status": TaskStatus.TODO,
+            "due_date": task_data.due_date,
+            "reminder_date": task_data.reminder_date,
+            "ai_suggested": False,
+            "ai_confidence": 0,
+            "created_at": now
+        })
+        results.append(TaskBulkItemResult(op="create", id=task_id, index=index, success=True))
+
+    update_rows = []
+    for index, task_data in enumerate(bulk.updates):
+        if task_data.id not in owned:
+            results.append(TaskBulkItemResult(op="update", id=task_data.id, index=index, success=False, error="Task not found"))
+            continue
+        if task_data.id in deleting_set:
+            results.append(TaskBulkItemResult(op="update", id=task_data.id, index=index, success=False, error="Task deleted in same request"))
+            continue
+        row = {"id": task_data.id, "updated_at": now}
+        if task_data.title is not None:
+            row["title"] = task_data.title
+        if task_data.description is not None:
+            row["description"] = task_data.description
+        if task_data.priority is not None:
+            row["priority"] = TaskPriority(task_data.priority.value)
+        if task_data.status is not None:
+            row["status"] = TaskStatus(task_data.status.value)
+        if task_data.due_date is not None:
+            row["due_date"] = task_data.due_date
+        if task_data.reminder_date is not None:
+            row["reminder_date"] = task_data.reminder_date
+        update_rows.append(row)
+        results.append(TaskBulkItemResult(op="update", id=task_data.id, index=index, success=True))
+
+    completing = []
+    for index, task_id in enumerate(bulk.completes):
+        if task_id not in owned:
+            results.append(TaskBulkItemResult(op="complete", id=task_id, index=index, success=False, error="Task not found"))
+            continue
+        if task_id in deleting_set:
+            results.append(TaskBulkItemResult(op="complete", id=task_id, index=index, success=False, error="Task deleted in same request"))
+            continue
+        completing.append(task_id)
+        results.append(TaskBulkItemResult(op="complete", id=task_id, index=index, success=True))
+
+    for index, task_id in enumerate(bulk.deletes):
+        if task_id not in owned:
+            results.append(TaskBulkItemResult(op="delete", id=task_id, index=index, success=False, error="Task not found"))
+        else:
+            results.append(TaskBulkItemResult(op="delete", id=task_id, index=index, success=True))
+
+    try:
+        if insert_rows:
+            db.bulk_insert_mappings(Task, insert_rows)
+        if update_rows:
+            db.bulk_update_mappings(Task, update_rows)
+            # Tasks moved to DONE via update keep their first completion time
+            done_ids = [row["id"] for row in update_rows if row.get("status") == TaskStatus.DONE]
+            if done_ids:
+                db.execute(
+                    update(Task)
+                    .where(Task.id.in_(done_ids), Task.completed_at.is_(None))
+                    .values(completed_at=now)
+                    .execution_options(synchronize_session=False)
+                )
+        if completing:
+            db.execute(
+                update(Task)
+                .where(Task.id.in_(completing))
+                .values(status=TaskStatus.DONE, completed_at=now, updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+        if deleting:
+            db.query(Task).filter(Task.id.in_(deleting)).delete(synchronize_session=False)
+        # Bulk statements bypass the flush hook, so log them for delta sync
+        record_changes(db, current_user.id, "task", [row["id"] for row in insert_rows])
+        record_changes(db, current_user.id, "task", [row["id"] for row in update_rows])
+        record_changes(db, current_user.id, "task", completing)
+        record_changes(db, current_user.id, "task", deleting, op="delete")
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error applying bulk task changes: {str(e)}")
+
+    return TaskBulkResponse(
+        results=results,
+        created=len(insert_rows),
+        updated=len(update_rows),
+        completed=len(completing),
+        deleted=len(deleting)
+    )
+
 @router.get("/{task_id}", response_model=TaskResponse)
 async def get_task(
     task_id: str,
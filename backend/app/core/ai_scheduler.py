@@ -1,92 +1,360 @@
-from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from sqlalchemy.orm import Session
-from app.core.database import SessionLocal
+from sqlalchemy import func
+from app.core.database import SessionLocal, dialect_insert
 from app.models.user import User
-from app.models.task import Task
+from app.models.task import Task, TaskStatus
 from app.models.email_message import EmailMessage
 from app.models.calendar_event import CalendarEvent
-from app.models.suggestion import Suggestion
+from app.models.calendar_occurrence import CalendarOccurrence
+from app.models.suggestion import Suggestion, suggestion_hash
+from app.models.sync_change import SyncChange, purge_sync_changes, record_changes
+from app.models.review_state import ReviewState
 from app.services.ai_service import AIService
+from app.services.calendar_occurrences import occurrences_query, roll_occurrence_window
+from app.services.realtime import realtime_hub
+from app.services.push_service import web_push_sender
+from app.services.notification_service import enqueue_email_notification, notification_worker, purge_delivered_notifications
+from app.services.suggestion_service import adjust_unread_count, apply_retention
+from app.services.job_queue import JobContext, PRIORITY_BATCH, enqueue, job_handler, purge_finished
 from datetime import datetime, timedelta
-import logging
+from typing import Any, Dict, List, Optional
+import json
+import uuid
 from app.core.config import settings
-import smtplib
-from email.mime.text import MIMEText
+from app.core import leases
 
-scheduler = BackgroundScheduler()
+scheduler = AsyncIOScheduler()
 
-# This function will be run periodically
-def ai_review_job():
+# sync_changes entity types whose changes trigger a review
+REVIEWED_ENTITY_TYPES = ("task", "email", "calendar_event")
+
+class ReviewEngine:
+    """Proactive review of every user's tasks, emails and events.
+
+    Users are split into REVIEW_PARTITIONS hash partitions leased through
+    the job_leases table, so each worker process reviews a disjoint share
+    and adding processes adds throughput. Users whose data changed are
+    queued as batch-priority `ai_review_user` jobs, so reviews share the
+    job worker pool (and its concurrency bound) with other AI work and
+    survive restarts. Database work uses small projected queries. Each
+    review only sends what changed since the user's watermark plus
+    aggregate counts, and unchanged users are skipped.
+    """
+
+    def __init__(self, max_items: Optional[int] = None):
+        self.max_items = max_items or settings.REVIEW_MAX_ITEMS
+        self._ai: Optional[AIService] = None
+
+    @property
+    def ai(self) -> AIService:
+        if self._ai is None:
+            self._ai = AIService()
+        return self._ai
+
+    @property
+    def lease_ttl(self) -> int:
+        # Survive one missed run before another process takes over
+        return settings.REVIEW_INTERVAL_MINUTES * 60 * 2 + 60
+
+    async def run_once(self):
+        partitions = settings.REVIEW_PARTITIONS
+        db: Session = SessionLocal()
+        try:
+            owned = set(leases.claim_partitions(db, "ai_review", partitions, self.lease_ttl))
+            if not owned:
+                return
+            user_ids = [
+                row.id for row in db.query(User.id)
+                if leases.partition_of(row.id, partitions) in owned
+            ]
+            for user_id in user_ids:
+                if self._change_head(db, user_id) is not None:
+                    enqueue(  # commits
+                        db,
+                        "ai_review_user",
+                        user_id=user_id,
+                        priority=PRIORITY_BATCH,
+                        dedup_key=f"ai_review:{user_id}"
+                    )
+        finally:
+            db.close()
+
+    def _change_head(self, db: Session, user_id: str) -> Optional[int]:
+        """Newest reviewed-type change after the user's watermark, if any"""
+        watermark = db.query(ReviewState.change_watermark).filter(ReviewState.user_id == user_id).scalar() or 0
+        return db.query(func.max(SyncChange.id)).filter(
+            SyncChange.user_id == user_id,
+            SyncChange.entity_type.in_(REVIEWED_ENTITY_TYPES),
+            SyncChange.id > watermark
+        ).scalar()
+
+    def _load_delta(self, db: Session, user_id: str, watermark: int) -> Dict[str, Any]:
+        """Collapse log entries after the watermark into changed and removed items"""
+        entries = db.query(SyncChange.entity_type, SyncChange.entity_id, SyncChange.op).filter(
+            SyncChange.user_id == user_id,
+            SyncChange.entity_type.in_(REVIEWED_ENTITY_TYPES),
+            SyncChange.id > watermark
+        ).order_by(SyncChange.id.desc()).limit(self.max_items * len(REVIEWED_ENTITY_TYPES) * 4).all()
+
+        latest: Dict[str, Dict[str, str]] = {entity_type: {} for entity_type in REVIEWED_ENTITY_TYPES}
+        for entry in entries:
+            ops = latest[entry.entity_type]
+            if entry.entity_id not in ops and len(ops) < self.max_items:
+                ops[entry.entity_id] = entry.op
+
+        def changed_ids(entity_type):
+            return [entity_id for entity_id, op in latest[entity_type].items() if op == "upsert"]
+
+        def removed(entity_type):
+            return sum(1 for op in latest[entity_type].values() if op == "delete")
+
+        tasks = emails = events = []
+        if changed_ids("task"):
+            tasks = db.query(Task.id, Task.title, Task.status, Task.due_date).filter(
+                Task.user_id == user_id,
+                Task.id.in_(changed_ids("task"))
+            ).all()
+        if changed_ids("email"):
+            emails = db.query(EmailMessage.id, EmailMessage.subject, EmailMessage.sender, EmailMessage.is_read).filter(
+                EmailMessage.user_id == user_id,
+                EmailMessage.id.in_(changed_ids("email"))
+            ).all()
+        if changed_ids("calendar_event"):
+            events = db.query(CalendarEvent.id, CalendarEvent.title, CalendarEvent.start_time).filter(
+                CalendarEvent.user_id == user_id,
+                CalendarEvent.id.in_(changed_ids("calendar_event"))
+            ).all()
+        return {
+            "tasks": tasks,
+            "emails": emails,
+            "events": events,
+            "removed": {
+                "tasks": removed("task"),
+                "emails": removed("email"),
+                "events": removed("calendar_event")
+            }
+        }
+
+    def _summarize(self, db: Session, user_id: str) -> Dict[str, int]:
+        """Aggregate counts standing in for the unchanged part of the user's data"""
+        now = datetime.utcnow()
+        open_tasks = db.query(Task).filter(
+            Task.user_id == user_id,
+            Task.status.in_([TaskStatus.TODO, TaskStatus.IN_PROGRESS])
+        )
+        return {
+            "open_tasks": open_tasks.count(),
+            "overdue_tasks": open_tasks.filter(Task.due_date < now).count(),
+            "unread_emails": db.query(EmailMessage).filter(
+                EmailMessage.user_id == user_id,
+                EmailMessage.is_read == False
+            ).count(),
+            "events_next_7_days": occurrences_query(db, user_id).filter(
+                CalendarOccurrence.start_time >= now,
+                CalendarOccurrence.start_time < now + timedelta(days=7)
+            ).count()
+        }
+
+    def _build_prompt(self, delta: Dict[str, Any], summary: Dict[str, int]) -> str:
+        return (
+            f"You are a proactive assistant. Review what changed since your last review and suggest actionable reminders or nudges.\n"
+            f"Current totals: {summary}\n"
+            f"New or updated tasks: {[{'id': t.id, 'title': t.title, 'status': t.status.value, 'due': t.due_date.isoformat() if t.due_date else None} for t in delta['tasks']]}\n"
+            f"New or updated emails: {[{'id': e.id, 'subject': e.subject, 'from': e.sender, 'read': e.is_read} for e in delta['emails']]}\n"
+            f"New or updated events: {[{'id': e.id, 'title': e.title, 'start': e.start_time.isoformat()} for e in delta['events']]}\n"
+            f"Removed since last review: {delta['removed']}\n"
+            f"Now: {datetime.utcnow().isoformat()}\n"
+            f"Output a JSON list of suggestions, each with type, message, and optionally related_task_id, related_email_id, or related_event_id."
+        )
+
+    async def review_user(self, user_id: str) -> bool:
+        """Review one user if their data changed; returns whether the LLM was called"""
+        db: Session = SessionLocal()
+        try:
+            watermark = db.query(ReviewState.change_watermark).filter(ReviewState.user_id == user_id).scalar() or 0
+            head = self._change_head(db, user_id)
+            if head is None:
+                return False
+            delta = self._load_delta(db, user_id, watermark)
+            summary = self._summarize(db, user_id)
+        finally:
+            db.close()
+
+        suggestions = []
+        if delta["tasks"] or delta["emails"] or delta["events"]:
+            content = await self.ai.complete(
+                [{"role": "system", "content": self._build_prompt(delta, summary)}],
+                max_tokens=500,
+                temperature=0.3
+            )
+            suggestions = json.loads(content)
+
+        db = SessionLocal()
+        try:
+            state = db.query(ReviewState).filter(ReviewState.user_id == user_id).first()
+            if state is None:
+                state = ReviewState(user_id=user_id)
+                db.add(state)
+            state.change_watermark = head
+            state.last_summary = json.dumps(summary)
+            state.last_reviewed_at = datetime.utcnow()
+            user = db.query(User).filter(User.id == user_id).first()
+            if user is not None and suggestions:
+                store_suggestions(db, user, suggestions)
+            db.commit()
+        finally:
+            db.close()
+        return bool(suggestions)
+
+    async def close(self):
+        if self._ai is not None:
+            await self._ai.close()
+            self._ai = None
+
+review_engine = ReviewEngine()
+
+@job_handler("ai_review_user")
+async def run_review_job(job: JobContext):
+    return {"suggested": await review_engine.review_user(job.user_id)}
+
+def store_suggestions(db: Session, user: User, suggestions: List[Dict[str, Any]]):
+    """Insert a run's suggestions in one statement, skipping unread duplicates"""
+    rows = {}
+    for s in suggestions:
+        if not s.get("message"):
+            continue
+        content_hash = suggestion_hash(s["message"])
+        rows.setdefault(content_hash, {
+            "id": str(uuid.uuid4()),
+            "user_id": user.id,
+            "type": s.get("type", "general"),
+            "message": s["message"],
+            "content_hash": content_hash,
+            "related_task_id": s.get("related_task_id"),
+            "related_email_id": s.get("related_email_id"),
+            "related_event_id": s.get("related_event_id"),
+            "is_read": False,
+            "is_notified": True,
+            "created_at": datetime.utcnow()
+        })
+    if not rows:
+        return []
+
+    stmt = dialect_insert(db, Suggestion).values(list(rows.values()))
+    stmt = stmt.on_conflict_do_nothing(
+        index_elements=[Suggestion.user_id, Suggestion.content_hash],
+        index_where=Suggestion.is_read == False
+    ).returning(Suggestion.id)
+    inserted = {row.id for row in db.execute(stmt)}
+    record_changes(db, user.id, "suggestion", inserted)
+    adjust_unread_count(db, user.id, len(inserted))
+
+    created = [Suggestion(**row) for row in rows.values() if row["id"] in inserted]
+    for suggestion in created:
+        queue_notification(db, user, suggestion)
+    # Suggestions and their outbox entries commit together
+    db.commit()
+    # Live notifications only go out once the suggestions are durable
+    for suggestion in created:
+        publish_notification(user, suggestion)
+    return created
+
+async def deliver_notifications():
+    """Drain the notification outbox on whichever process holds the lease"""
     db: Session = SessionLocal()
     try:
-        users = db.query(User).all()
-        for user in users:
-            # Gather user data
-            tasks = db.query(Task).filter(Task.user_id == user.id).all()
-            emails = db.query(EmailMessage).filter(EmailMessage.user_id == user.id).all()
-            events = db.query(CalendarEvent).filter(CalendarEvent.user_id == user.id).all()
-            # Use AI to generate suggestions
-            ai = AIService()
-            prompt = (
-                f"You are a proactive assistant. Review the following data and suggest actionable reminders or nudges.\n"
-                f"Tasks: {[t.title for t in tasks]}\n"
-                f"Emails: {[e.subject for e in emails]}\n"
-                f"Events: {[e.title for e in events]}\n"
-                f"Now: {datetime.utcnow().isoformat()}\n"
-                f"Output a JSON list of suggestions, each with type, message, and optionally related_task_id, related_email_id, or related_event_id."
-            )
-            try:
-                response = ai.client.chat.completions.create(
-                    model=ai.model,
-                    messages=[{"role": "system", "content": prompt}],
-                    max_tokens=500,
-                    temperature=0.3
-                )
-                import json
-                suggestions = json.loads(response.choices[0].message.content)
-                for s in suggestions:
-                    # Avoid duplicates (same message, unread)
-                    exists = db.query(Suggestion).filter(
-                        Suggestion.user_id == user.id,
-                        Suggestion.message == s["message"],
-                        Suggestion.is_read == False
-                    ).first()
-                    if not exists:
-                        suggestion = Suggestion(
-                            user_id=user.id,
-                            type=s.get("type", "general"),
-                            message=s["message"],
-                            related_task_id=s.get("related_task_id"),
-                            related_email_id=s.get("related_email_id"),
-                            related_event_id=s.get("related_event_id")
-                        )
-                        db.add(suggestion)
-                        db.commit()
-                        send_notification(user, suggestion)
-            except Exception as e:
-                logging.error(f"AI suggestion generation failed for user {user.email}: {e}")
+        leader = leases.run_if_leader(db, "notification_delivery", settings.NOTIFICATION_DELIVERY_INTERVAL_SECONDS * 3)
+    finally:
+        db.close()
+    if leader:
+        await notification_worker.run_once()
+
+async def enforce_retention():
+    """Expire read suggestions, finished background jobs, delivered
+    notifications, old sync changes and the leases of dead nodes, and roll
+    the calendar occurrence window forward
+    """
+    db: Session = SessionLocal()
+    try:
+        if leases.run_if_leader(db, "retention", 2 * 60 * 60):
+            apply_retention(db)
+            purge_finished(db)
+            purge_delivered_notifications(db)
+            purge_sync_changes(db)
+            leases.purge_dead_nodes(db)
+            roll_occurrence_window(db)
     finally:
         db.close()
 
-# Schedule the job every 10 minutes
-scheduler.add_job(ai_review_job, "interval", minutes=10)
-scheduler.start()
+def start():
+    """Schedule the periodic review; called from the app lifespan"""
+    scheduler.add_job(
+        review_engine.run_once,
+        "interval",
+        minutes=settings.REVIEW_INTERVAL_MINUTES,
+        id="ai_review",
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
+    scheduler.add_job(
+        deliver_notifications,
+        "interval",
+        seconds=settings.NOTIFICATION_DELIVERY_INTERVAL_SECONDS,
+        id="notification_delivery",
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
+    scheduler.add_job(
+        enforce_retention,
+        "interval",
+        hours=1,
+        id="retention",
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
+    scheduler.start()
+
+async def stop():
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    await review_engine.close()
+    db: Session = SessionLocal()
+    try:
+        leases.release_all(db)
+    finally:
+        db.close()
 
-def send_notification(user, suggestion):
-    # In-app: just set is_notified (frontend will poll /api/suggestions)
+def queue_notification(db: Session, user, suggestion):
+    """Queue a suggestion's email in the outbox; part of the caller's transaction"""
     suggestion.is_notified = True
-    # Email notification (optional)
-    if getattr(settings, "EMAIL_NOTIFICATIONS_ENABLED", False) and user.email:
-        try:
-            msg = MIMEText(suggestion.message)
-            msg['Subject'] = f"AI Assistant Suggestion: {suggestion.type}"
-            msg['From'] = getattr(settings, "EMAIL_FROM", "no-reply@ai-assistant.local")
-            msg['To'] = user.email
-            with smtplib.SMTP(getattr(settings, "SMTP_HOST", "localhost"), getattr(settings, "SMTP_PORT", 25)) as s:
-                if getattr(settings, "SMTP_USER", None) and getattr(settings, "SMTP_PASSWORD", None):
-                    s.starttls()
-                    s.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-                s.send_message(msg)
-        except Exception as e:
-            import logging
-            logging.error(f"Failed to send email notification: {e}") 
\ No newline at end of file
+    # Email: queued in the outbox and delivered in digests by the delivery job
+    if settings.EMAIL_NOTIFICATIONS_ENABLED and user.email:
+        enqueue_email_notification(
+            db,
+            user.id,
+            subject=f"AI Assistant Suggestion: {suggestion.type}",
+            body=suggestion.message,
+            suggestion_id=suggestion.id
+        )
+
+def publish_notification(user, suggestion):
+    """Push a committed suggestion to open tabs and subscribed devices"""
+    # In-app: push to connected clients instead of waiting for a poll
+    realtime_hub.publish(user.id, "suggestion", {
+        "id": suggestion.id,
+        "type": suggestion.type,
+        "message": suggestion.message,
+        "related_task_id": suggestion.related_task_id,
+        "related_email_id": suggestion.related_email_id,
+        "related_event_id": suggestion.related_event_id
+    })
+    # Web Push: reaches devices without an open tab
+    web_push_sender.schedule(user.id, {
+        "title": f"AI Assistant Suggestion: {suggestion.type}",
+        "body": suggestion.message,
+        "url": "/"
+    })
@@ -0,0 +1,90 @@
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.models.sync_change import SYNC_ENTITY_TYPES, record_changes
+
+CHUNK_SIZE = 500
+
+def _normalize(value: Any) -> Any:
+    # Stored datetimes come back naive UTC
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def bulk_upsert(
+    db: Session,
+    model,
+    key: str,
+    user_id: str,
+    rows: Iterable[Dict[str, Any]],
+    scope: Optional[Dict[str, Any]] = None,
+    insert: bool = True,
+    chunk_size: int = CHUNK_SIZE
+) -> Dict[str, Any]:
+    """Insert or update a user's rows matched on an external id column.
+
+    `scope` holds extra equality filters that are part of the key, such as
+    the provider, and are set on inserted rows.
+
+    Per chunk, existing rows are resolved with one IN query and incoming
+    values are diffed against them; new rows go through one bulk insert,
+    rows with changed values through one bulk update, and unchanged rows
+    are skipped. With `insert=False` unknown keys are ignored, for partial
+    updates such as label changes. Changes are recorded in the sync log.
+    Does not commit. Returns counts plus the ids of inserted and updated rows.
+    """
+    incoming: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        incoming[row[key]] = row  # last one wins
+    scope = scope or {}
+    key_column = getattr(model, key)
+    scope_filters = [getattr(model, column) == value for column, value in scope.items()]
+    entity_type = SYNC_ENTITY_TYPES.get(model.__tablename__)
+    stats = {"inserted": 0, "updated": 0, "unchanged": 0, "ids": []}
+
+    keys = list(incoming)
+    for start in range(0, len(keys), chunk_size):
+        chunk = keys[start:start + chunk_size]
+        fields = sorted({field for k in chunk for field in incoming[k] if field != key})
+        columns = [model.id, key_column] + [getattr(model, field) for field in fields]
+        existing = {
+            row[1]: row for row in db.query(*columns).filter(
+                model.user_id == user_id,
+                key_column.in_(chunk),
+                *scope_filters
+            )
+        }
+
+        inserts: List[Dict[str, Any]] = []
+        updates: List[Dict[str, Any]] = []
+        for k in chunk:
+            values = incoming[k]
+            current = existing.get(k)
+            if current is None:
+                if insert:
+                    inserts.append({"id": str(uuid.uuid4()), "user_id": user_id, **scope, **values})
+                continue
+            stored = dict(zip(fields, current[2:]))
+            changed = {
+                field: value for field, value in values.items()
+                if field != key and _normalize(value) != _normalize(stored.get(field))
+            }
+            if changed:
+                updates.append({"id": current[0], **changed})
+            else:
+                stats["unchanged"] += 1
+
+        if inserts:
+            db.bulk_insert_mappings(model, inserts)
+        if updates:
+            db.bulk_update_mappings(model, updates)
+        changed_ids = [row["id"] for row in inserts] + [row["id"] for row in updates]
+        if entity_type:
+            record_changes(db, user_id, entity_type, changed_ids)
+        stats["inserted"] += len(inserts)
+        stats["updated"] += len(updates)
+        stats["ids"].extend(changed_ids)
+    return stats
@@ -0,0 +1,107 @@
+import struct
+import zlib
+from typing import Callable, Dict, List, Optional
+
+from app.core.config import settings
+
+try:
+    import zstandard
+except ImportError:  # optional: zlib is used when zstandard is not installed
+    zstandard = None
+
+# First byte of every stored blob; dictionary codecs follow it with a
+# 4-byte dictionary id, so each value says how to decode itself.
+RAW, ZLIB, ZLIB_DICT, ZSTD, ZSTD_DICT = range(5)
+
+# Values shorter than this are not worth a compression frame
+MIN_COMPRESS_SIZE = 128
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 9
+# zlib only looks back 32KB, so a longer preset dictionary is wasted
+ZLIB_DICT_SIZE = 32 * 1024
+ZSTD_DICT_SIZE = 16 * 1024
+
+DictionaryLoader = Callable[[int], bytes]
+
+_zstd_decompressors: Dict[Optional[int], "zstandard.ZstdDecompressor"] = {}
+
+def available_algorithm(requested: Optional[str] = None) -> str:
+    """The configured algorithm, falling back to zlib without zstandard"""
+    algorithm = requested or settings.EMAIL_BODY_COMPRESSION
+    if algorithm == "zstd" and zstandard is None:
+        return "zlib"
+    return algorithm
+
+class TextCodec:
+    """Compresses text values, optionally with a preset dictionary"""
+
+    def __init__(
+        self,
+        algorithm: Optional[str] = None,
+        dictionary_id: Optional[int] = None,
+        dictionary: Optional[bytes] = None
+    ):
+        self.algorithm = available_algorithm(algorithm)
+        self.dictionary_id = dictionary_id if dictionary else None
+        self.dictionary = dictionary
+        self._zstd = None
+        if self.algorithm == "zstd":
+            dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            self._zstd = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dict_data)
+
+    def _header(self, plain_codec: int, dict_codec: int) -> bytes:
+        if self.dictionary_id is None:
+            return bytes([plain_codec])
+        return bytes([dict_codec]) + struct.pack(">I", self.dictionary_id)
+
+    def encode(self, text: Optional[str]) -> Optional[bytes]:
+        if text is None:
+            return None
+        data = text.encode("utf-8")
+        if self.algorithm == "none" or len(data) < MIN_COMPRESS_SIZE:
+            return bytes([RAW]) + data
+        if self.algorithm == "zstd":
+            blob = self._header(ZSTD, ZSTD_DICT) + self._zstd.compress(data)
+        else:
+            if self.dictionary:
+                compressor = zlib.compressobj(ZLIB_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS, 9, zlib.Z_DEFAULT_STRATEGY, self.dictionary)
+            else:
+                compressor = zlib.compressobj(ZLIB_LEVEL)
+            blob = self._header(ZLIB, ZLIB_DICT) + compressor.compress(data) + compressor.flush()
+        return blob if len(blob) < len(data) + 1 else bytes([RAW]) + data
+
+def decode_text(blob: Optional[bytes], load_dictionary: DictionaryLoader) -> Optional[str]:
+    """Inverse of TextCodec.encode; dictionaries are fetched by id on demand"""
+    if blob is None:
+        return None
+    codec = blob[0]
+    if codec == RAW:
+        return blob[1:].decode("utf-8")
+    if codec in (ZLIB, ZSTD):
+        dictionary_id, payload = None, blob[1:]
+    else:
+        dictionary_id, payload = struct.unpack(">I", blob[1:5])[0], blob[5:]
+    if codec in (ZLIB, ZLIB_DICT):
+        if dictionary_id is None:
+            return zlib.decompress(payload).decode("utf-8")
+        decompressor = zlib.decompressobj(zdict=load_dictionary(dictionary_id))
+        return (decompressor.decompress(payload) + decompressor.flush()).decode("utf-8")
+    if zstandard is None:
+        raise RuntimeError("zstandard is required to read zstd-compressed values")
+    decompressor = _zstd_decompressors.get(dictionary_id)
+    if decompressor is None:
+        dict_data = zstandard.ZstdCompressionDict(load_dictionary(dictionary_id)) if dictionary_id is not None else None
+        decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+        _zstd_decompressors[dictionary_id] = decompressor
+    return decompressor.decompress(payload).decode("utf-8")
+
+def build_dictionary(samples: List[str], algorithm: Optional[str] = None) -> bytes:
+    """Build a preset dictionary from sample values.
+
+    zstd trains a real dictionary; zlib gets the tail of the concatenated
+    samples, since its matches prefer content closest to the data.
+    """
+    encoded = [sample.encode("utf-8") for sample in samples if sample]
+    if available_algorithm(algorithm) == "zstd":
+        return zstandard.train_dictionary(ZSTD_DICT_SIZE, encoded).as_bytes()
+    return b"".join(encoded)[-ZLIB_DICT_SIZE:]
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 import os
 
 class Settings(BaseSettings):
@@ -21,6 +21,30 @@ class Settings(BaseSettings):
     GOOGLE_CLIENT_ID: Optional[str] = None
     GOOGLE_CLIENT_SECRET: Optional[str] = None
     GOOGLE_REDIRECT_URI: str = "http://localhost:8000/api/auth/google/callback"
+    MAIL_BACKFILL_MAX_MESSAGES: int = 2000  # Cap on a full Gmail sync
+    GMAIL_FETCH_CONCURRENCY: int = 10  # Parallel message fetches per sync
+    MAIL_SEND_PER_MINUTE: int = 30  # Outgoing replies per provider, per process
+    MAIL_SEND_MAX_ATTEMPTS: int = 5
+    
+    # Email body storage
+    EMAIL_BODY_COMPRESSION: str = "zlib"  # Options: 'zlib', 'zstd' (needs zstandard), 'none'
+    EMAIL_BODY_DICTIONARY_MIN_SAMPLES: int = 200  # Bodies needed before a per-user dictionary is tried
+
+    # Local email priority scoring
+    EMAIL_PRIORITY_ACTION_THRESHOLD: int = 70  # Scores at or above this mark an email as needing action
+    EMAIL_PRIORITY_BORDERLINE_LOW: int = 40  # Scores in [LOW, HIGH] are re-checked by the LLM
+    EMAIL_PRIORITY_BORDERLINE_HIGH: int = 65
+    EMAIL_PRIORITY_LLM_REVIEW_LIMIT: int = 20  # Borderline emails sent to the LLM per sync; 0 disables
+    
+    # Microsoft Graph (Outlook)
+    OUTLOOK_CLIENT_ID: Optional[str] = None
+    OUTLOOK_CLIENT_SECRET: Optional[str] = None
+    OUTLOOK_REDIRECT_URI: str = "http://localhost:8000/api/auth/outlook/callback"
+    
+    # Calendar sync window
+    CALENDAR_SYNC_PAST_DAYS: int = 30
+    CALENDAR_SYNC_FUTURE_DAYS: int = 365
+    GOOGLE_CALENDAR_IDS: List[str] = ["primary"]  # Google calendars to sync, each with its own syncToken
     
     # Voice settings
     WHISPER_MODEL: str = "base"
@@ -44,9 +68,50 @@ class Settings(BaseSettings):
     SMTP_PORT: int = 25
     SMTP_USER: str = ""
     SMTP_PASSWORD: str = ""
+    NOTIFICATION_DELIVERY_INTERVAL_SECONDS: int = 60
+    NOTIFICATION_BATCH_SIZE: int = 200
+    NOTIFICATION_MAX_ATTEMPTS: int = 5
+    NOTIFICATION_RETRY_BASE_SECONDS: int = 60
+    NOTIFICATION_RETENTION_DAYS: int = 14  # sent and failed outbox rows are purged after this
+    
+    # Web Push (VAPID)
+    VAPID_PRIVATE_KEY: Optional[str] = None  # PEM or base64url raw key
+    VAPID_SUBJECT: str = "mailto:no-reply@ai-assistant.local"
+    WEB_PUSH_CONCURRENCY: int = 20
+    WEB_PUSH_TTL: int = 24 * 60 * 60  # seconds
+    
+    # Proactive review scheduler
+    REVIEW_INTERVAL_MINUTES: int = 10
+    REVIEW_MAX_ITEMS: int = 25  # per entity type in each prompt
+    REVIEW_PARTITIONS: int = 16  # users are split across worker processes by id hash
+    
+    # Background job queue
+    JOB_WORKERS: int = 3  # concurrent background jobs per process; worker 0 is reserved for interactive jobs
+    JOB_POLL_INTERVAL_SECONDS: float = 2.0
+    JOB_VISIBILITY_TIMEOUT_SECONDS: int = 300
+    JOB_RETENTION_DAYS: int = 7
+    
+    # Suggestion retention
+    SUGGESTION_RETENTION_DAYS: int = 30
+    SUGGESTION_RETENTION_MODE: str = "delete"  # Options: 'delete', 'archive'
+    
+    # Delta-sync change log
+    SYNC_CHANGE_RETENTION_DAYS: int = 30  # clients with an older cursor do a full reload
     
     # LLM Provider
     LLM_PROVIDER: str = "openai"  # Options: 'openai', 'ollama'
+    OLLAMA_BASE_URL: str = "http://localhost:11434"
+    OLLAMA_MODEL: str = "llama2"
+    
+    # LLM rate limiting (per process) and circuit breaker
+    LLM_REQUESTS_PER_MINUTE: int = 500
+    LLM_TOKENS_PER_MINUTE: int = 150000
+    LLM_MAX_CONCURRENCY: int = 16
+    LLM_LATENCY_TARGET_SECONDS: float = 20.0
+    LLM_MAX_RETRIES: int = 3
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 5
+    LLM_BREAKER_COOLDOWN_SECONDS: int = 30
+    LLM_FALLBACK_TO_LOCAL: bool = False
     
     class Config:
         env_file = ".env"
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, MetaData, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import StaticPool
@@ -52,15 +52,70 @@ async def init_db():
     """Initialize database tables"""
     try:
         # Import all models to ensure they're registered
-        from app.models import user, task, calendar_event, email_message, chat_message
+        from app.models import user, task, calendar_event, calendar_occurrence, email_message, email_thread, email_attachment, outbound_email, chat_message, suggestion, push_subscription, sync_change, review_state, job_lease, notification_outbox, background_job, sync_state, compression_dictionary
         
         # Create all tables
         Base.metadata.create_all(bind=engine)
+        migrate_schema()
+        from app.services.body_storage import compress_legacy_bodies
+        compress_legacy_bodies()
+        from app.services.email_threads import backfill_email_threads
+        backfill_email_threads()
+        from app.services.calendar_occurrences import backfill_calendar_occurrences
+        backfill_calendar_occurrences()
         print("✅ Database initialized successfully")
     except Exception as e:
         print(f"❌ Database initialization failed: {e}")
         raise
 
+# Idempotent data fixes run after columns are added. Graph ids (which
+# start with "AAMk" and run past 100 characters) used to be stored in the
+# Gmail/Google id columns; they move to provider + external_id.
+DATA_MIGRATIONS = [
+    """UPDATE email_messages
+       SET provider = CASE WHEN gmail_id LIKE 'AAMk%' OR length(gmail_id) > 100 THEN 'outlook' ELSE 'google' END,
+           external_id = gmail_id
+       WHERE external_id IS NULL AND gmail_id IS NOT NULL""",
+    "UPDATE email_messages SET gmail_id = NULL WHERE provider = 'outlook' AND gmail_id IS NOT NULL",
+    """UPDATE calendar_events
+       SET provider = CASE WHEN google_event_id LIKE 'AAMk%' OR length(google_event_id) > 100 THEN 'outlook' ELSE 'google' END,
+           external_id = google_event_id
+       WHERE external_id IS NULL AND google_event_id IS NOT NULL""",
+    "UPDATE calendar_events SET google_event_id = NULL WHERE provider = 'outlook' AND google_event_id IS NOT NULL",
+]
+
+def migrate_schema():
+    """Add columns and indexes introduced after a table was first created.
+
+    create_all only creates missing tables, so new nullable columns are
+    added with ALTER TABLE, DATA_MIGRATIONS backfill them, and every
+    declared index is created if absent.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+        for statement in DATA_MIGRATIONS:
+            conn.execute(text(statement))
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+def dialect_insert(db: Session, model):
+    """INSERT construct supporting on_conflict_do_nothing for the bound dialect"""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
 def get_db_session() -> Session:
     """Get a database session (for non-async contexts)"""
     return SessionLocal() 
\ No newline at end of file
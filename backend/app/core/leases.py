@@ -0,0 +1,119 @@
+from sqlalchemy import update, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import List
+import math
+import os
+import socket
+import uuid
+import zlib
+
+from app.models.job_lease import JobLease
+
+# Identity of this worker process in the lease table
+NODE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+NODE_PREFIX = "node:"
+
+def try_acquire(db: Session, name: str, ttl_seconds: int, holder: str = NODE_ID) -> bool:
+    """Acquire or renew a lease. Only one holder can own an unexpired lease."""
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    result = db.execute(
+        update(JobLease)
+        .where(JobLease.name == name, or_(JobLease.holder == holder, JobLease.expires_at < now))
+        .values(holder=holder, expires_at=expires_at, renewed_at=now)
+    )
+    if result.rowcount:
+        db.commit()
+        return True
+    db.rollback()
+    if db.query(JobLease.name).filter(JobLease.name == name).first() is not None:
+        return False
+    try:
+        db.add(JobLease(name=name, holder=holder, expires_at=expires_at, renewed_at=now))
+        db.commit()
+        return True
+    except IntegrityError:
+        # Another process created it first
+        db.rollback()
+        return False
+
+def release(db: Session, names: List[str], holder: str = NODE_ID):
+    if not names:
+        return
+    db.query(JobLease).filter(
+        JobLease.name.in_(names),
+        JobLease.holder == holder
+    ).delete(synchronize_session=False)
+    db.commit()
+
+def held_leases(db: Session, prefix: str, holder: str = NODE_ID) -> List[str]:
+    now = datetime.utcnow()
+    return [row.name for row in db.query(JobLease.name).filter(
+        JobLease.name.like(f"{prefix}%"),
+        JobLease.holder == holder,
+        JobLease.expires_at >= now
+    )]
+
+def live_node_count(db: Session) -> int:
+    now = datetime.utcnow()
+    return db.query(JobLease).filter(
+        JobLease.name.like(f"{NODE_PREFIX}%"),
+        JobLease.expires_at >= now
+    ).count()
+
+def claim_partitions(db: Session, job: str, partitions: int, ttl_seconds: int) -> List[int]:
+    """Renew and claim this node's fair share of a partitioned job.
+
+    Every node heartbeats a `node:` lease, so the share is the partition
+    count divided by the number of live nodes. Partitions above the share
+    are released so nodes that joined later can pick them up.
+    """
+    try_acquire(db, f"{NODE_PREFIX}{NODE_ID}", ttl_seconds)
+    share = math.ceil(partitions / max(live_node_count(db), 1))
+    prefix = f"{job}:"
+    held = sorted(held_leases(db, prefix), key=lambda name: int(name[len(prefix):]))
+
+    owned = []
+    for name in held[:share]:
+        if try_acquire(db, name, ttl_seconds):
+            owned.append(int(name[len(prefix):]))
+    release(db, held[share:])
+
+    for partition in range(partitions):
+        if len(owned) >= share:
+            break
+        if partition in owned:
+            continue
+        if try_acquire(db, f"{prefix}{partition}", ttl_seconds):
+            owned.append(partition)
+    return sorted(owned)
+
+def release_all(db: Session, holder: str = NODE_ID):
+    """Drop every lease held by this node, e.g. on shutdown"""
+    db.query(JobLease).filter(JobLease.holder == holder).delete(synchronize_session=False)
+    db.commit()
+
+def purge_dead_nodes(db: Session) -> int:
+    """Delete expired `node:` leases.
+
+    Every process start heartbeats under a new NODE_ID, so leases of
+    crashed processes would otherwise pile up. A live node whose lease
+    lapsed simply recreates it on its next heartbeat.
+    """
+    deleted = db.query(JobLease).filter(
+        JobLease.name.like(f"{NODE_PREFIX}%"),
+        JobLease.expires_at < datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+def run_if_leader(db: Session, job: str, ttl_seconds: int) -> bool:
+    """Whether this node should run a singleton job now"""
+    return try_acquire(db, f"job:{job}", ttl_seconds)
+
+def partition_of(key: str, partitions: int) -> int:
+    """Stable partition for a key, identical across processes and restarts"""
+    return zlib.crc32(key.encode()) % partitions
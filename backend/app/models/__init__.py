@@ -1,17 +1,39 @@
 from .user import User
 from .task import Task
 from .calendar_event import CalendarEvent
+from .calendar_occurrence import CalendarOccurrence
 from .email_message import EmailMessage
+from .email_thread import EmailThread
+from .email_attachment import EmailAttachment
+from .outbound_email import OutboundEmail
 from .chat_message import ChatMessage
 from .suggestion import Suggestion
 from .push_subscription import PushSubscription
+from .sync_change import SyncChange
+from .review_state import ReviewState
+from .job_lease import JobLease
+from .notification_outbox import NotificationOutbox
+from .background_job import BackgroundJob
+from .sync_state import SyncState
+from .compression_dictionary import CompressionDictionary
 
 __all__ = [
     "User",
     "Task", 
     "CalendarEvent",
+    "CalendarOccurrence",
     "EmailMessage",
+    "EmailThread",
+    "EmailAttachment",
+    "OutboundEmail",
     "ChatMessage",
     "Suggestion",
-    "PushSubscription"
+    "PushSubscription",
+    "SyncChange",
+    "ReviewState",
+    "JobLease",
+    "NotificationOutbox",
+    "BackgroundJob",
+    "SyncState",
+    "CompressionDictionary"
 ] 
\ No newline at end of file
@@ -0,0 +1,42 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, JSON, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+import uuid
+
+class BackgroundJob(Base):
+    """Durable unit of background work claimed by the job worker pool"""
+    __tablename__ = "background_jobs"
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, ForeignKey("users.id"), nullable=True)
+    kind = Column(String, nullable=False)  # handler name, e.g. 'ai_review_user'
+    payload = Column(JSON, nullable=True)
+    priority = Column(Integer, nullable=False, default=50)  # lower runs first
+    dedup_key = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="queued")  # 'queued', 'running', 'succeeded', 'failed'
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(DateTime, nullable=False)
+    locked_by = Column(String, nullable=True)  # claim token: node id plus a per-claim suffix
+    locked_until = Column(DateTime, nullable=True)  # visibility timeout while running
+    progress = Column(JSON, nullable=True)
+    result = Column(JSON, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_background_jobs_claim", "status", "priority", "run_after"),
+    )
+
+    def __repr__(self):
+        return f"<BackgroundJob(id={self.id}, kind={self.kind}, status={self.status})>"
+
+# Only one queued or running job per dedup key
+Index(
+    "ux_background_jobs_dedup_active",
+    BackgroundJob.dedup_key,
+    unique=True,
+    sqlite_where=BackgroundJob.status.in_(["queued", "running"]),
+    postgresql_where=BackgroundJob.status.in_(["queued", "running"])
+)
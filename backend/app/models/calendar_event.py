@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -10,8 +10,10 @@ class CalendarEvent(Base):
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
     
-    # Google Calendar ID
-    google_event_id = Column(String, nullable=True, unique=True)
+    # Provider identity: ('google', Calendar event id) or ('outlook', Graph event id)
+    provider = Column(String, nullable=True)
+    external_id = Column(String, nullable=True)
+    google_event_id = Column(String, nullable=True, unique=True)  # Legacy, superseded by external_id
     
     # Event details
     title = Column(String, nullable=False)
@@ -23,6 +25,16 @@ class CalendarEvent(Base):
     end_time = Column(DateTime(timezone=True), nullable=False)
     all_day = Column(Boolean, default=False)
     
+    # Recurrence: a series master holds its RFC 5545 RRULE/RDATE/EXDATE
+    # lines, one per line, and is expanded into calendar_occurrences
+    recurrence = Column(Text, nullable=True)
+    timezone = Column(String, nullable=True)  # IANA zone the series repeats in; UTC when unset
+    expanded_until = Column(DateTime(timezone=True), nullable=True)  # End of the materialized occurrences
+    # An exception replaces one instance of a series: moved, edited or cancelled
+    recurring_event_id = Column(String, nullable=True)  # external_id of the series master
+    original_start_time = Column(DateTime(timezone=True), nullable=True)  # Start of the instance it replaces
+    status = Column(String, nullable=True)  # 'cancelled' for a removed instance
+    
     # Calendar info
     calendar_id = Column(String, nullable=True)  # Google Calendar ID
     attendees = Column(Text, nullable=True)  # JSON string of attendees
@@ -38,5 +50,10 @@ class CalendarEvent(Base):
     # Relationships
     user = relationship("User", back_populates="calendar_events")
     
+    __table_args__ = (
+        Index("ux_calendar_events_user_provider_external", "user_id", "provider", "external_id", unique=True),
+        Index("ix_calendar_events_user_provider_series", "user_id", "provider", "recurring_event_id"),
+    )
+    
     def __repr__(self):
         return f"<CalendarEvent(id={self.id}, title={self.title}, start={self.start_time})>" 
\ No newline at end of file
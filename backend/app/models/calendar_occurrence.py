@@ -0,0 +1,29 @@
+from sqlalchemy import Column, String, DateTime, Boolean, ForeignKey, Index
+from app.core.database import Base
+import uuid
+
+class CalendarOccurrence(Base):
+    """One concrete instance of a calendar event, derived from calendar_events.
+
+    Single events have one occurrence; recurring series are expanded over
+    the calendar window by app.services.calendar_occurrences and kept up
+    to date whenever the series or one of its exceptions changes, so range
+    queries read this table instead of evaluating recurrence rules.
+    """
+    __tablename__ = "calendar_occurrences"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    event_id = Column(String, ForeignKey("calendar_events.id"), nullable=False)  # Row with the details: the event, series master or exception
+    series_id = Column(String, nullable=False)  # Series master, or the event itself when it does not repeat
+    start_time = Column(DateTime(timezone=True), nullable=False)
+    end_time = Column(DateTime(timezone=True), nullable=False)
+    all_day = Column(Boolean, default=False)
+
+    __table_args__ = (
+        Index("ix_calendar_occurrences_user_start", "user_id", "start_time"),
+        Index("ix_calendar_occurrences_series", "series_id"),
+    )
+
+    def __repr__(self):
+        return f"<CalendarOccurrence(event_id={self.event_id}, start={self.start_time})>"
@@ -0,0 +1,38 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, LargeBinary, ForeignKey
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+from typing import Dict, Optional
+from app.core.database import Base, SessionLocal
+
+class CompressionDictionary(Base):
+    """Per-user preset dictionary for compressed email bodies.
+
+    Stored values reference a dictionary by id, so rows are immutable and
+    only used for new writes when `gain` (the size saved on the samples it
+    was built from) makes it worthwhile.
+    """
+    __tablename__ = "compression_dictionaries"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    algorithm = Column(String, nullable=False)  # 'zlib', 'zstd'
+    data = Column(LargeBinary, nullable=False)
+    gain = Column(Float, nullable=False, default=0.0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<CompressionDictionary(id={self.id}, user_id={self.user_id}, algorithm={self.algorithm})>"
+
+_dictionaries: Dict[int, bytes] = {}
+
+def get_dictionary(db: Optional[Session], dictionary_id: int) -> bytes:
+    """Dictionary bytes by id, cached for the life of the process"""
+    data = _dictionaries.get(dictionary_id)
+    if data is None:
+        session = db or SessionLocal()
+        try:
+            data = session.get(CompressionDictionary, dictionary_id).data
+        finally:
+            if db is None:
+                session.close()
+        _dictionaries[dictionary_id] = data
+    return data
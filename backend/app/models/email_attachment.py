@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+import uuid
+
+class EmailAttachment(Base):
+    """An attachment of a synced email.
+
+    Rows are recorded from message metadata; the content is downloaded on
+    first use into content-addressed storage (app.services.attachments),
+    after which `sha256` names the stored file. Identical files attached to
+    several emails share one stored copy.
+    """
+    __tablename__ = "email_attachments"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    email_id = Column(String, ForeignKey("email_messages.id"), nullable=False)
+    provider = Column(String, nullable=False)
+    external_id = Column(String, nullable=False)  # Gmail partId or Graph attachment id
+    download_id = Column(String, nullable=True)  # Gmail attachmentId; None when the data is inline in the message
+    filename = Column(String, nullable=False)
+    content_type = Column(String, nullable=True)
+    size = Column(Integer, nullable=True)  # As reported by the provider
+    is_inline = Column(Boolean, default=False)
+    sha256 = Column(String, nullable=True)  # Set once the content is stored
+    downloaded_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ux_email_attachments_email_external", "email_id", "external_id", unique=True),
+        Index("ix_email_attachments_user_sha256", "user_id", "sha256"),
+        Index("ix_email_attachments_user_file", "user_id", "filename", "size"),
+    )
+
+    def __repr__(self):
+        return f"<EmailAttachment(id={self.id}, filename={self.filename}, size={self.size})>"
@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, JSON, Index, LargeBinary
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred, object_session
 from app.core.database import Base
+from app.core.compression import TextCodec, decode_text
+from app.models.compression_dictionary import get_dictionary
 import uuid
 
 class EmailMessage(Base):
@@ -10,16 +12,26 @@ class EmailMessage(Base):
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
     
-    # Gmail ID
-    gmail_id = Column(String, nullable=True, unique=True)
+    # Provider identity: ('google', Gmail message id) or ('outlook', Graph message id)
+    provider = Column(String, nullable=True)
+    external_id = Column(String, nullable=True)
+    gmail_id = Column(String, nullable=True, unique=True)  # Legacy, superseded by external_id
     thread_id = Column(String, nullable=True)
     
     # Email details
     subject = Column(String, nullable=False)
     sender = Column(String, nullable=False)
     recipients = Column(JSON, nullable=True)  # List of email addresses
-    body = Column(Text, nullable=True)
-    body_plain = Column(Text, nullable=True)
+    # Bodies are stored compressed (app.core.compression) in deferred
+    # columns, so they are only loaded and inflated when read through the
+    # `body` / `body_plain` properties. The text columns are legacy and
+    # emptied by app.services.body_storage.compress_legacy_bodies.
+    body_z = deferred(Column(LargeBinary, nullable=True), group="body")
+    body_plain_z = deferred(Column(LargeBinary, nullable=True), group="body")
+    _legacy_body = deferred(Column("body", Text, nullable=True), group="legacy_body")
+    _legacy_body_plain = deferred(Column("body_plain", Text, nullable=True), group="legacy_body")
+    body_pending = Column(Boolean, default=False)  # Synced as metadata; full body not fetched yet
+    has_attachments = Column(Boolean, nullable=True)  # None until the message structure is known
     
     # Status
     is_read = Column(Boolean, default=False)
@@ -31,6 +43,7 @@ class EmailMessage(Base):
     ai_suggested_reply = Column(Text, nullable=True)
     ai_priority_score = Column(Integer, default=0)  # 0-100
     ai_action_required = Column(Boolean, default=False)
+    ai_priority_source = Column(String, nullable=True)  # 'local', 'llm', 'llm_skipped' (no usable LLM rating); None until scored
     
     # Timestamps
     received_at = Column(DateTime(timezone=True), nullable=False)
@@ -40,5 +53,33 @@ class EmailMessage(Base):
     # Relationships
     user = relationship("User", back_populates="email_messages")
     
+    __table_args__ = (
+        Index("ux_email_messages_user_provider_external", "user_id", "provider", "external_id", unique=True),
+    )
+    
+    def _decode(self, blob):
+        return decode_text(blob, lambda dictionary_id: get_dictionary(object_session(self), dictionary_id))
+    
+    @property
+    def body(self):
+        # The legacy column is only loaded for rows not migrated yet
+        blob = self.body_z
+        return self._decode(blob) if blob is not None else self._legacy_body
+    
+    @body.setter
+    def body(self, value):
+        self.body_z = TextCodec().encode(value)
+        self._legacy_body = None
+    
+    @property
+    def body_plain(self):
+        blob = self.body_plain_z
+        return self._decode(blob) if blob is not None else self._legacy_body_plain
+    
+    @body_plain.setter
+    def body_plain(self, value):
+        self.body_plain_z = TextCodec().encode(value)
+        self._legacy_body_plain = None
+    
     def __repr__(self):
         return f"<EmailMessage(id={self.id}, subject={self.subject}, sender={self.sender})>" 
\ No newline at end of file
@@ -0,0 +1,38 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, JSON, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+import uuid
+
+class EmailThread(Base):
+    """One row per conversation, derived from the user's email_messages.
+
+    Maintained by app.services.email_threads whenever synced messages in
+    the thread are added, changed or deleted, so conversation lists never
+    have to group the messages table.
+    """
+    __tablename__ = "email_threads"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    provider = Column(String, nullable=False)
+    thread_id = Column(String, nullable=False)  # Gmail threadId or Graph conversationId
+
+    subject = Column(String, nullable=False)
+    participants = Column(JSON, nullable=True)  # Senders and recipients, in order of first appearance
+    message_count = Column(Integer, nullable=False, default=0)
+    unread_count = Column(Integer, nullable=False, default=0)
+    last_message_id = Column(String, nullable=True)
+    last_sender = Column(String, nullable=True)
+    snippet = Column(Text, nullable=True)
+    last_message_at = Column(DateTime(timezone=True), nullable=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ux_email_threads_user_provider_thread", "user_id", "provider", "thread_id", unique=True),
+        Index("ix_email_threads_user_last_message", "user_id", "last_message_at"),
+    )
+
+    def __repr__(self):
+        return f"<EmailThread(id={self.id}, subject={self.subject}, messages={self.message_count})>"
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, DateTime
+from app.core.database import Base
+
+class JobLease(Base):
+    """Time-limited ownership of a named job or job partition by one process"""
+    __tablename__ = "job_leases"
+    name = Column(String, primary_key=True)  # e.g. 'ai_review:3', 'node:<node id>'
+    holder = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    renewed_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<JobLease(name={self.name}, holder={self.holder}, expires_at={self.expires_at})>"
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+import uuid
+
+class NotificationOutbox(Base):
+    """Notification waiting for (or done with) delivery by the outbox worker"""
+    __tablename__ = "notification_outbox"
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    channel = Column(String, nullable=False, default="email")
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    suggestion_id = Column(String, ForeignKey("suggestions.id", ondelete="SET NULL"), nullable=True)
+    status = Column(String, nullable=False, default="pending")  # 'pending', 'sent', 'failed'
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, server_default=func.now())
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_notification_outbox_status_due", "status", "next_attempt_at"),
+    )
+
+    def __repr__(self):
+        return f"<NotificationOutbox(id={self.id}, channel={self.channel}, status={self.status})>"
@@ -0,0 +1,36 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, JSON, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+import uuid
+
+class OutboundEmail(Base):
+    """A reply queued for sending through the user's mail provider.
+
+    The `email_send` job does the sending; `status` tracks it from
+    'queued' through 'sending' to 'sent' or 'failed'. A row left in
+    'sending' may or may not have reached the provider; `message_id` is
+    what the next attempt looks for in the sent folder before resending.
+    """
+    __tablename__ = "outbound_emails"
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    email_id = Column(String, ForeignKey("email_messages.id", ondelete="SET NULL"), nullable=True)  # Message replied to
+    provider = Column(String, nullable=False)
+    recipients = Column(JSON, nullable=True)
+    subject = Column(String, nullable=True)
+    body = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="queued")  # 'queued', 'sending', 'sent', 'failed'
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    job_id = Column(String, nullable=True)
+    external_id = Column(String, nullable=True)  # Provider id of the sent message (Outlook: of the reply draft)
+    message_id = Column(String, nullable=True)  # RFC 822 Message-ID, fixed before the first send
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_outbound_emails_user_created", "user_id", "created_at"),
+    )
+
+    def __repr__(self):
+        return f"<OutboundEmail(id={self.id}, provider={self.provider}, status={self.status})>"
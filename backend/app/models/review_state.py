@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class ReviewState(Base):
+    """Per-user watermark for the proactive review scheduler.
+
+    `change_watermark` is the last sync_changes id covered by a review, so
+    a user is only reviewed again once tasks, emails or events change.
+    """
+    __tablename__ = "review_states"
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    change_watermark = Column(Integer, nullable=False, default=0)
+    last_summary = Column(Text, nullable=True)  # JSON counts sent with the last review
+    last_reviewed_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<ReviewState(user_id={self.user_id}, watermark={self.change_watermark})>"
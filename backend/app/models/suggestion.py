@@ -1,22 +1,40 @@
-from sqlalchemy import Column, String, DateTime, Boolean, Text, ForeignKey
+from sqlalchemy import Column, String, DateTime, Boolean, Text, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
+import hashlib
 import uuid
 
+def suggestion_hash(message: str) -> str:
+    """Hash of the normalized message text, used to dedup unread suggestions"""
+    normalized = " ".join(message.split()).lower()
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
 class Suggestion(Base):
     __tablename__ = "suggestions"
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
     type = Column(String, nullable=False)  # e.g., 'task', 'email', 'calendar', 'reminder'
     message = Column(Text, nullable=False)
+    content_hash = Column(String(64), nullable=True)
     related_task_id = Column(String, ForeignKey("tasks.id"), nullable=True)
     related_email_id = Column(String, ForeignKey("email_messages.id"), nullable=True)
     related_event_id = Column(String, ForeignKey("calendar_events.id"), nullable=True)
     is_read = Column(Boolean, default=False)
     is_notified = Column(Boolean, default=False)
+    archived_at = Column(DateTime(timezone=True), nullable=True)  # set by the retention job
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     user = relationship("User", backref="suggestions")
 
     def __repr__(self):
-        return f"<Suggestion(id={self.id}, type={self.type}, message={self.message[:30]})>" 
\ No newline at end of file
+        return f"<Suggestion(id={self.id}, type={self.type}, message={self.message[:30]})>"
+
+# At most one unread suggestion per message per user
+Index(
+    "ux_suggestions_user_hash_unread",
+    Suggestion.user_id,
+    Suggestion.content_hash,
+    unique=True,
+    sqlite_where=Suggestion.is_read == False,
+    postgresql_where=Suggestion.is_read == False
+)
@@ -0,0 +1,112 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index, event, func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import Base
+from datetime import datetime, timedelta
+from typing import Optional
+
+# Tables exposed through /api/sync/changes, keyed by table name
+SYNC_ENTITY_TYPES = {
+    "tasks": "task",
+    "calendar_events": "calendar_event",
+    "email_messages": "email",
+    "email_threads": "email_thread",
+    "suggestions": "suggestion",
+    "chat_messages": "chat_message",
+}
+
+class SyncChange(Base):
+    """Append-only change log backing the delta-sync feed.
+
+    The autoincrement id is the sync cursor. Deletions are stored as
+    tombstones (op='delete'); op='reset' with no entity_id means every
+    entity of that type was removed at once. Old entries are purged from
+    the low end of the log (purge_sync_changes), so cursors below
+    sync_horizon() can no longer be served a complete delta.
+    """
+    __tablename__ = "sync_changes"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String, nullable=False)
+    entity_type = Column(String, nullable=False)
+    entity_id = Column(String, nullable=True)
+    op = Column(String, nullable=False)  # 'upsert', 'delete', 'reset'
+    changed_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_sync_changes_user_id_id", "user_id", "id"),
+        Index("ix_sync_changes_user_type_id", "user_id", "entity_type", "id"),
+    )
+
+    def __repr__(self):
+        return f"<SyncChange(id={self.id}, {self.op} {self.entity_type}:{self.entity_id})>"
+
+def record_changes(db: Session, user_id: str, entity_type: str, entity_ids, op: str = "upsert"):
+    """Record changes made with bulk statements, which bypass the flush hook"""
+    now = datetime.utcnow()
+    rows = [
+        {"user_id": user_id, "entity_type": entity_type, "entity_id": entity_id, "op": op, "changed_at": now}
+        for entity_id in entity_ids
+    ]
+    if rows:
+        db.execute(SyncChange.__table__.insert(), rows)
+
+def record_reset(db: Session, user_id: str, entity_type: str):
+    """Record that every entity of a type was removed for a user"""
+    db.execute(SyncChange.__table__.insert(), [{
+        "user_id": user_id,
+        "entity_type": entity_type,
+        "entity_id": None,
+        "op": "reset",
+        "changed_at": datetime.utcnow()
+    }])
+
+def purge_sync_changes(db: Session, older_than_days: Optional[int] = None, batch_size: int = 5000) -> int:
+    """Delete the oldest entries, up to the first one newer than SYNC_CHANGE_RETENTION_DAYS.
+
+    Only a prefix of the log by id is removed, and the newest entry always
+    stays, so the lowest remaining id marks where the log was cut.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days or settings.SYNC_CHANGE_RETENTION_DAYS)
+    deleted = 0
+    while True:
+        rows = db.query(SyncChange.id, SyncChange.changed_at).order_by(SyncChange.id).limit(batch_size).all()
+        expired = []
+        for row in rows:
+            if row.changed_at >= cutoff:
+                break
+            expired.append(row.id)
+        if len(expired) == len(rows) and len(rows) < batch_size:
+            expired = expired[:-1]  # the whole log expired; keep its newest entry
+        if not expired:
+            break
+        deleted += db.query(SyncChange).filter(SyncChange.id.in_(expired)).delete(synchronize_session=False)
+        db.commit()
+        if len(expired) < len(rows):
+            break
+    return deleted
+
+def sync_horizon(db: Session) -> int:
+    """Lowest cursor from which the log still holds every later change"""
+    first = db.query(func.min(SyncChange.id)).scalar()
+    return first - 1 if first else 0
+
+@event.listens_for(Session, "after_flush")
+def _log_flushed_changes(session, flush_context):
+    rows = []
+    now = datetime.utcnow()
+    for op, objects in (("upsert", session.new), ("upsert", session.dirty), ("delete", session.deleted)):
+        for obj in objects:
+            entity_type = SYNC_ENTITY_TYPES.get(getattr(obj, "__tablename__", None))
+            if not entity_type or not getattr(obj, "user_id", None):
+                continue
+            if op == "upsert" and obj in session.dirty and not session.is_modified(obj, include_collections=False):
+                continue
+            rows.append({
+                "user_id": obj.user_id,
+                "entity_type": entity_type,
+                "entity_id": obj.id,
+                "op": op,
+                "changed_at": now
+            })
+    if rows:
+        session.connection().execute(SyncChange.__table__.insert(), rows)
@@ -0,0 +1,35 @@
+from sqlalchemy import Column, String, DateTime, Text, ForeignKey
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class SyncState(Base):
+    """Per-user incremental sync cursor for one provider resource.
+
+    `cursor` is whatever the provider hands back for resuming: a Gmail
+    historyId, a Graph deltaLink or a Calendar syncToken. A missing or
+    cleared cursor means the next sync is a full backfill. A backfill
+    commits its next page token with every page, so an interrupted one
+    resumes where it stopped.
+    """
+    __tablename__ = "sync_states"
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    provider = Column(String, primary_key=True)  # 'google', 'outlook'
+    resource = Column(String, primary_key=True)  # 'gmail', 'calendar', ...
+    cursor = Column(Text, nullable=True)
+    # Checkpoint of an unfinished backfill: the cursor it will end at and the next page
+    backfill_cursor = Column(Text, nullable=True)
+    backfill_page_token = Column(Text, nullable=True)
+    last_full_sync_at = Column(DateTime(timezone=True), nullable=True)
+    last_synced_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<SyncState(user_id={self.user_id}, provider={self.provider}, resource={self.resource})>"
+
+def get_sync_state(db, user_id: str, provider: str, resource: str) -> SyncState:
+    """Load the sync state for a resource, creating an empty one on first use"""
+    state = db.get(SyncState, (user_id, provider, resource))
+    if state is None:
+        state = SyncState(user_id=user_id, provider=provider, resource=resource)
+        db.add(state)
+    return state
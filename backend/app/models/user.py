@@ -23,6 +23,8 @@ class User(Base):
     timezone = Column(String, default="UTC")
     language = Column(String, default="en")
     notifications_enabled = Column(Boolean, default=True)
+    # Maintained on insert/read/clear so the badge never counts rows
+    unread_suggestion_count = Column(Integer, nullable=True, default=0)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     # Relationships
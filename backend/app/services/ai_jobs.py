@@ -0,0 +1,123 @@
+import asyncio
+from typing import Optional
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.email_message import EmailMessage
+from app.models.sync_change import record_changes
+from app.models.user import User
+from app.services.ai_service import AIService
+from app.services.email_priority import TEXT_PREVIEW_LENGTH, borderline_emails
+from app.services.gmail_sync import load_gmail_body
+from app.services.job_queue import JobContext, job_handler
+
+_ai: Optional[AIService] = None
+
+def _get_ai() -> AIService:
+    global _ai
+    if _ai is None:
+        _ai = AIService()
+    return _ai
+
+async def _load_email_content(email_id: str, user_id: str) -> Optional[str]:
+    db = SessionLocal()
+    try:
+        email = db.query(EmailMessage).filter(
+            EmailMessage.id == email_id,
+            EmailMessage.user_id == user_id
+        ).first()
+        if email is None:
+            return None
+        if email.body_pending:
+            await load_gmail_body(db, db.get(User, user_id), email)
+        return email.body_plain or email.body or ""
+    finally:
+        db.close()
+
+def _store(email_id: str, user_id: str, **values):
+    db = SessionLocal()
+    try:
+        updated = db.query(EmailMessage).filter(
+            EmailMessage.id == email_id,
+            EmailMessage.user_id == user_id
+        ).update(values, synchronize_session=False)
+        # Bulk updates bypass the flush hook, so delta-sync clients are told explicitly
+        if updated:
+            record_changes(db, user_id, "email", [email_id])
+        db.commit()
+    finally:
+        db.close()
+
+@job_handler("email_reply_draft")
+async def draft_email_reply(job: JobContext):
+    content = await _load_email_content(job.payload["email_id"], job.user_id)
+    if content is None:
+        return {"skipped": "email not found"}
+    reply = await _get_ai().suggest_email_reply(content)
+    _store(job.payload["email_id"], job.user_id, ai_suggested_reply=reply)
+    return {"suggested_reply": reply}
+
+@job_handler("email_summary")
+async def summarize_email(job: JobContext):
+    content = await _load_email_content(job.payload["email_id"], job.user_id)
+    if content is None:
+        return {"skipped": "email not found"}
+    summary = await _get_ai().summarize_email(content)
+    _store(job.payload["email_id"], job.user_id, ai_summary=summary)
+    return {"summary": summary}
+
+@job_handler("email_priority_review")
+async def review_email_priority(job: JobContext):
+    """Let the LLM settle locally scored emails that landed near the threshold.
+
+    The candidates are read and the session closed before the LLM calls,
+    then the ratings are written back in a fresh session. Emails the LLM
+    gave no usable rating for are marked 'llm_skipped' so later reviews
+    do not ask about them again; emails whose call failed stay queued for
+    the next review.
+    """
+    db = SessionLocal()
+    try:
+        candidates = [
+            (email.id, email.sender, email.subject, (email.body_plain or "")[:TEXT_PREVIEW_LENGTH])
+            for email in borderline_emails(db, job.user_id, settings.EMAIL_PRIORITY_LLM_REVIEW_LIMIT)
+        ]
+    finally:
+        db.close()
+
+    ratings = await asyncio.gather(*[
+        _get_ai().rate_email_priority(sender, subject, preview)
+        for _, sender, subject, preview in candidates
+    ], return_exceptions=True)
+
+    updates = []
+    for (email_id, *_), rating in zip(candidates, ratings):
+        if isinstance(rating, dict):
+            updates.append({
+                "id": email_id,
+                "ai_priority_score": rating["priority"],
+                "ai_action_required": rating["action_required"],
+                "ai_priority_source": "llm"
+            })
+        elif rating is None:
+            updates.append({"id": email_id, "ai_priority_source": "llm_skipped"})
+    if updates:
+        db = SessionLocal()
+        try:
+            db.bulk_update_mappings(EmailMessage, updates)
+            record_changes(db, job.user_id, "email", [row["id"] for row in updates])
+            db.commit()
+        finally:
+            db.close()
+
+    reviewed = sum(1 for row in updates if row["ai_priority_source"] == "llm")
+    failed = [rating for rating in ratings if isinstance(rating, Exception)]
+    if failed and not updates:
+        raise failed[0]
+    return {"reviewed": reviewed, "skipped": len(updates) - reviewed, "failed": len(failed)}
+
+async def close():
+    global _ai
+    if _ai is not None:
+        await _ai.close()
+        _ai = None
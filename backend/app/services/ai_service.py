@@ -1,6 +1,6 @@
 import openai
 from sqlalchemy.orm import Session
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 import json
 from datetime import datetime, timedelta
 import requests
@@ -9,12 +9,18 @@ import aiohttp
 from app.core.config import settings
 from app.models.task import Task, TaskPriority, TaskStatus
 from app.models.email_message import EmailMessage
+from app.models.email_thread import EmailThread
 from app.models.calendar_event import CalendarEvent
+from app.models.calendar_occurrence import CalendarOccurrence
 from app.models.user import User
+from app.services.realtime import realtime_hub
+from app.services.calendar_occurrences import refresh_occurrences, upcoming_occurrences
+from app.services.llm_guard import llm_guard, request_key, CircuitOpenError
 
 class AIService:
     def __init__(self):
-        self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+        # Retries are owned by llm_guard so they share its rate budget
+        self.async_client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY, max_retries=0)
         self.model = settings.OPENAI_MODEL
         self.max_tokens = settings.OPENAI_MAX_TOKENS
         self.agent_base_url = "http://localhost:8000/api/agent"  # Assumes backend runs locally
@@ -108,7 +114,11 @@ class AIService:
                     else:
                         return {"content": "Sorry, I couldn't search the web right now."}
         # Fallback to classic LLM chat
-        system_prompt = self._build_system_prompt(user, recent_tasks, recent_emails, upcoming_events)
+        user = db.query(User).filter(User.id == user_id).first()
+        recent_tasks = self._get_recent_tasks(db, user_id)
+        recent_threads = self._get_recent_threads(db, user_id)
+        upcoming_events = self._get_upcoming_events(db, user_id)
+        system_prompt = self._build_system_prompt(user, recent_tasks, recent_threads, upcoming_events)
         
         # Get AI response
         response = await self._get_ai_response(system_prompt, user_message)
@@ -130,8 +140,8 @@ class AIService:
         self, 
         user: User, 
         tasks: List[Task], 
-        emails: List[EmailMessage], 
-        events: List[CalendarEvent]
+        threads: List[EmailThread], 
+        events: List[Tuple[CalendarOccurrence, CalendarEvent]]
     ) -> str:
         """Build system prompt with user context"""
         
@@ -147,13 +157,14 @@ Recent Tasks ({len(tasks)}):
         for task in tasks[:5]:  # Show last 5 tasks
             prompt += f"- {task.title} ({task.priority.value}, {task.status.value})\n"
         
-        prompt += f"\nRecent Emails ({len(emails)}):\n"
-        for email in emails[:3]:  # Show last 3 emails
-            prompt += f"- {email.subject} from {email.sender}\n"
+        prompt += f"\nRecent Email Conversations ({len(threads)}):\n"
+        for thread in threads[:3]:  # Show last 3 conversations
+            unread = f", {thread.unread_count} unread" if thread.unread_count else ""
+            prompt += f"- {thread.subject} ({thread.message_count} messages{unread}, last from {thread.last_sender})\n"
         
         prompt += f"\nUpcoming Events ({len(events)}):\n"
-        for event in events[:3]:  # Show next 3 events
-            prompt += f"- {event.title} at {event.start_time}\n"
+        for occurrence, event in events[:3]:  # Show next 3 events
+            prompt += f"- {event.title} at {occurrence.start_time}\n"
         
         prompt += """
 
@@ -181,36 +192,99 @@ Respond naturally and suggest actions when appropriate. Use JSON format for acti
         """Get response from OpenAI or Ollama based on config"""
         if getattr(settings, 'LLM_PROVIDER', 'openai') == 'ollama':
             return await self._get_ollama_response(system_prompt, user_message)
-        else:
-            try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_message}
-                    ],
-                    max_tokens=self.max_tokens,
-                    temperature=0.7
-                )
-                return response.choices[0].message.content
-            except Exception as e:
-                return f"I'm sorry, I encountered an error: {str(e)}"
+        try:
+            return await self.complete(
+                [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_message}
+                ],
+                max_tokens=self.max_tokens,
+                temperature=0.7
+            )
+        except CircuitOpenError:
+            return "I'm having trouble reaching the AI provider right now. Please try again in a moment."
+        except openai.RateLimitError:
+            return "I'm receiving a lot of requests right now. Please try again in a moment."
+        except Exception as e:
+            return f"I'm sorry, I encountered an error: {str(e)}"
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float
+    ) -> str:
+        """Run a chat completion through the shared rate limiter and circuit breaker.
+
+        Concurrent identical requests share one provider call. Raises
+        CircuitOpenError while the remote provider is unhealthy, unless
+        LLM_FALLBACK_TO_LOCAL routes the call to Ollama instead.
+        """
+        key = request_key(self.model, messages, max_tokens, temperature)
+        return await llm_guard.single_flight.do(
+            key, lambda: self._complete(messages, max_tokens, temperature)
+        )
+
+    async def _complete(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float
+    ) -> str:
+        if getattr(settings, 'LLM_PROVIDER', 'openai') == 'ollama':
+            return await self._ollama_chat(messages, max_tokens, temperature)
+
+        async def call():
+            response = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature
+            )
+            return response.choices[0].message.content
+
+        # Rough prompt size (4 chars per token) plus the completion budget
+        estimated_tokens = sum(len(m["content"]) for m in messages) // 4 + max_tokens
+        try:
+            return await llm_guard.call(call, estimated_tokens)
+        except CircuitOpenError:
+            if not settings.LLM_FALLBACK_TO_LOCAL:
+                raise
+            llm_guard.metrics["fallbacks"] += 1
+            return await self._ollama_chat(messages, max_tokens, temperature)
+
+    async def close(self):
+        await self.async_client.close()
 
     async def _get_ollama_response(self, system_prompt: str, user_message: str) -> str:
         """Call local Ollama API for a response"""
         prompt = f"{system_prompt}\nUser: {user_message}\nAssistant:"
         payload = {
-            "model": "llama2",  # Change to your preferred Ollama model
+            "model": settings.OLLAMA_MODEL,
             "prompt": prompt,
             "stream": False
         }
         try:
             async with aiohttp.ClientSession() as session:
-                async with session.post("http://localhost:11434/api/generate", json=payload) as resp:
+                async with session.post(f"{settings.OLLAMA_BASE_URL}/api/generate", json=payload) as resp:
                     data = await resp.json()
                     return data.get("response", "[No response from Ollama]")
         except Exception as e:
             return f"[Ollama error: {str(e)}]"
+
+    async def _ollama_chat(self, messages: List[Dict[str, str]], max_tokens: int, temperature: float) -> str:
+        """Call the local Ollama chat API, raising on failure"""
+        payload = {
+            "model": settings.OLLAMA_MODEL,
+            "messages": messages,
+            "stream": False,
+            "options": {"num_predict": max_tokens, "temperature": temperature}
+        }
+        async with aiohttp.ClientSession() as session:
+            async with session.post(f"{settings.OLLAMA_BASE_URL}/api/chat", json=payload) as resp:
+                resp.raise_for_status()
+                data = await resp.json()
+                return data["message"]["content"]
     
     def _parse_actions(self, response: str) -> List[Dict[str, Any]]:
         """Parse actions from AI response"""
@@ -250,6 +324,7 @@ Respond naturally and suggest actions when appropriate. Use JSON format for acti
                 db.add(task)
                 db.commit()
                 result["related_task_id"] = task.id
+                realtime_hub.publish(user_id, "task_created", {"id": task.id, "title": task.title, "ai_suggested": True})
             
             elif action_type == "schedule_event":
                 event = CalendarEvent(
@@ -261,8 +336,16 @@ Respond naturally and suggest actions when appropriate. Use JSON format for acti
                     ai_suggested=True
                 )
                 db.add(event)
+                db.flush()
+                refresh_occurrences(db, user_id, [event.id])
                 db.commit()
                 result["related_event_id"] = event.id
+                realtime_hub.publish(user_id, "event_created", {
+                    "id": event.id,
+                    "title": event.title,
+                    "start_time": event.start_time.isoformat(),
+                    "ai_suggested": True
+                })
         
         return result
     
@@ -278,13 +361,15 @@ Respond naturally and suggest actions when appropriate. Use JSON format for acti
             EmailMessage.user_id == user_id
         ).order_by(EmailMessage.received_at.desc()).limit(10).all()
     
-    def _get_upcoming_events(self, db: Session, user_id: str) -> List[CalendarEvent]:
-        """Get upcoming calendar events for user"""
-        now = datetime.utcnow()
-        return db.query(CalendarEvent).filter(
-            CalendarEvent.user_id == user_id,
-            CalendarEvent.start_time >= now
-        ).order_by(CalendarEvent.start_time).limit(10).all()
+    def _get_recent_threads(self, db: Session, user_id: str) -> List[EmailThread]:
+        """Get the most recently active email conversations for user"""
+        return db.query(EmailThread).filter(
+            EmailThread.user_id == user_id
+        ).order_by(EmailThread.last_message_at.desc()).limit(10).all()
+    
+    def _get_upcoming_events(self, db: Session, user_id: str) -> List[Tuple[CalendarOccurrence, CalendarEvent]]:
+        """Get upcoming calendar occurrences for user, recurring ones included"""
+        return upcoming_occurrences(db, user_id, limit=10)
     
     async def suggest_email_reply(self, email_content: str) -> str:
         """Suggest a reply for an email"""
@@ -299,18 +384,11 @@ Provide a suggested reply that is:
 - Appropriate for the context
 """
         
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": prompt}
-                ],
-                max_tokens=500,
-                temperature=0.7
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            return f"I'm sorry, I couldn't generate a reply: {str(e)}"
+        return await self.complete(
+            [{"role": "system", "content": prompt}],
+            max_tokens=500,
+            temperature=0.7
+        )
     
     async def summarize_email(self, email_content: str) -> str:
         """Summarize email content"""
@@ -320,18 +398,36 @@ Email content:
 {email_content}
 """
         
+        return await self.complete(
+            [{"role": "system", "content": prompt}],
+            max_tokens=200,
+            temperature=0.3
+        )
+
+    async def rate_email_priority(self, sender: str, subject: str, email_content: str) -> Optional[Dict[str, Any]]:
+        """Rate how much an email needs the user's attention"""
+        prompt = f"""Rate how important this email is for its recipient and whether it needs them to do something.
+Respond ONLY with a JSON object like: {{"priority": 0-100, "action_required": true/false}}.
+
+From: {sender}
+Subject: {subject}
+
+{email_content}
+"""
+        
+        content = await self.complete(
+            [{"role": "system", "content": prompt}],
+            max_tokens=50,
+            temperature=0.0
+        )
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": prompt}
-                ],
-                max_tokens=200,
-                temperature=0.3
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            return f"Unable to summarize: {str(e)}" 
+            data = json.loads(content)
+            return {
+                "priority": max(0, min(100, int(data["priority"]))),
+                "action_required": bool(data.get("action_required", False))
+            }
+        except (ValueError, KeyError, TypeError):
+            return None
 
     def _detect_file_intent(self, user_message: str):
         """Detect if the user wants to open/find/get info about a file/app."""
@@ -397,14 +493,11 @@ Email content:
             f"User: {user_message}"
         )
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "system", "content": prompt}],
+            content = await self.complete(
+                [{"role": "system", "content": prompt}],
                 max_tokens=300,
                 temperature=0.0
             )
-            import json
-            content = response.choices[0].message.content
             data = json.loads(content)
             return data.get("intent"), data.get("action"), data.get("entities", {})
         except Exception as e:
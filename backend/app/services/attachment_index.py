@@ -0,0 +1,22 @@
+from typing import Any, Dict, List
+
+from sqlalchemy.orm import Session
+
+from app.core.bulk import bulk_upsert
+from app.models.email_attachment import EmailAttachment
+
+def replace_attachments(db: Session, email, rows: List[Dict[str, Any]]):
+    """Make an email's attachment rows match the provider's list. Does not commit.
+
+    Rows already downloaded keep their stored content.
+    """
+    bulk_upsert(db, EmailAttachment, "external_id", email.user_id, rows, scope={"email_id": email.id, "provider": email.provider})
+    current = {row["external_id"] for row in rows}
+    stale = [
+        attachment_id for attachment_id, external_id in db.query(EmailAttachment.id, EmailAttachment.external_id).filter(
+            EmailAttachment.email_id == email.id
+        ) if external_id not in current
+    ]
+    if stale:
+        db.query(EmailAttachment).filter(EmailAttachment.id.in_(stale)).delete(synchronize_session=False)
+    email.has_attachments = bool(rows)
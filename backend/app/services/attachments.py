@@ -0,0 +1,185 @@
+import base64
+import hashlib
+import os
+import re
+import tempfile
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.email_attachment import EmailAttachment
+from app.models.email_message import EmailMessage
+from app.models.user import User
+from app.services.attachment_index import replace_attachments
+from app.services.gmail_sync import GmailClient, attachment_parts
+from app.services.llm_guard import SingleFlight
+from app.services.oauth_tokens import outlook_headers, refresh_outlook_token
+from app.services.outlook_sync import GRAPH_API, STREAM_TIMEOUT, GraphError, graph_pages, graph_session
+
+ATTACHMENT_DIR = os.path.join(settings.UPLOAD_DIR, "attachments")
+CHUNK_SIZE = 64 * 1024
+# Start of the base64url content in a Gmail attachment resource
+_GMAIL_DATA = re.compile(rb'"data"\s*:\s*"')
+
+# Concurrent requests for the same attachment share one download
+_downloads = SingleFlight()
+
+class AttachmentTooLarge(Exception):
+    """The attachment is bigger than MAX_FILE_SIZE"""
+
+def blob_path(sha256: str) -> str:
+    """Where content with this hash is stored"""
+    return os.path.join(ATTACHMENT_DIR, sha256[:2], sha256[2:4], sha256)
+
+class BlobWriter:
+    """Writes a stream to a temporary file while hashing and size-checking it.
+
+    `commit` moves the file to its content address; when that content is
+    already stored the new copy is dropped.
+    """
+
+    def __init__(self, limit: Optional[int] = None):
+        self.limit = limit if limit is not None else settings.MAX_FILE_SIZE
+        self.size = 0
+        self._hash = hashlib.sha256()
+        os.makedirs(ATTACHMENT_DIR, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(dir=ATTACHMENT_DIR, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.limit:
+            raise AttachmentTooLarge(f"Attachment exceeds {self.limit} bytes")
+        self._hash.update(chunk)
+        self._file.write(chunk)
+
+    def commit(self) -> str:
+        self._file.close()
+        sha256 = self._hash.hexdigest()
+        path = blob_path(sha256)
+        if os.path.exists(path):
+            os.remove(self.temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self.temp_path, path)
+        return sha256
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+async def _decode_gmail_data(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Stream the decoded `data` field out of a Gmail attachment resource.
+
+    The field is plain base64url, so it can be decoded four characters at
+    a time as it arrives instead of parsing the whole JSON document.
+    """
+    buffer = b""
+    in_data = False
+    async for chunk in chunks:
+        buffer += chunk
+        if not in_data:
+            match = _GMAIL_DATA.search(buffer)
+            if not match:
+                buffer = buffer[-32:]  # the marker may straddle chunks
+                continue
+            in_data = True
+            buffer = buffer[match.end():]
+        end = buffer.find(b'"')
+        encoded = buffer if end < 0 else buffer[:end]
+        usable = len(encoded) if end >= 0 else len(encoded) - len(encoded) % 4
+        if usable:
+            data = encoded[:usable]
+            yield base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+        if end >= 0:
+            return
+        buffer = encoded[usable:]
+    if in_data and buffer:
+        yield base64.urlsafe_b64decode(buffer + b"=" * (-len(buffer) % 4))
+
+async def _download_gmail(db: Session, user: User, email: EmailMessage, attachment: EmailAttachment, writer: BlobWriter):
+    client = GmailClient(user, db, concurrency=1)
+    if attachment.download_id is None:
+        # Small parts are returned inline with the message
+        data = await client.get_message(email.external_id, format="full")
+        stack = [(data or {}).get("payload", {})]
+        while stack:
+            part = stack.pop(0)
+            stack.extend(part.get("parts", []))
+            if part.get("partId") == attachment.external_id and part.get("body", {}).get("data"):
+                writer.write(base64.urlsafe_b64decode(part["body"]["data"]))
+        return
+    chunks = client.stream(f"messages/{email.external_id}/attachments/{attachment.download_id}", CHUNK_SIZE)
+    async for data in _decode_gmail_data(chunks):
+        writer.write(data)
+
+async def _download_outlook(db: Session, user: User, email: EmailMessage, attachment: EmailAttachment, writer: BlobWriter):
+    url = f"{GRAPH_API}/me/messages/{email.external_id}/attachments/{attachment.external_id}/$value"
+    for attempt in range(2):
+        async with graph_session().get(url, headers=await outlook_headers(user, db), timeout=STREAM_TIMEOUT) as resp:
+            if resp.status == 401 and attempt == 0 and await refresh_outlook_token(user, db):
+                continue
+            if resp.status >= 400:
+                raise GraphError(f"Graph attachment returned {resp.status}")
+            async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                writer.write(chunk)
+            return
+
+async def list_attachments(db: Session, user: User, email: EmailMessage) -> List[EmailAttachment]:
+    """An email's attachments, asking the provider for the list on first use"""
+    if email.has_attachments is None or (
+        email.has_attachments and not db.query(EmailAttachment.id).filter(EmailAttachment.email_id == email.id).first()
+    ):
+        if email.provider == "google" and user.google_access_token:
+            data = await GmailClient(user, db, concurrency=1).get_message(email.external_id, format="full")
+            if data is not None:
+                replace_attachments(db, email, attachment_parts(data.get("payload", {})))
+        elif email.provider == "outlook" and user.outlook_access_token:
+            rows = []
+            url = f"{GRAPH_API}/me/messages/{email.external_id}/attachments?$select=id,name,contentType,size,isInline"
+            async for page in graph_pages(db, user, url):
+                rows.extend({
+                    "external_id": item["id"],
+                    "filename": item.get("name") or "attachment",
+                    "content_type": item.get("contentType"),
+                    "size": item.get("size"),
+                    "is_inline": item.get("isInline", False)
+                } for item in page.get("value", []))
+            replace_attachments(db, email, rows)
+        db.commit()
+    return db.query(EmailAttachment).filter(EmailAttachment.email_id == email.id).order_by(EmailAttachment.filename).all()
+
+async def fetch_attachment(db: Session, user: User, attachment: EmailAttachment) -> str:
+    """Path of the attachment's content, downloading it on first use.
+
+    The download streams in chunks to a temporary file that is hashed on
+    the way and then moved to its content address, so identical content
+    is stored once no matter what it is called. Providers expose no
+    content identifier to skip the download by. Commits.
+    """
+    if attachment.sha256 and os.path.exists(blob_path(attachment.sha256)):
+        return blob_path(attachment.sha256)
+    if attachment.size and attachment.size > settings.MAX_FILE_SIZE:
+        raise AttachmentTooLarge(f"Attachment exceeds {settings.MAX_FILE_SIZE} bytes")
+
+    async def download() -> str:
+        email = db.get(EmailMessage, attachment.email_id)
+        writer = BlobWriter()
+        try:
+            if attachment.provider == "google":
+                await _download_gmail(db, user, email, attachment, writer)
+            else:
+                await _download_outlook(db, user, email, attachment, writer)
+            return writer.commit()
+        except BaseException:
+            writer.discard()
+            raise
+
+    sha256 = await _downloads.do(attachment.id, download)
+    attachment.sha256 = sha256
+    attachment.downloaded_at = datetime.utcnow()
+    db.commit()
+    return blob_path(sha256)
@@ -0,0 +1,112 @@
+import logging
+from typing import List, Optional
+
+from sqlalchemy import or_, text
+from sqlalchemy.orm import Session
+
+from app.core.compression import TextCodec, available_algorithm, build_dictionary
+from app.core.config import settings
+from app.core.database import SessionLocal, engine
+from app.models.compression_dictionary import CompressionDictionary
+from app.models.email_message import EmailMessage
+
+SAMPLE_SIZE = 500
+# A dictionary is only used for new writes if it saves at least this much
+MIN_DICTIONARY_GAIN = 0.1
+MIGRATION_BATCH = 500
+
+def _latest_dictionary(db: Session, user_id: str) -> Optional[CompressionDictionary]:
+    return db.query(CompressionDictionary).filter(
+        CompressionDictionary.user_id == user_id,
+        CompressionDictionary.algorithm == available_algorithm()
+    ).order_by(CompressionDictionary.id.desc()).first()
+
+def body_codec_for(db: Session, user_id: str) -> TextCodec:
+    """Codec for writing a user's bodies, with their dictionary when it pays off"""
+    dictionary = _latest_dictionary(db, user_id)
+    if dictionary is not None and dictionary.gain >= MIN_DICTIONARY_GAIN:
+        return TextCodec(dictionary_id=dictionary.id, dictionary=dictionary.data)
+    return TextCodec()
+
+def _sample_bodies(db: Session, user_id: str) -> List[str]:
+    emails = db.query(EmailMessage).filter(
+        EmailMessage.user_id == user_id,
+        or_(EmailMessage.body_z.isnot(None), EmailMessage.body_plain_z.isnot(None))
+    ).order_by(EmailMessage.received_at.desc()).limit(SAMPLE_SIZE).all()
+    return [value for email in emails for value in (email.body, email.body_plain) if value]
+
+def ensure_user_dictionary(db: Session, user_id: str) -> Optional[CompressionDictionary]:
+    """Build a user's dictionary once enough bodies exist. Commits.
+
+    The gain on the samples is recorded either way, so a dictionary that
+    does not help is not rebuilt on every sync.
+    """
+    if settings.EMAIL_BODY_COMPRESSION == "none":
+        return None
+    existing = _latest_dictionary(db, user_id)
+    if existing is not None:
+        return existing
+    samples = _sample_bodies(db, user_id)
+    if len(samples) < settings.EMAIL_BODY_DICTIONARY_MIN_SAMPLES:
+        return None
+    try:
+        data = build_dictionary(samples)
+    except Exception as e:
+        logging.error(f"Error building body dictionary for user {user_id}: {e}")
+        return None
+    # Id 0 is never assigned, so it can stand in while measuring
+    plain = TextCodec()
+    trial = TextCodec(dictionary_id=0, dictionary=data)
+    plain_size = sum(len(plain.encode(sample)) for sample in samples)
+    dict_size = sum(len(trial.encode(sample)) for sample in samples)
+    dictionary = CompressionDictionary(
+        user_id=user_id,
+        algorithm=available_algorithm(),
+        data=data,
+        gain=1 - dict_size / plain_size if plain_size else 0.0
+    )
+    db.add(dictionary)
+    db.commit()
+    return dictionary
+
+def compress_legacy_bodies(batch_size: int = MIGRATION_BATCH) -> int:
+    """Move bodies still in the legacy text columns into compressed storage.
+
+    Runs in batches at startup and is a no-op once every row is migrated.
+    SQLite files are vacuumed afterwards so the freed pages are returned.
+    """
+    db = SessionLocal()
+    migrated = 0
+    try:
+        codec = TextCodec()
+        while True:
+            rows = db.query(
+                EmailMessage.id,
+                EmailMessage._legacy_body,
+                EmailMessage._legacy_body_plain
+            ).filter(or_(
+                EmailMessage._legacy_body.isnot(None),
+                EmailMessage._legacy_body_plain.isnot(None)
+            )).limit(batch_size).all()
+            if not rows:
+                break
+            db.bulk_update_mappings(EmailMessage, [
+                {
+                    "id": row.id,
+                    "body_z": codec.encode(row[1]),
+                    "body_plain_z": codec.encode(row[2]),
+                    "_legacy_body": None,
+                    "_legacy_body_plain": None
+                }
+                for row in rows
+            ])
+            db.commit()
+            migrated += len(rows)
+    finally:
+        db.close()
+    if migrated:
+        print(f"📦 Compressed {migrated} email bodies")
+        if engine.dialect.name == "sqlite":
+            with engine.connect() as conn:
+                conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+    return migrated
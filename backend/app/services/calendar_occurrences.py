@@ -0,0 +1,318 @@
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from dateutil.rrule import rrulestr
+from sqlalchemy import or_
+from sqlalchemy.orm import Query, Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.calendar_event import CalendarEvent
+from app.models.calendar_occurrence import CalendarOccurrence
+
+CHUNK_SIZE = 200
+# Series are expanded this far past the window end, so the window is only
+# rolled forward about once a month
+ROLL_MARGIN = timedelta(days=30)
+MAX_INSTANCES = 5000  # Per series and expansion, against runaway rules such as FREQ=MINUTELY
+
+SERIES_COLUMNS = (
+    CalendarEvent.id,
+    CalendarEvent.user_id,
+    CalendarEvent.provider,
+    CalendarEvent.external_id,
+    CalendarEvent.start_time,
+    CalendarEvent.end_time,
+    CalendarEvent.all_day,
+    CalendarEvent.recurrence,
+    CalendarEvent.timezone,
+    CalendarEvent.expanded_until,
+    CalendarEvent.original_start_time,
+    CalendarEvent.status,
+)
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Stored datetimes are naive UTC
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _zone(name: Optional[str]):
+    try:
+        return ZoneInfo(name) if name else timezone.utc
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.utc
+
+def occurrence_window(now: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+    """The span recurring series are materialized over, as naive UTC"""
+    now = now or datetime.utcnow()
+    return (
+        now - timedelta(days=settings.CALENDAR_SYNC_PAST_DAYS),
+        now + timedelta(days=settings.CALENDAR_SYNC_FUTURE_DAYS)
+    )
+
+def instance_starts(
+    recurrence: str,
+    start_time: datetime,
+    all_day: bool,
+    timezone_name: Optional[str],
+    start: datetime,
+    end: datetime
+) -> List[datetime]:
+    """Starts of a series' instances in [start, end), as naive UTC.
+
+    Timed series are evaluated in their own time zone, so instances keep
+    their wall-clock time across daylight saving changes; all-day series
+    repeat on floating dates. Raises ValueError or TypeError for a rule
+    dateutil cannot evaluate.
+    """
+    start_time = _utc(start_time)
+    if all_day:
+        zone = None
+        rules = rrulestr(recurrence, dtstart=start_time, forceset=True, unfold=True)
+        after, before = start, end
+    else:
+        zone = _zone(timezone_name)
+        dtstart = start_time.replace(tzinfo=timezone.utc).astimezone(zone)
+        rules = rrulestr(recurrence, dtstart=dtstart, forceset=True, unfold=True)
+        after, before = start.replace(tzinfo=timezone.utc), end.replace(tzinfo=timezone.utc)
+
+    starts = []
+    for instance in rules.xafter(after, count=MAX_INSTANCES, inc=True):
+        if instance >= before:
+            break
+        starts.append(instance if zone is None else instance.astimezone(timezone.utc).replace(tzinfo=None))
+    return starts
+
+def validate_recurrence(recurrence: List[str], start_time: datetime, all_day: bool, timezone_name: Optional[str]):
+    """Raise ValueError when the recurrence lines cannot be expanded"""
+    try:
+        instance_starts("\n".join(recurrence), start_time, all_day, timezone_name, _utc(start_time), _utc(start_time) + timedelta(days=1))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid recurrence: {e}")
+
+def _row(user_id: str, event_id: str, series_id: str, start_time: datetime, end_time: datetime, all_day: bool) -> Dict[str, Any]:
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "event_id": event_id,
+        "series_id": series_id,
+        "start_time": start_time,
+        "end_time": end_time,
+        "all_day": bool(all_day)
+    }
+
+def _occurrences(root, exceptions: List[Any], start: datetime, end: datetime) -> List[Dict[str, Any]]:
+    """Occurrence rows of one series in [start, end).
+
+    Events that do not repeat have their single occurrence whatever the
+    window. A series yields its instances minus the ones its exceptions
+    replace, plus the exceptions that were not cancelled.
+    """
+    if root.status == "cancelled":
+        return []
+    root_start, root_end = _utc(root.start_time), _utc(root.end_time)
+    if not root.recurrence:
+        return [_row(root.user_id, root.id, root.id, root_start, root_end, root.all_day)]
+    try:
+        starts = instance_starts(root.recurrence, root_start, root.all_day, root.timezone, start, end)
+    except (ValueError, TypeError) as e:
+        logging.error(f"Cannot expand recurrence of calendar event {root.id}: {e}")
+        starts = [root_start] if start <= root_start < end else []
+
+    replaced = {_utc(exception.original_start_time) for exception in exceptions if exception.original_start_time}
+    duration = root_end - root_start
+    rows = [
+        _row(root.user_id, root.id, root.id, instance, instance + duration, root.all_day)
+        for instance in starts if instance not in replaced
+    ]
+    rows.extend(
+        _row(root.user_id, exception.id, root.id, _utc(exception.start_time), _utc(exception.end_time), exception.all_day)
+        for exception in exceptions
+        if exception.status != "cancelled" and start <= _utc(exception.start_time) < end
+    )
+    return rows
+
+def _exceptions_of(db: Session, user_id: str, roots: List[Any]) -> Dict[str, List[Any]]:
+    """Exception rows of the given series masters, keyed by master id"""
+    masters: Dict[Optional[str], Dict[str, str]] = defaultdict(dict)
+    for root in roots:
+        if root.recurrence and root.external_id:
+            masters[root.provider][root.external_id] = root.id
+    exceptions: Dict[str, List[Any]] = defaultdict(list)
+    for provider, by_external_id in masters.items():
+        for row in db.query(*SERIES_COLUMNS, CalendarEvent.recurring_event_id).filter(
+            CalendarEvent.user_id == user_id,
+            CalendarEvent.provider == provider,
+            CalendarEvent.recurring_event_id.in_(list(by_external_id))
+        ):
+            exceptions[by_external_id[row.recurring_event_id]].append(row)
+    return exceptions
+
+def series_roots(db: Session, user_id: str, event_ids: Iterable[str]) -> Set[str]:
+    """Series the given events belong to: the event itself, or the master of
+    an exception. Exceptions whose master is not synced yet stand alone.
+    Call before deleting the events.
+    """
+    event_ids = list(event_ids)
+    roots: Set[str] = set()
+    for start in range(0, len(event_ids), CHUNK_SIZE):
+        exceptions: Dict[Optional[str], Dict[str, List[str]]] = defaultdict(lambda: defaultdict(list))
+        for event_id, provider, master in db.query(
+            CalendarEvent.id,
+            CalendarEvent.provider,
+            CalendarEvent.recurring_event_id
+        ).filter(CalendarEvent.id.in_(event_ids[start:start + CHUNK_SIZE])):
+            if master is None:
+                roots.add(event_id)
+            else:
+                exceptions[provider][master].append(event_id)
+        for provider, by_master in exceptions.items():
+            found = dict(db.query(CalendarEvent.external_id, CalendarEvent.id).filter(
+                CalendarEvent.user_id == user_id,
+                CalendarEvent.provider == provider,
+                CalendarEvent.external_id.in_(list(by_master))
+            ))
+            for master, ids in by_master.items():
+                if master in found:
+                    roots.add(found[master])
+                else:
+                    roots.update(ids)
+    return roots
+
+def refresh_series(db: Session, user_id: str, series_ids: Iterable[str]) -> int:
+    """Rematerialize the occurrences of the given series over the window.
+
+    A series' occurrences are replaced as a whole, so this is the one
+    entry point for created, changed and deleted masters and exceptions
+    alike; series whose event is gone just lose their occurrences. Does not
+    commit. Returns the number of occurrences written.
+    """
+    series_ids = list(set(series_ids))
+    start, end = occurrence_window()
+    end += ROLL_MARGIN
+    written = 0
+    for offset in range(0, len(series_ids), CHUNK_SIZE):
+        chunk = series_ids[offset:offset + CHUNK_SIZE]
+        roots = db.query(*SERIES_COLUMNS).filter(CalendarEvent.user_id == user_id, CalendarEvent.id.in_(chunk)).all()
+        exceptions = _exceptions_of(db, user_id, roots)
+        # Exceptions that stood alone before their master arrived lose their own occurrence
+        stale = chunk + [exception.id for rows in exceptions.values() for exception in rows]
+        db.query(CalendarOccurrence).filter(CalendarOccurrence.series_id.in_(stale)).delete(synchronize_session=False)
+
+        rows = []
+        for root in roots:
+            rows.extend(_occurrences(root, exceptions.get(root.id, []), start, end))
+        if rows:
+            db.bulk_insert_mappings(CalendarOccurrence, rows)
+        # Bulk statements keep the bookkeeping column out of the sync change log
+        if roots:
+            db.bulk_update_mappings(CalendarEvent, [{"id": root.id, "expanded_until": end} for root in roots])
+        written += len(rows)
+    return written
+
+def refresh_occurrences(db: Session, user_id: str, event_ids: Iterable[str]) -> int:
+    """Refresh the series of events that were just inserted or updated"""
+    return refresh_series(db, user_id, series_roots(db, user_id, event_ids))
+
+def roll_occurrence_window(db: Session, user_id: Optional[str] = None) -> int:
+    """Move the materialized window forward.
+
+    Recurring series whose occurrences end before the window does are
+    extended with just the missing span, and occurrences of recurring
+    series that ended before the window starts are dropped. This is a
+    single indexed lookup when nothing is due. Runs from the hourly
+    maintenance job and at startup; each expansion reaches ROLL_MARGIN
+    past the window, so reads never have to roll it themselves. Commits.
+    Returns the number of occurrences added.
+    """
+    start, end = occurrence_window()
+    recurring = db.query(CalendarEvent.id).filter(
+        CalendarEvent.recurrence.isnot(None),
+        CalendarEvent.recurring_event_id.is_(None)
+    )
+    if user_id:
+        recurring = recurring.filter(CalendarEvent.user_id == user_id)
+    due_ids = [row.id for row in recurring.filter(
+        or_(CalendarEvent.expanded_until.is_(None), CalendarEvent.expanded_until < end)
+    )]
+    if not due_ids:
+        return 0
+
+    until = end + ROLL_MARGIN
+    added = 0
+    for offset in range(0, len(due_ids), CHUNK_SIZE):
+        roots = db.query(*SERIES_COLUMNS).filter(CalendarEvent.id.in_(due_ids[offset:offset + CHUNK_SIZE])).all()
+        by_user: Dict[str, List[Any]] = defaultdict(list)
+        for root in roots:
+            by_user[root.user_id].append(root)
+        for owner, owned in by_user.items():
+            never_expanded = [root.id for root in owned if root.expanded_until is None]
+            if never_expanded:
+                added += refresh_series(db, owner, never_expanded)
+            extending = [root for root in owned if root.expanded_until is not None]
+            exceptions = _exceptions_of(db, owner, extending)
+            rows = []
+            for root in extending:
+                rows.extend(_occurrences(root, exceptions.get(root.id, []), max(_utc(root.expanded_until), start), until))
+            if rows:
+                db.bulk_insert_mappings(CalendarOccurrence, rows)
+            if extending:
+                db.bulk_update_mappings(CalendarEvent, [{"id": root.id, "expanded_until": until} for root in extending])
+            added += len(rows)
+
+    db.query(CalendarOccurrence).filter(
+        CalendarOccurrence.end_time < start,
+        CalendarOccurrence.series_id.in_(recurring.scalar_subquery())
+    ).delete(synchronize_session=False)
+    db.commit()
+    return added
+
+def occurrences_query(db: Session, user_id: str) -> Query:
+    """(CalendarOccurrence, CalendarEvent) pairs of a user, read through the
+    (user_id, start_time) index
+    """
+    return db.query(CalendarOccurrence, CalendarEvent).join(
+        CalendarEvent, CalendarEvent.id == CalendarOccurrence.event_id
+    ).filter(CalendarOccurrence.user_id == user_id)
+
+def upcoming_occurrences(db: Session, user_id: str, limit: int = 10) -> List[Tuple[CalendarOccurrence, CalendarEvent]]:
+    """The next occurrences that have not ended yet, soonest first"""
+    return occurrences_query(db, user_id).filter(
+        CalendarOccurrence.end_time >= datetime.utcnow()
+    ).order_by(CalendarOccurrence.start_time).limit(limit).all()
+
+def backfill_calendar_occurrences(batch_size: int = 500) -> int:
+    """Materialize occurrences for events that were never expanded.
+
+    Runs at startup; after the first run it only finds events that were
+    written without going through the sync services or the API. Also
+    rolls the window forward, which may be due after downtime.
+    """
+    db = SessionLocal()
+    built = 0
+    try:
+        while True:
+            missing = db.query(CalendarEvent.user_id, CalendarEvent.id).filter(
+                CalendarEvent.expanded_until.is_(None),
+                CalendarEvent.recurring_event_id.is_(None)
+            ).limit(batch_size).all()
+            if not missing:
+                break
+            by_user: Dict[str, List[str]] = defaultdict(list)
+            for user_id, event_id in missing:
+                by_user[user_id].append(event_id)
+            for user_id, event_ids in by_user.items():
+                refresh_series(db, user_id, event_ids)
+            db.commit()
+            built += len(missing)
+        roll_occurrence_window(db)
+    finally:
+        db.close()
+    if built:
+        print(f"📅 Expanded {built} calendar events into occurrences")
+    return built
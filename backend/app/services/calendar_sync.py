@@ -0,0 +1,211 @@
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+from urllib.parse import quote
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.core.bulk import bulk_upsert
+from app.core.config import settings
+from app.models.calendar_event import CalendarEvent
+from app.models.sync_change import record_changes
+from app.models.sync_state import get_sync_state
+from app.models.user import User
+from app.services.calendar_occurrences import refresh_occurrences, refresh_series, series_roots
+from app.services.gmail_sync import google_session
+from app.services.oauth_tokens import google_headers, refresh_google_token
+from app.services.outlook_sync import ProgressCallback, parse_datetime
+
+GOOGLE_CALENDAR_API = "https://www.googleapis.com/calendar/v3/calendars"
+GOOGLE_PAGE_SIZE = 250
+PROVIDER = "google"
+
+class SyncTokenExpired(Exception):
+    """Google no longer accepts the stored syncToken or page token (410 Gone)"""
+
+class GoogleCalendarError(Exception):
+    """Google Calendar answered with an unexpected status"""
+
+def _resource(calendar_id: str) -> str:
+    return "calendar" if calendar_id == "primary" else f"calendar:{calendar_id}"
+
+def _external_id(calendar_id: str, event_id: str) -> str:
+    # Event ids are only unique within a calendar, and an invitation shows
+    # up with the same id in every calendar it is on
+    return event_id if calendar_id == "primary" else f"{calendar_id}:{event_id}"
+
+def _google_event_row(event: Dict[str, Any], calendar_id: str = "primary") -> Optional[Dict[str, Any]]:
+    original = event.get("originalStartTime") or {}
+    series = {
+        # Masters carry their RRULE/EXDATE lines; instances they no longer
+        # match come back as exceptions of the master
+        "recurrence": "\n".join(event["recurrence"]) if event.get("recurrence") else None,
+        "timezone": event.get("start", {}).get("timeZone"),
+        "recurring_event_id": _external_id(calendar_id, event["recurringEventId"]) if event.get("recurringEventId") else None,
+        "original_start_time": parse_datetime(original.get("dateTime") or original.get("date")),
+        "status": event.get("status")
+    }
+    if event.get("status") == "cancelled":
+        # A cancelled instance only carries its id and the start it removes
+        if not series["recurring_event_id"] or not series["original_start_time"]:
+            return None
+        return {
+            "external_id": _external_id(calendar_id, event["id"]),
+            "title": event.get("summary", "(Cancelled)"),
+            "start_time": series["original_start_time"],
+            "end_time": series["original_start_time"],
+            "all_day": "date" in original,
+            **series
+        }
+    start = event.get("start", {}).get("dateTime") or event.get("start", {}).get("date")
+    end = event.get("end", {}).get("dateTime") or event.get("end", {}).get("date")
+    if not start or not end:
+        return None
+    return {
+        "external_id": _external_id(calendar_id, event["id"]),
+        "title": event.get("summary", "(No Title)"),
+        "description": event.get("description"),
+        "location": event.get("location"),
+        "start_time": parse_datetime(start),
+        "end_time": parse_datetime(end),
+        "all_day": "date" in event.get("start", {}),
+        "calendar_id": event.get("organizer", {}).get("email"),
+        "attendees": str(event.get("attendees")),
+        **series
+    }
+
+def _upsert_events(db: Session, user: User, rows: List[Optional[Dict[str, Any]]]) -> int:
+    stats = bulk_upsert(db, CalendarEvent, "external_id", user.id, [row for row in rows if row], scope={"provider": PROVIDER})
+    refresh_occurrences(db, user.id, stats["ids"])
+    return stats["inserted"] + stats["updated"]
+
+def _delete_events(db: Session, user: User, external_ids: List[str]) -> int:
+    if not external_ids:
+        return 0
+    ids = [row.id for row in db.query(CalendarEvent.id).filter(
+        CalendarEvent.user_id == user.id,
+        CalendarEvent.provider == PROVIDER,
+        or_(CalendarEvent.external_id.in_(external_ids), CalendarEvent.recurring_event_id.in_(external_ids))
+    )]
+    if ids:
+        series = series_roots(db, user.id, ids)
+        db.query(CalendarEvent).filter(CalendarEvent.id.in_(ids)).delete(synchronize_session=False)
+        record_changes(db, user.id, "calendar_event", ids, op="delete")
+        refresh_series(db, user.id, series)
+    return len(ids)
+
+def _prune_calendar(db: Session, user: User, calendar_id: str, seen: Set[str]) -> int:
+    """Delete events of a calendar that a complete full listing no longer returned"""
+    query = db.query(CalendarEvent.external_id).filter(CalendarEvent.user_id == user.id, CalendarEvent.provider == PROVIDER)
+    if calendar_id == "primary":
+        # Google event ids never contain a colon
+        query = query.filter(~CalendarEvent.external_id.contains(":"))
+    else:
+        query = query.filter(CalendarEvent.external_id.startswith(f"{calendar_id}:", autoescape=True))
+    return _delete_events(db, user, [row.external_id for row in query if row.external_id not in seen])
+
+async def _event_pages(
+    db: Session,
+    user: User,
+    url: str,
+    params: Dict[str, Any],
+    page_token: Optional[str]
+) -> AsyncIterator[Dict[str, Any]]:
+    """Yield pages of an events listing, starting from `page_token` if given"""
+    headers = await google_headers(user, db)
+    refreshed = False
+    while True:
+        query = {**params, "pageToken": page_token} if page_token else params
+        async with google_session().get(url, params={k: str(v) for k, v in query.items()}, headers=headers) as resp:
+            status = resp.status
+            page = await resp.json(content_type=None) if status < 400 else None
+        if status == 401 and not refreshed and await refresh_google_token(user, db):
+            refreshed = True
+            headers = await google_headers(user, db)
+            continue
+        if status == 410:
+            raise SyncTokenExpired(url)
+        if status >= 400:
+            raise GoogleCalendarError(f"Google Calendar {url} returned {status}")
+        yield page
+        page_token = page.get("nextPageToken")
+        if not page_token:
+            return
+
+async def sync_google_calendar_events(
+    db: Session,
+    user: User,
+    calendar_id: str = "primary",
+    on_progress: ProgressCallback = None
+) -> Dict[str, Any]:
+    """Bring one Google calendar up to date.
+
+    The first run pages through every event; its last page carries a
+    syncToken, after which only changed and cancelled events are
+    transferred. The page token is checkpointed with every committed page
+    so an interrupted round resumes where it stopped. An expired token
+    restarts with a full listing, after which events it did not return are
+    deleted.
+    """
+    state = get_sync_state(db, user.id, PROVIDER, _resource(calendar_id))
+    url = f"{GOOGLE_CALENDAR_API}/{quote(calendar_id, safe='')}/events"
+    for attempt in range(2):
+        stats = {
+            "mode": "incremental" if state.cursor else "full",
+            "resumed": state.backfill_page_token is not None,
+            "pages": 0,
+            "synced": 0,
+            "deleted": 0
+        }
+        # Cancelled events are listed too, so deletions arrive like any other change
+        params = {"maxResults": GOOGLE_PAGE_SIZE, "showDeleted": "true"}
+        if state.cursor:
+            params["syncToken"] = state.cursor
+        seen: Set[str] = set()
+        try:
+            async for page in _event_pages(db, user, url, params, state.backfill_page_token):
+                items = page.get("items", [])
+                # Deleted events go; cancelled instances of a series are kept as exceptions
+                deleted = [e for e in items if e.get("status") == "cancelled" and not e.get("recurringEventId")]
+                cancelled = [_external_id(calendar_id, e["id"]) for e in deleted]
+                rows = [_google_event_row(e, calendar_id) for e in items if e not in deleted]
+                seen.update(row["external_id"] for row in rows if row)
+                stats["synced"] += _upsert_events(db, user, rows)
+                stats["deleted"] += _delete_events(db, user, cancelled)
+                stats["pages"] += 1
+                state.backfill_page_token = page.get("nextPageToken")
+                if page.get("nextSyncToken"):
+                    state.cursor = page["nextSyncToken"]
+                db.commit()
+                if on_progress:
+                    on_progress(dict(stats))
+            break
+        except SyncTokenExpired:
+            if attempt:
+                raise
+            db.rollback()
+            logging.error(f"Google calendar {calendar_id} sync token expired for user {user.id}, running a full sync")
+            state.cursor = None
+            state.backfill_page_token = None
+            db.commit()
+    if stats["mode"] == "full":
+        if not stats["resumed"]:
+            stats["deleted"] += _prune_calendar(db, user, calendar_id, seen)
+        state.last_full_sync_at = datetime.utcnow()
+    state.last_synced_at = datetime.utcnow()
+    db.commit()
+    return stats
+
+async def sync_google_calendar(db: Session, user: User, on_progress: ProgressCallback = None) -> Dict[str, Any]:
+    """Sync every configured Google calendar, each with its own syncToken"""
+    results: Dict[str, Any] = {}
+
+    for calendar_id in settings.GOOGLE_CALENDAR_IDS:
+        def calendar_progress(stats, calendar_id=calendar_id):
+            results[calendar_id] = stats
+            if on_progress:
+                on_progress(dict(results))
+
+        results[calendar_id] = await sync_google_calendar_events(db, user, calendar_id, calendar_progress)
+    return results
@@ -0,0 +1,174 @@
+import logging
+from datetime import datetime
+from email.utils import getaddresses, parseaddr
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, undefer
+
+from app.core.config import settings
+from app.models.email_message import EmailMessage
+from app.models.sync_change import record_changes
+from app.models.user import User
+from app.services.job_queue import enqueue, PRIORITY_BATCH
+
+FEATURES = [
+    "sender_frequency",    # how much of the mailbox comes from this sender, log-scaled
+    "replied_to_sender",   # the user has written to this sender before
+    "user_in_thread",      # the user has sent a message in this thread
+    "recipient_position",  # 1 first addressee, 0.5 later addressee, 0 not addressed directly
+    "recipient_count",     # wide distribution, log-scaled
+    "urgent_terms",
+    "request_terms",
+    "bulk_markers",
+    "recency",
+    "marked_important",
+    "starred",
+]
+# Hand-tuned logistic weights, in FEATURES order
+WEIGHTS = np.array([0.6, 1.4, 1.1, 1.2, -0.8, 1.6, 1.2, -2.2, 1.0, 0.9, 1.2])
+BIAS = -1.9
+
+URGENT_TERMS = ["urgent", "asap", "immediately", "deadline", "overdue", "action required", "time sensitive", "by end of day", "eod", "today"]
+REQUEST_TERMS = ["?", "please", "can you", "could you", "would you", "let me know", "review", "approve", "confirm", "feedback", "sign"]
+BULK_TERMS = ["unsubscribe", "newsletter", "digest", "no-reply", "noreply", "do-not-reply", "donotreply", "% off", "sale", "webinar", "notification"]
+RECENCY_HALF_LIFE_HOURS = 72.0
+TEXT_PREVIEW_LENGTH = 500
+CHUNK_SIZE = 500
+
+def _address(value: Optional[str]) -> str:
+    return parseaddr(value or "")[1].lower()
+
+def _addresses(values: Optional[List[str]]) -> List[str]:
+    # A Gmail To header is one string holding every addressee
+    return [address.lower() for _, address in getaddresses(values or []) if address]
+
+def _term_hits(texts: np.ndarray, terms: List[str]) -> np.ndarray:
+    hits = np.zeros(len(texts))
+    for term in terms:
+        hits += np.char.find(texts, term) >= 0
+    return np.minimum(hits, 3) / 3
+
+class MailboxStats:
+    """Per-sender and per-thread statistics over a user's whole mailbox"""
+
+    def __init__(self, db: Session, user: User):
+        self.user_address = (user.email or "").lower()
+        rows = db.query(
+            EmailMessage.sender,
+            EmailMessage.recipients,
+            EmailMessage.thread_id
+        ).filter(EmailMessage.user_id == user.id).all()
+        senders = np.array([_address(row.sender) for row in rows] or [""], dtype=str)
+        self.senders, counts = np.unique(senders, return_counts=True)
+        self.sender_counts = counts
+        self.max_count = max(int(counts.max()), 1)
+        sent = senders == self.user_address
+        written_to = {address for row, mine in zip(rows, sent) if mine for address in _addresses(row.recipients)}
+        self.written_to = np.array(sorted(written_to) or [""], dtype=str)
+        self.user_threads = np.array(sorted({row.thread_id for row, mine in zip(rows, sent) if mine and row.thread_id}) or [""], dtype=str)
+
+    def sender_frequency(self, senders: np.ndarray) -> np.ndarray:
+        index = np.searchsorted(self.senders, senders)
+        index = np.minimum(index, len(self.senders) - 1)
+        counts = np.where(self.senders[index] == senders, self.sender_counts[index], 0)
+        return np.log1p(counts) / np.log1p(self.max_count)
+
+def feature_matrix(stats: MailboxStats, emails: List[Any], texts: List[str], now: datetime) -> np.ndarray:
+    """One row per email, one column per entry in FEATURES"""
+    senders = np.array([_address(email.sender) for email in emails], dtype=str)
+    threads = np.array([email.thread_id or "" for email in emails], dtype=str)
+    lowered = np.array([text.lower() for text in texts], dtype=str)
+
+    position = np.zeros(len(emails))
+    recipient_count = np.zeros(len(emails))
+    for i, email in enumerate(emails):
+        addressees = _addresses(email.recipients)
+        recipient_count[i] = len(addressees)
+        if stats.user_address in addressees:
+            position[i] = 1.0 if addressees[0] == stats.user_address else 0.5
+
+    received = np.array([email.received_at.replace(tzinfo=None) for email in emails], dtype="datetime64[s]")
+    age_hours = np.maximum((np.datetime64(now, "s") - received).astype(float) / 3600, 0)
+
+    return np.column_stack([
+        stats.sender_frequency(senders),
+        np.isin(senders, stats.written_to) & (senders != ""),
+        np.isin(threads, stats.user_threads) & (threads != ""),
+        position,
+        np.minimum(np.log1p(recipient_count) / np.log1p(50), 1),
+        _term_hits(lowered, URGENT_TERMS),
+        _term_hits(lowered, REQUEST_TERMS),
+        np.maximum(_term_hits(lowered, BULK_TERMS), _term_hits(senders, BULK_TERMS)),
+        np.exp2(-age_hours / RECENCY_HALF_LIFE_HOURS),
+        np.array([bool(email.is_important) for email in emails]),
+        np.array([bool(email.is_starred) for email in emails]),
+    ]).astype(float)
+
+def score(features: np.ndarray) -> np.ndarray:
+    """Priority scores 0-100 for a feature matrix"""
+    return np.rint(100 / (1 + np.exp(-(features @ WEIGHTS + BIAS)))).astype(int)
+
+def score_emails(db: Session, user: User, rescore: bool = False) -> Dict[str, int]:
+    """Score a user's unscored emails locally, or every locally scored one.
+
+    Mailbox statistics are computed once and each chunk of emails is
+    scored with a single matrix product. Emails rated by the LLM are left
+    alone. Borderline scores among unread mail are queued for an LLM
+    review. Commits.
+    """
+    query = db.query(EmailMessage).filter(EmailMessage.user_id == user.id)
+    if rescore:
+        query = query.filter(or_(EmailMessage.ai_priority_source.is_(None), EmailMessage.ai_priority_source == "local"))
+    else:
+        query = query.filter(EmailMessage.ai_priority_source.is_(None))
+    ids = [row.id for row in query.with_entities(EmailMessage.id)]
+    result = {"scored": 0, "action_required": 0, "borderline": 0}
+    if not ids:
+        return result
+
+    stats = MailboxStats(db, user)
+    now = datetime.utcnow()
+    for start in range(0, len(ids), CHUNK_SIZE):
+        emails = db.query(EmailMessage).options(undefer(EmailMessage.body_plain_z)).filter(
+            EmailMessage.id.in_(ids[start:start + CHUNK_SIZE])
+        ).all()
+        texts = [f"{email.subject} {(email.body_plain or '')[:TEXT_PREVIEW_LENGTH]}" for email in emails]
+        scores = score(feature_matrix(stats, emails, texts, now))
+        action = scores >= settings.EMAIL_PRIORITY_ACTION_THRESHOLD
+        db.bulk_update_mappings(EmailMessage, [
+            {"id": email.id, "ai_priority_score": int(s), "ai_action_required": bool(a), "ai_priority_source": "local"}
+            for email, s, a in zip(emails, scores, action)
+        ])
+        record_changes(db, user.id, "email", [email.id for email in emails])
+        unread = ~np.array([bool(email.is_read) for email in emails])
+        borderline = unread & (scores >= settings.EMAIL_PRIORITY_BORDERLINE_LOW) & (scores <= settings.EMAIL_PRIORITY_BORDERLINE_HIGH)
+        result["scored"] += len(emails)
+        result["action_required"] += int(action.sum())
+        result["borderline"] += int(borderline.sum())
+        db.commit()
+
+    if result["borderline"] and settings.EMAIL_PRIORITY_LLM_REVIEW_LIMIT > 0:
+        try:
+            enqueue(  # commits
+                db,
+                "email_priority_review",
+                user_id=user.id,
+                priority=PRIORITY_BATCH,
+                dedup_key=f"email_priority_review:{user.id}"
+            )
+        except Exception as e:
+            db.rollback()
+            logging.error(f"Error queueing priority review for user {user.id}: {e}")
+    return result
+
+def borderline_emails(db: Session, user_id: str, limit: int) -> List[EmailMessage]:
+    """Unread, locally scored emails whose score the LLM should settle"""
+    return db.query(EmailMessage).options(undefer(EmailMessage.body_plain_z)).filter(
+        EmailMessage.user_id == user_id,
+        EmailMessage.ai_priority_source == "local",
+        EmailMessage.is_read == False,
+        EmailMessage.ai_priority_score >= settings.EMAIL_PRIORITY_BORDERLINE_LOW,
+        EmailMessage.ai_priority_score <= settings.EMAIL_PRIORITY_BORDERLINE_HIGH
+    ).order_by(EmailMessage.received_at.desc()).limit(limit).all()
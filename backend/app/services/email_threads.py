@@ -0,0 +1,151 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Session, undefer
+
+from app.core.bulk import bulk_upsert
+from app.core.database import SessionLocal
+from app.models.email_message import EmailMessage
+from app.models.email_thread import EmailThread
+from app.models.sync_change import record_changes
+
+SNIPPET_LENGTH = 200
+MAX_PARTICIPANTS = 20
+CHUNK_SIZE = 200
+
+ThreadKey = Tuple[str, str]  # (provider, thread_id)
+
+def thread_keys_for(db: Session, message_ids: Iterable[str]) -> Set[ThreadKey]:
+    """Threads the given messages belong to; call before deleting them"""
+    message_ids = list(message_ids)
+    keys: Set[ThreadKey] = set()
+    for start in range(0, len(message_ids), CHUNK_SIZE):
+        rows = db.query(EmailMessage.provider, EmailMessage.thread_id).filter(
+            EmailMessage.id.in_(message_ids[start:start + CHUNK_SIZE]),
+            EmailMessage.thread_id.isnot(None)
+        ).distinct()
+        keys.update((provider, thread_id) for provider, thread_id in rows)
+    return keys
+
+def _summarize(messages) -> Dict:
+    messages = sorted(messages, key=lambda m: m.received_at)
+    latest = messages[-1]
+    participants: List[str] = []
+    seen = set()
+    for message in messages:
+        for address in [message.sender] + list(message.recipients or []):
+            if address and address.lower() not in seen and len(participants) < MAX_PARTICIPANTS:
+                seen.add(address.lower())
+                participants.append(address)
+    return {
+        "subject": messages[0].subject,
+        "participants": participants,
+        "message_count": len(messages),
+        "unread_count": sum(1 for m in messages if not m.is_read),
+        "last_message_id": latest.id,
+        "last_sender": latest.sender,
+        "last_message_at": latest.received_at
+    }
+
+def refresh_threads(db: Session, user_id: str, keys: Iterable[ThreadKey]) -> int:
+    """Recompute the thread rows for the given conversations.
+
+    Only the messages of those threads are read: one query for their
+    headers and one for the latest message's preview per chunk. Threads
+    left without messages are removed. Does not commit. Returns the number
+    of thread rows written or removed.
+    """
+    by_provider: Dict[str, List[str]] = defaultdict(list)
+    for provider, thread_id in set(keys):
+        by_provider[provider].append(thread_id)
+
+    touched = 0
+    for provider, thread_ids in by_provider.items():
+        for start in range(0, len(thread_ids), CHUNK_SIZE):
+            chunk = thread_ids[start:start + CHUNK_SIZE]
+            grouped = defaultdict(list)
+            for message in db.query(
+                EmailMessage.id,
+                EmailMessage.thread_id,
+                EmailMessage.subject,
+                EmailMessage.sender,
+                EmailMessage.recipients,
+                EmailMessage.is_read,
+                EmailMessage.received_at
+            ).filter(
+                EmailMessage.user_id == user_id,
+                EmailMessage.provider == provider,
+                EmailMessage.thread_id.in_(chunk)
+            ):
+                grouped[message.thread_id].append(message)
+
+            rows = {thread_id: _summarize(messages) for thread_id, messages in grouped.items()}
+            latest_ids = [row["last_message_id"] for row in rows.values()]
+            previews = {
+                email.thread_id: email.body_plain
+                for email in db.query(EmailMessage).options(undefer(EmailMessage.body_plain_z)).filter(
+                    EmailMessage.id.in_(latest_ids)
+                )
+            } if latest_ids else {}
+            for thread_id, row in rows.items():
+                preview = " ".join((previews.get(thread_id) or "").split())
+                row["thread_id"] = thread_id
+                row["snippet"] = preview[:SNIPPET_LENGTH]
+            stats = bulk_upsert(db, EmailThread, "thread_id", user_id, rows.values(), scope={"provider": provider})
+            touched += stats["inserted"] + stats["updated"]
+
+            emptied = [thread_id for thread_id in chunk if thread_id not in rows]
+            if emptied:
+                ids = [row.id for row in db.query(EmailThread.id).filter(
+                    EmailThread.user_id == user_id,
+                    EmailThread.provider == provider,
+                    EmailThread.thread_id.in_(emptied)
+                )]
+                if ids:
+                    db.query(EmailThread).filter(EmailThread.id.in_(ids)).delete(synchronize_session=False)
+                    record_changes(db, user_id, "email_thread", ids, op="delete")
+                    touched += len(ids)
+    return touched
+
+def refresh_threads_for_messages(db: Session, user_id: str, message_ids: Iterable[str]) -> int:
+    """Refresh the threads of messages that were just inserted or updated"""
+    return refresh_threads(db, user_id, thread_keys_for(db, message_ids))
+
+def backfill_email_threads(batch_size: int = 500) -> int:
+    """Build thread rows for messages whose thread has none yet.
+
+    Runs at startup; after the first run it only finds threads that were
+    written without going through the sync services.
+    """
+    db = SessionLocal()
+    built = 0
+    try:
+        while True:
+            missing = db.query(
+                EmailMessage.user_id,
+                EmailMessage.provider,
+                EmailMessage.thread_id
+            ).outerjoin(EmailThread, and_(
+                EmailThread.user_id == EmailMessage.user_id,
+                EmailThread.provider == EmailMessage.provider,
+                EmailThread.thread_id == EmailMessage.thread_id
+            )).filter(
+                EmailMessage.thread_id.isnot(None),
+                EmailMessage.provider.isnot(None),
+                EmailThread.id.is_(None)
+            ).distinct().limit(batch_size).all()
+            if not missing:
+                break
+            by_user: Dict[str, Set[ThreadKey]] = defaultdict(set)
+            for user_id, provider, thread_id in missing:
+                by_user[user_id].add((provider, thread_id))
+            for user_id, keys in by_user.items():
+                refresh_threads(db, user_id, keys)
+            db.commit()
+            built += len(missing)
+    finally:
+        db.close()
+    if built:
+        print(f"🧵 Built {built} email threads")
+    return built
@@ -0,0 +1,395 @@
+import asyncio
+import base64
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+from sqlalchemy.orm import Session
+
+from app.core.bulk import bulk_upsert
+from app.core.compression import TextCodec
+from app.core.config import settings
+from app.models.email_attachment import EmailAttachment
+from app.models.email_message import EmailMessage
+from app.models.sync_change import record_changes
+from app.models.sync_state import SyncState, get_sync_state
+from app.models.user import User
+from app.services.attachment_index import replace_attachments
+from app.services.body_storage import body_codec_for
+from app.services.email_threads import refresh_threads, refresh_threads_for_messages, thread_keys_for
+from app.services.oauth_tokens import google_headers, refresh_google_token
+
+GMAIL_API = "https://gmail.googleapis.com/gmail/v1/users/me"
+PROVIDER = "google"
+HISTORY_TYPES = ["messageAdded", "messageDeleted", "labelAdded", "labelRemoved"]
+METADATA_HEADERS = ["Subject", "From", "To"]
+PAGE_SIZE = 500
+# Downloads can outlast the pool's total timeout; only stalls are cut off
+STREAM_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_read=60)
+
+ProgressCallback = Optional[Callable[[Dict[str, Any]], None]]
+
+_session: Optional[aiohttp.ClientSession] = None
+
+class GmailHistoryExpired(Exception):
+    """The stored historyId is older than Gmail keeps history for"""
+
+class GmailError(Exception):
+    """Gmail answered with an unexpected status"""
+
+def google_session() -> aiohttp.ClientSession:
+    """Connection pool shared by every Google API call in the process"""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=settings.GMAIL_FETCH_CONCURRENCY * 2, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=30)
+        )
+    return _session
+
+async def close():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+class GmailClient:
+    """Gmail REST client for one user with bounded request parallelism.
+
+    Retries once after a 401 with a refreshed token.
+    """
+
+    def __init__(self, user: User, db: Session, concurrency: Optional[int] = None):
+        self.user = user
+        self.db = db
+        self.headers: Optional[Dict[str, str]] = None
+        self._semaphore = asyncio.Semaphore(concurrency or settings.GMAIL_FETCH_CONCURRENCY)
+
+    async def get(self, path: str, **params) -> Tuple[int, Dict[str, Any], Optional[str]]:
+        return await self._request("GET", path, params)
+
+    async def post(self, path: str, json: Dict[str, Any]) -> Tuple[int, Dict[str, Any], Optional[str]]:
+        return await self._request("POST", path, {}, json)
+
+    async def _request(self, method: str, path: str, params: Dict[str, Any], json: Optional[Dict[str, Any]] = None) -> Tuple[int, Dict[str, Any], Optional[str]]:
+        """Return (status, JSON body, Retry-After header); a body that is not JSON reads as {}"""
+        # aiohttp wants repeated query keys as a list of pairs
+        query = [
+            (key, str(item))
+            for key, value in params.items()
+            for item in (value if isinstance(value, list) else [value])
+        ]
+        async with self._semaphore:
+            if self.headers is None:
+                self.headers = await google_headers(self.user, self.db)
+            for attempt in range(2):
+                async with google_session().request(method, f"{GMAIL_API}/{path}", params=query, json=json, headers=self.headers) as resp:
+                    status, retry_after = resp.status, resp.headers.get("Retry-After")
+                    try:
+                        body = await resp.json(content_type=None) if status != 204 else {}
+                    except ValueError:
+                        body = {}  # e.g. an HTML error page from a proxy
+                if status == 401 and attempt == 0 and await refresh_google_token(self.user, self.db):
+                    self.headers = await google_headers(self.user, self.db)
+                    continue
+                return status, body or {}, retry_after
+
+    async def stream(self, path: str, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+        """Yield a response body in chunks, without the pool's total timeout"""
+        async with self._semaphore:
+            if self.headers is None:
+                self.headers = await google_headers(self.user, self.db)
+            for attempt in range(2):
+                async with google_session().get(f"{GMAIL_API}/{path}", headers=self.headers, timeout=STREAM_TIMEOUT) as resp:
+                    if resp.status == 401 and attempt == 0 and await refresh_google_token(self.user, self.db):
+                        self.headers = await google_headers(self.user, self.db)
+                        continue
+                    if resp.status >= 400:
+                        raise GmailError(f"Gmail {path} returned {resp.status}")
+                    async for chunk in resp.content.iter_chunked(chunk_size):
+                        yield chunk
+                    return
+
+    async def get_ok(self, path: str, **params) -> Dict[str, Any]:
+        status, body, _ = await self.get(path, **params)
+        if status >= 400:
+            raise GmailError(f"Gmail {path} returned {status}")
+        return body
+
+    async def get_message(self, message_id: str, format: str = "metadata") -> Optional[Dict[str, Any]]:
+        params = {"format": format}
+        if format == "metadata":
+            params["metadataHeaders"] = METADATA_HEADERS
+        status, body, _ = await self.get(f"messages/{message_id}", **params)
+        if status == 404:
+            return None  # deleted since it was listed
+        if status >= 400:
+            raise GmailError(f"Gmail message {message_id} returned {status}")
+        return body
+
+    async def get_messages(self, message_ids: Iterable[str], format: str = "metadata") -> List[Dict[str, Any]]:
+        """Fetch messages concurrently; missing ones are dropped"""
+        messages = await asyncio.gather(*(self.get_message(i, format) for i in message_ids))
+        return [m for m in messages if m is not None]
+
+def label_flags(label_ids: Iterable[str]) -> Dict[str, bool]:
+    label_ids = set(label_ids or [])
+    return {
+        "is_read": "UNREAD" not in label_ids,
+        "is_important": "IMPORTANT" in label_ids,
+        "is_starred": "STARRED" in label_ids
+    }
+
+def _decode(part: Dict[str, Any]) -> str:
+    data = part.get("body", {}).get("data")
+    return base64.urlsafe_b64decode(data).decode(errors="ignore") if data else ""
+
+def extract_bodies(payload: Dict[str, Any]) -> Tuple[str, str]:
+    """Return (html or text body, plain text body) from a full message payload"""
+    plain, html = "", ""
+    stack = [payload]
+    while stack:
+        part = stack.pop(0)
+        mime = part.get("mimeType", "")
+        if part.get("parts"):
+            stack.extend(part["parts"])
+        elif part.get("filename"):
+            continue  # attachment
+        elif mime == "text/html" and not html:
+            html = _decode(part)
+        elif not plain and (mime in ("text/plain", "") or not mime.startswith("text/html")):
+            plain = _decode(part)
+    return html or plain, plain or html
+
+def attachment_parts(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """EmailAttachment rows for the file parts of a full message payload"""
+    rows = []
+    stack = [payload]
+    while stack:
+        part = stack.pop(0)
+        stack.extend(part.get("parts", []))
+        if not part.get("filename"):
+            continue
+        headers = {h["name"].lower(): h["value"] for h in part.get("headers", [])}
+        body = part.get("body", {})
+        rows.append({
+            "external_id": part.get("partId") or body.get("attachmentId"),
+            "download_id": body.get("attachmentId"),
+            "filename": part["filename"],
+            "content_type": part.get("mimeType"),
+            "size": body.get("size"),
+            "is_inline": headers.get("content-disposition", "").lower().startswith("inline")
+        })
+    return rows
+
+def parse_gmail_message(data: Dict[str, Any], codec: TextCodec) -> Dict[str, Any]:
+    """Map a metadata-format Gmail message onto EmailMessage columns.
+
+    The body is left for `load_gmail_body`; the snippet stands in until then.
+    """
+    headers_list = data.get("payload", {}).get("headers", [])
+    return {
+        "thread_id": data.get("threadId"),
+        "subject": next((h["value"] for h in headers_list if h["name"] == "Subject"), "(No Subject)"),
+        "sender": next((h["value"] for h in headers_list if h["name"] == "From"), ""),
+        "recipients": [h["value"] for h in headers_list if h["name"] == "To"],
+        "body_plain_z": codec.encode(data.get("snippet", "")),
+        "body_pending": True,
+        "received_at": datetime.utcfromtimestamp(int(data.get("internalDate", "0")) / 1000),
+        **label_flags(data.get("labelIds", []))
+    }
+
+async def load_gmail_body(db: Session, user: User, email: EmailMessage) -> EmailMessage:
+    """Fetch the full body of a message synced with metadata only"""
+    if not email.body_pending or email.provider != PROVIDER or not user.google_access_token:
+        return email
+    data = await GmailClient(user, db, concurrency=1).get_message(email.external_id, format="full")
+    if data is not None:
+        codec = body_codec_for(db, user.id)
+        body, body_plain = extract_bodies(data.get("payload", {}))
+        email.body_z, email.body_plain_z = codec.encode(body), codec.encode(body_plain)
+        replace_attachments(db, email, attachment_parts(data.get("payload", {})))
+    email.body_pending = False
+    db.flush()
+    refresh_threads_for_messages(db, user.id, [email.id])
+    db.commit()
+    return email
+
+def _known_ids(db: Session, user_id: str, gmail_ids: List[str]) -> Dict[str, str]:
+    """Map the gmail ids a user already has to their row ids"""
+    if not gmail_ids:
+        return {}
+    rows = db.query(EmailMessage.external_id, EmailMessage.id).filter(
+        EmailMessage.user_id == user_id,
+        EmailMessage.provider == PROVIDER,
+        EmailMessage.external_id.in_(gmail_ids)
+    )
+    return {gmail_id: row_id for gmail_id, row_id in rows}
+
+def _upsert_messages(db: Session, user: User, messages: List[Dict[str, Any]]) -> int:
+    codec = body_codec_for(db, user.id)
+    rows = [{"external_id": data["id"], **parse_gmail_message(data, codec)} for data in messages]
+    stats = bulk_upsert(db, EmailMessage, "external_id", user.id, rows, scope={"provider": PROVIDER})
+    refresh_threads_for_messages(db, user.id, stats["ids"])
+    return stats["inserted"] + stats["updated"]
+
+def _apply_labels(db: Session, user: User, labels: Dict[str, List[str]]) -> int:
+    """Update read/important/starred flags without refetching the messages"""
+    rows = [{"external_id": gmail_id, **label_flags(label_ids)} for gmail_id, label_ids in labels.items()]
+    stats = bulk_upsert(db, EmailMessage, "external_id", user.id, rows, scope={"provider": PROVIDER}, insert=False)
+    refresh_threads_for_messages(db, user.id, stats["ids"])
+    return stats["updated"]
+
+def _delete_messages(db: Session, user: User, gmail_ids: List[str]) -> int:
+    ids = list(_known_ids(db, user.id, gmail_ids).values())
+    if ids:
+        threads = thread_keys_for(db, ids)
+        db.query(EmailAttachment).filter(EmailAttachment.email_id.in_(ids)).delete(synchronize_session=False)
+        db.query(EmailMessage).filter(EmailMessage.id.in_(ids)).delete(synchronize_session=False)
+        record_changes(db, user.id, "email", ids, op="delete")
+        refresh_threads(db, user.id, threads)
+    return len(ids)
+
+async def _full_sync(
+    db: Session,
+    user: User,
+    client: GmailClient,
+    state: SyncState,
+    on_progress: ProgressCallback = None
+) -> Dict[str, Any]:
+    """Page through the mailbox; messages already stored only get their labels refreshed.
+
+    Each page is committed together with the next page token, so an
+    interrupted backfill resumes from the last finished page.
+    """
+    if state.backfill_cursor is None:
+        # Taken before listing so nothing that arrives during the backfill is missed
+        state.backfill_cursor = str((await client.get_ok("profile"))["historyId"])
+        state.backfill_page_token = None
+        db.commit()
+
+    stats = {"mode": "full", "resumed": state.backfill_page_token is not None, "pages": 0, "added": 0, "updated": 0, "deleted": 0}
+    remaining = settings.MAIL_BACKFILL_MAX_MESSAGES
+    while remaining > 0:
+        params = {"maxResults": min(PAGE_SIZE, remaining)}
+        if state.backfill_page_token:
+            params["pageToken"] = state.backfill_page_token
+        status, listing, _ = await client.get("messages", **params)
+        if status == 400 and state.backfill_page_token:
+            # Stale page token: start the listing over, stored messages are cheap to skip
+            state.backfill_page_token = None
+            continue
+        if status >= 400:
+            raise GmailError(f"Gmail messages returned {status}")
+        ids = [m["id"] for m in listing.get("messages", [])]
+        remaining -= len(ids)
+
+        known = _known_ids(db, user.id, ids)
+        new_ids = [gmail_id for gmail_id in ids if gmail_id not in known]
+        added, minimal = await asyncio.gather(
+            client.get_messages(new_ids),
+            client.get_messages(known, format="minimal")
+        )
+        stats["added"] += _upsert_messages(db, user, added)
+        stats["updated"] += _apply_labels(db, user, {m["id"]: m.get("labelIds", []) for m in minimal})
+        state.backfill_page_token = listing.get("nextPageToken")
+        stats["pages"] += 1
+        db.commit()
+        if on_progress:
+            on_progress(dict(stats))
+        if not state.backfill_page_token:
+            break
+
+    state.cursor = state.backfill_cursor
+    state.backfill_cursor = None
+    state.backfill_page_token = None
+    state.last_full_sync_at = datetime.utcnow()
+    return stats
+
+def _collapse_history(records: List[Dict[str, Any]]) -> Tuple[List[str], Dict[str, List[str]], List[str]]:
+    """Reduce history records to (added ids, label-only changes, deleted ids)"""
+    added: Dict[str, None] = {}
+    deleted = set()
+    labels: Dict[str, List[str]] = {}
+    for record in records:
+        for entry in record.get("messagesAdded", []):
+            gmail_id = entry["message"]["id"]
+            added[gmail_id] = None
+            deleted.discard(gmail_id)
+        for entry in record.get("messagesDeleted", []):
+            gmail_id = entry["message"]["id"]
+            added.pop(gmail_id, None)
+            labels.pop(gmail_id, None)
+            deleted.add(gmail_id)
+        for entry in record.get("labelsAdded", []) + record.get("labelsRemoved", []):
+            message = entry["message"]
+            if message["id"] not in deleted:
+                labels[message["id"]] = message.get("labelIds", [])
+    label_only = {gmail_id: ids for gmail_id, ids in labels.items() if gmail_id not in added}
+    return list(added), label_only, list(deleted)
+
+async def _incremental_sync(
+    db: Session,
+    user: User,
+    client: GmailClient,
+    state: SyncState,
+    on_progress: ProgressCallback = None
+) -> Dict[str, Any]:
+    """Replay mailbox history since the stored historyId, one page at a time.
+
+    History records are ordered, so after each page the cursor moves to the
+    last applied record and an interrupted replay picks up from there.
+    """
+    stats = {"mode": "incremental", "pages": 0, "added": 0, "updated": 0, "deleted": 0}
+    start_history_id = state.cursor
+    page_token = None
+    while True:
+        params = {"startHistoryId": start_history_id, "maxResults": PAGE_SIZE, "historyTypes": HISTORY_TYPES}
+        if page_token:
+            params["pageToken"] = page_token
+        status, data, _ = await client.get("history", **params)
+        if status == 404:
+            raise GmailHistoryExpired(start_history_id)
+        if status >= 400:
+            raise GmailError(f"Gmail history returned {status}")
+        records = data.get("history", [])
+        added, labels, deleted = _collapse_history(records)
+        stats["added"] += _upsert_messages(db, user, await client.get_messages(added))
+        stats["updated"] += _apply_labels(db, user, labels)
+        stats["deleted"] += _delete_messages(db, user, deleted)
+
+        page_token = data.get("nextPageToken")
+        if not page_token:
+            state.cursor = str(data.get("historyId", state.cursor))
+        elif records:
+            state.cursor = str(records[-1]["id"])
+        stats["pages"] += 1
+        db.commit()
+        if on_progress:
+            on_progress(dict(stats))
+        if not page_token:
+            return stats
+
+async def sync_gmail(db: Session, user: User, on_progress: ProgressCallback = None) -> Dict[str, Any]:
+    """Bring a user's Gmail messages up to date.
+
+    Uses the History API from the stored historyId and falls back to a
+    paged backfill on the first run, once that history has expired, or to
+    finish a backfill that was interrupted. Messages are fetched
+    concurrently in metadata format; bodies load when an email is opened.
+    """
+    state = get_sync_state(db, user.id, PROVIDER, "gmail")
+    client = GmailClient(user, db)
+    result = None
+    if state.cursor and state.backfill_cursor is None:
+        try:
+            result = await _incremental_sync(db, user, client, state, on_progress)
+        except GmailHistoryExpired:
+            logging.error(f"Gmail history expired for user {user.id}, running a full sync")
+            db.rollback()
+    if result is None:
+        result = await _full_sync(db, user, client, state, on_progress)
+    state.last_synced_at = datetime.utcnow()
+    db.commit()
+    return result
@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import or_, and_, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal, dialect_insert
+from app.core.leases import NODE_ID
+from app.models.background_job import BackgroundJob
+
+# Lower values are claimed first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DEFAULT = 50
+PRIORITY_BATCH = 100
+
+ACTIVE_STATUSES = ["queued", "running"]
+
+class EnqueueConflict(Exception):
+    """The dedup key kept changing hands while the job was being queued"""
+
+class JobContext:
+    """What a handler sees of its job"""
+
+    def __init__(self, job: BackgroundJob, pool: "JobWorkerPool"):
+        self.id = job.id
+        self.kind = job.kind
+        self.user_id = job.user_id
+        self.payload = job.payload or {}
+        self.progress = job.progress or {}
+        self.attempts = job.attempts
+        self.max_attempts = job.max_attempts
+        self._claim = job.locked_by
+        self._pool = pool
+
+    def heartbeat(self) -> bool:
+        """Extend the visibility timeout; False once the job was claimed again elsewhere"""
+        return self._pool.heartbeat(self.id, self._claim)
+
+    def report_progress(self, progress: Dict[str, Any]) -> bool:
+        """Persist progress and extend the visibility timeout"""
+        self.progress = progress
+        return self._pool.heartbeat(self.id, self._claim, progress)
+
+JobHandler = Callable[[JobContext], Awaitable[Any]]
+
+_handlers: Dict[str, JobHandler] = {}
+
+def job_handler(kind: str):
+    """Register the coroutine that runs jobs of a kind"""
+    def decorator(func: JobHandler) -> JobHandler:
+        _handlers[kind] = func
+        return func
+    return decorator
+
+def enqueue(
+    db: Session,
+    kind: str,
+    payload: Optional[Dict[str, Any]] = None,
+    user_id: Optional[str] = None,
+    priority: int = PRIORITY_DEFAULT,
+    dedup_key: Optional[str] = None,
+    max_attempts: int = 3,
+    delay_seconds: int = 0
+) -> BackgroundJob:
+    """Queue a job, or return the active job already queued under dedup_key.
+
+    Commits the caller's session. A duplicate that finishes between the
+    conflicting insert and the lookup frees the key, so the insert is
+    tried once more before giving up with EnqueueConflict.
+    """
+    for _ in range(2):
+        job_id = str(uuid.uuid4())
+        stmt = dialect_insert(db, BackgroundJob).values(
+            id=job_id,
+            user_id=user_id,
+            kind=kind,
+            payload=payload or {},
+            priority=priority,
+            dedup_key=dedup_key,
+            status="queued",
+            attempts=0,
+            max_attempts=max_attempts,
+            run_after=datetime.utcnow() + timedelta(seconds=delay_seconds)
+        )
+        if dedup_key is not None:
+            stmt = stmt.on_conflict_do_nothing(
+                index_elements=[BackgroundJob.dedup_key],
+                index_where=BackgroundJob.status.in_(ACTIVE_STATUSES)
+            )
+        db.execute(stmt)
+        job = db.query(BackgroundJob).filter(BackgroundJob.id == job_id).first()
+        if job is None:
+            job = db.query(BackgroundJob).filter(
+                BackgroundJob.dedup_key == dedup_key,
+                BackgroundJob.status.in_(ACTIVE_STATUSES)
+            ).first()
+            # A more urgent request promotes the queued duplicate
+            if job is not None and job.status == "queued" and priority < job.priority:
+                job.priority = priority
+        db.commit()
+        if job is not None:
+            job_queue_pool.notify()
+            return job
+    raise EnqueueConflict(f"Could not queue {kind} job under dedup key {dedup_key}")
+
+def purge_finished(db: Session, older_than_days: Optional[int] = None) -> int:
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days or settings.JOB_RETENTION_DAYS)
+    deleted = db.query(BackgroundJob).filter(
+        BackgroundJob.status.in_(["succeeded", "failed"]),
+        BackgroundJob.finished_at < cutoff
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+class JobWorkerPool:
+    """Async workers draining the background_jobs table.
+
+    Jobs are claimed with a conditional UPDATE, so several processes can
+    share the table. A running job whose visibility timeout lapses (its
+    worker died) becomes claimable again. Every claim writes its own token
+    to locked_by, so a worker whose claim was taken over can neither
+    extend nor finish the job. Failed jobs are retried with
+    exponential backoff. Worker 0 only takes interactive-priority jobs, so
+    a backlog of batch work can never delay them.
+    """
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        visibility_timeout: Optional[int] = None
+    ):
+        self.concurrency = concurrency or settings.JOB_WORKERS
+        self.poll_interval = poll_interval or settings.JOB_POLL_INTERVAL_SECONDS
+        self.visibility_timeout = visibility_timeout or settings.JOB_VISIBILITY_TIMEOUT_SECONDS
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker(index))
+            for index in range(max(self.concurrency, 1))
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wake idle workers after a local enqueue. Safe to call from any thread."""
+        if self._wakeup is None or self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _claim(self, max_priority: Optional[int]) -> Optional[BackgroundJob]:
+        now = datetime.utcnow()
+        claimable = or_(
+            and_(BackgroundJob.status == "queued", BackgroundJob.run_after <= now),
+            and_(BackgroundJob.status == "running", BackgroundJob.locked_until < now)
+        )
+        db: Session = SessionLocal()
+        try:
+            query = db.query(BackgroundJob.id).filter(claimable)
+            if max_priority is not None:
+                query = query.filter(BackgroundJob.priority <= max_priority)
+            candidates = [row.id for row in query.order_by(
+                BackgroundJob.priority, BackgroundJob.run_after
+            ).limit(5)]
+            for job_id in candidates:
+                claim = f"{NODE_ID}:{uuid.uuid4().hex}"
+                result = db.execute(
+                    update(BackgroundJob)
+                    .where(BackgroundJob.id == job_id, claimable)
+                    .values(
+                        status="running",
+                        locked_by=claim,
+                        locked_until=now + timedelta(seconds=self.visibility_timeout),
+                        attempts=BackgroundJob.attempts + 1
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                db.commit()
+                if result.rowcount:
+                    job = db.query(BackgroundJob).filter(BackgroundJob.id == job_id).first()
+                    if job is None or job.locked_by != claim:
+                        continue
+                    db.expunge(job)
+                    return job
+            return None
+        finally:
+            db.close()
+
+    def heartbeat(self, job_id: str, claim: str, progress: Optional[Dict[str, Any]] = None) -> bool:
+        """Extend a claim's visibility timeout; False when the claim is no longer current"""
+        values = {"locked_until": datetime.utcnow() + timedelta(seconds=self.visibility_timeout)}
+        if progress is not None:
+            values["progress"] = progress
+        db: Session = SessionLocal()
+        try:
+            updated = db.query(BackgroundJob).filter(
+                BackgroundJob.id == job_id,
+                BackgroundJob.status == "running",
+                BackgroundJob.locked_by == claim
+            ).update(values, synchronize_session=False)
+            db.commit()
+            return bool(updated)
+        finally:
+            db.close()
+
+    def _finish(self, job: BackgroundJob, result: Any = None, error: Optional[str] = None):
+        now = datetime.utcnow()
+        values: Dict[str, Any] = {"locked_by": None, "locked_until": None}
+        if error is None:
+            values.update(status="succeeded", result=result, finished_at=now)
+        elif job.attempts < job.max_attempts:
+            values.update(
+                status="queued",
+                last_error=error,
+                run_after=now + timedelta(seconds=min(30 * (2 ** (job.attempts - 1)), 3600))
+            )
+        else:
+            values.update(status="failed", last_error=error, finished_at=now)
+        db: Session = SessionLocal()
+        try:
+            # Only the current claim may finish the job
+            updated = db.query(BackgroundJob).filter(
+                BackgroundJob.id == job.id,
+                BackgroundJob.status == "running",
+                BackgroundJob.locked_by == job.locked_by
+            ).update(values, synchronize_session=False)
+            db.commit()
+            if not updated:
+                logging.error(f"Job {job.kind} {job.id} was claimed again before it finished; result dropped")
+        finally:
+            db.close()
+
+    async def _worker(self, index: int):
+        max_priority = PRIORITY_INTERACTIVE if index == 0 and self.concurrency > 1 else None
+        while True:
+            try:
+                job = self._claim(max_priority)
+            except Exception as e:
+                logging.error(f"Job claim failed: {e}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            handler = _handlers.get(job.kind)
+            if handler is None:
+                self._finish(job, error=f"No handler registered for '{job.kind}'")
+                continue
+            try:
+                result = await handler(JobContext(job, self))
+                self._finish(job, result=result)
+            except asyncio.CancelledError:
+                # Shutdown: the visibility timeout hands the job to another worker
+                raise
+            except Exception as e:
+                logging.error(f"Job {job.kind} {job.id} failed (attempt {job.attempts}): {e}")
+                self._finish(job, error=str(e))
+
+job_queue_pool = JobWorkerPool()
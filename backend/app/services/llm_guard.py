@@ -0,0 +1,241 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import openai
+
+from app.core.config import settings
+
+class CircuitOpenError(Exception):
+    """The remote provider is considered unhealthy; calls fail fast"""
+
+class TokenBucket:
+    """Refills `rate_per_minute` units per minute, holding at most one minute's worth"""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def drain(self, seconds: float):
+        """Push the bucket into debt, e.g. to honor a Retry-After"""
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+class AdaptiveConcurrency:
+    """AIMD concurrency limit: +1/limit per healthy call, halved on throttling or slow calls"""
+
+    def __init__(self, initial: int, maximum: int, latency_target: float, minimum: int = 1):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, latency: Optional[float], throttled: bool = False):
+        async with self._condition:
+            self.in_flight -= 1
+            if throttled or (latency is not None and latency > self.latency_target):
+                self.limit = max(self.minimum, self.limit / 2)
+            elif latency is not None:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets a single probe through after a cooldown"""
+
+    def __init__(self, failure_threshold: int, cooldown_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown_seconds:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def end_probe(self):
+        """Let another probe through when one ended without a verdict, e.g. cancelled"""
+        self._probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.state = "closed"
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logging.error(f"LLM circuit opened after {self.failures} consecutive failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+def request_key(model: str, messages: List[Dict[str, str]], max_tokens: int, temperature: float) -> str:
+    """Identity of a completion request; whitespace-only differences collapse"""
+    normalized = [
+        {"role": m["role"], "content": " ".join(m["content"].split())}
+        for m in messages
+    ]
+    raw = json.dumps([model, normalized, max_tokens, temperature], sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+class SingleFlight:
+    """Share one in-flight call among concurrent callers with the same key"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            self.leaders += 1
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._done(key, f))
+        # Shielded so one caller going away does not cancel the call for the rest
+        return await asyncio.shield(future)
+
+    def _done(self, key: str, future: asyncio.Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            future.exception()  # mark retrieved even if every caller went away
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"in_flight_keys": len(self._inflight), "leaders": self.leaders, "coalesced": self.coalesced}
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def _is_provider_failure(error: Exception) -> bool:
+    """Errors that say the provider is unhealthy, as opposed to a bad request"""
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+class LLMGuard:
+    """Shared admission control for every call to the remote LLM provider.
+
+    Calls wait for request and token budget (token buckets for requests and
+    tokens per minute) and for an adaptive concurrency slot. 429s shrink the
+    concurrency limit, drain the buckets for the Retry-After period and are
+    retried. Connection errors, timeouts and 5xx feed a circuit breaker;
+    while it is open calls raise CircuitOpenError immediately. Limits are
+    per process.
+    """
+
+    def __init__(self):
+        self.requests = TokenBucket(settings.LLM_REQUESTS_PER_MINUTE)
+        self.tokens = TokenBucket(settings.LLM_TOKENS_PER_MINUTE)
+        self.concurrency = AdaptiveConcurrency(
+            initial=max(1, settings.LLM_MAX_CONCURRENCY // 2),
+            maximum=settings.LLM_MAX_CONCURRENCY,
+            latency_target=settings.LLM_LATENCY_TARGET_SECONDS
+        )
+        self.breaker = CircuitBreaker(
+            settings.LLM_BREAKER_FAILURE_THRESHOLD,
+            settings.LLM_BREAKER_COOLDOWN_SECONDS
+        )
+        self.max_retries = settings.LLM_MAX_RETRIES
+        self.metrics = {"calls": 0, "throttled": 0, "failures": 0, "rejected": 0, "fallbacks": 0}
+        self.single_flight = SingleFlight()
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], estimated_tokens: int = 1) -> Any:
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                self.metrics["rejected"] += 1
+                raise CircuitOpenError("LLM provider circuit is open")
+            probe = self.breaker.state == "half_open"
+            try:
+                await self.requests.acquire(1)
+                await self.tokens.acquire(estimated_tokens)
+                await self.concurrency.acquire()
+                started = time.monotonic()
+                latency = None
+                throttled = False
+                try:
+                    self.metrics["calls"] += 1
+                    result = await fn()
+                    latency = time.monotonic() - started
+                    self.breaker.record_success()
+                    return result
+                except openai.RateLimitError as e:
+                    throttled = True
+                    self.metrics["throttled"] += 1
+                    # A throttled call is an answer from a healthy provider
+                    self.breaker.record_success()
+                    if attempt == self.max_retries:
+                        raise
+                    wait = _retry_after(e) or min(2 ** attempt, 30)
+                    self.requests.drain(wait)
+                except Exception as e:
+                    if _is_provider_failure(e):
+                        self.metrics["failures"] += 1
+                        self.breaker.record_failure()
+                    elif isinstance(e, openai.APIStatusError):
+                        # Any other HTTP answer, such as a 400, means the provider is up
+                        self.breaker.record_success()
+                    raise
+                finally:
+                    await self.concurrency.release(latency, throttled)
+            finally:
+                # A probe that was cancelled or hit a local error must not wedge the breaker
+                if probe:
+                    self.breaker.end_probe()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "circuit": self.breaker.state,
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "in_flight": self.concurrency.in_flight,
+            **self.metrics,
+            "single_flight": self.single_flight.snapshot()
+        }
+
+llm_guard = LLMGuard()
@@ -0,0 +1,267 @@
+import asyncio
+import base64
+import logging
+from datetime import datetime
+from email.message import EmailMessage as MimeMessage
+from email.utils import getaddresses, make_msgid
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.email_message import EmailMessage
+from app.models.outbound_email import OutboundEmail
+from app.models.user import User
+from app.services.gmail_sync import GmailClient
+from app.services.job_queue import JobContext, enqueue, job_handler, PRIORITY_INTERACTIVE
+from app.services.llm_guard import TokenBucket
+from app.services.oauth_tokens import outlook_headers, refresh_outlook_token
+from app.services.outlook_sync import GRAPH_API, graph_session
+from app.services.realtime import realtime_hub
+
+REPLY_HEADERS = ["Subject", "From", "Reply-To", "To", "Message-ID", "References"]
+
+# One send budget per provider, shared by every worker in the process
+_send_buckets: Dict[str, TokenBucket] = {}
+
+class SendError(Exception):
+    """The provider did not accept the message; `retry` says whether trying again can help"""
+
+    def __init__(self, message: str, retry: bool = True, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry = retry
+        self.retry_after = retry_after
+
+def _bucket(provider: str) -> TokenBucket:
+    if provider not in _send_buckets:
+        _send_buckets[provider] = TokenBucket(settings.MAIL_SEND_PER_MINUTE)
+    return _send_buckets[provider]
+
+def _check_status(provider: str, status: int, retry_after: Optional[str] = None):
+    if status < 400:
+        return
+    if status == 429 or status >= 500:
+        try:
+            wait = float(retry_after) if retry_after else None
+        except ValueError:
+            wait = None
+        raise SendError(f"{provider} send returned {status}", retry_after=wait)
+    raise SendError(f"{provider} send returned {status}", retry=False)
+
+def queue_reply(db: Session, user: User, email: EmailMessage, body: str) -> OutboundEmail:
+    """Record a reply and queue it for sending. Commits."""
+    outbound = OutboundEmail(
+        user_id=user.id,
+        email_id=email.id,
+        provider=email.provider,
+        recipients=[email.sender],
+        subject=email.subject if email.subject.lower().startswith("re:") else f"Re: {email.subject}",
+        body=body
+    )
+    db.add(outbound)
+    db.commit()
+    job = enqueue(  # commits
+        db,
+        "email_send",
+        payload={"outbound_id": outbound.id},
+        user_id=user.id,
+        priority=PRIORITY_INTERACTIVE,
+        dedup_key=f"email_send:{outbound.id}",
+        max_attempts=settings.MAIL_SEND_MAX_ATTEMPTS
+    )
+    outbound.job_id = job.id
+    db.commit()
+    return outbound
+
+async def _send_gmail(db: Session, user: User, email: EmailMessage, outbound: OutboundEmail) -> Optional[str]:
+    """Send as a reply in the original thread, with the threading headers Gmail expects"""
+    client = GmailClient(user, db, concurrency=1)
+    status, original, retry_after = await client.get(f"messages/{email.external_id}", format="metadata", metadataHeaders=REPLY_HEADERS)
+    _check_status("gmail", status, retry_after)
+    headers = {h["name"].lower(): h["value"] for h in original.get("payload", {}).get("headers", [])}
+
+    message = MimeMessage()
+    message["From"] = user.email
+    message["To"] = headers.get("reply-to") or headers.get("from") or ", ".join(outbound.recipients or [])
+    message["Subject"] = outbound.subject
+    message["Message-ID"] = outbound.message_id
+    if headers.get("message-id"):
+        message["In-Reply-To"] = headers["message-id"]
+        message["References"] = f"{headers.get('references', '')} {headers['message-id']}".strip()
+    message.set_content(outbound.body)
+    outbound.recipients = [address for _, address in getaddresses([message["To"]])]
+
+    raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
+    status, sent, retry_after = await client.post("messages/send", {"raw": raw, "threadId": email.thread_id} if email.thread_id else {"raw": raw})
+    _check_status("gmail", status, retry_after)
+    return sent.get("id")
+
+async def _find_sent_gmail(db: Session, user: User, outbound: OutboundEmail) -> Optional[str]:
+    client = GmailClient(user, db, concurrency=1)
+    status, found, retry_after = await client.get("messages", q=f"rfc822msgid:{outbound.message_id.strip('<>')}", includeSpamTrash="true")
+    _check_status("gmail", status, retry_after)
+    messages = found.get("messages") or []
+    return messages[0]["id"] if messages else None
+
+async def _graph(db: Session, user: User, method: str, url: str, **kwargs) -> Tuple[int, Dict[str, Any], Optional[str]]:
+    for attempt in range(2):
+        async with graph_session().request(method, url, headers=await outlook_headers(user, db), **kwargs) as resp:
+            status, retry_after = resp.status, resp.headers.get("Retry-After")
+            body = await resp.json(content_type=None) if resp.content_type == "application/json" else {}
+        if status == 401 and attempt == 0 and await refresh_outlook_token(user, db):
+            continue
+        return status, body or {}, retry_after
+
+async def _send_outlook(db: Session, user: User, email: EmailMessage, outbound: OutboundEmail) -> Optional[str]:
+    """Create a reply draft, record its ids, then send it.
+
+    Graph's createReply threads the message and picks the recipients itself.
+    A draft can only be sent once, so a retry never sends a second copy.
+    """
+    if outbound.external_id is None:
+        status, draft, retry_after = await _graph(
+            db, user, "POST", f"{GRAPH_API}/me/messages/{email.external_id}/createReply",
+            json={"comment": outbound.body}
+        )
+        _check_status("outlook", status, retry_after)
+        outbound.external_id = draft.get("id")
+        outbound.message_id = draft.get("internetMessageId")
+        db.commit()
+    status, _, retry_after = await _graph(db, user, "POST", f"{GRAPH_API}/me/messages/{outbound.external_id}/send")
+    if status == 404:
+        # The draft is gone: either an earlier attempt sent it or the user deleted it
+        sent_id = await _find_sent_outlook(db, user, outbound)
+        if sent_id is None:
+            raise SendError("outlook reply draft no longer exists", retry=False)
+        return sent_id
+    _check_status("outlook", status, retry_after)
+    return outbound.external_id
+
+async def _find_sent_outlook(db: Session, user: User, outbound: OutboundEmail) -> Optional[str]:
+    if not outbound.message_id:
+        return None
+    message_id = outbound.message_id.replace("'", "''")
+    status, found, retry_after = await _graph(
+        db, user, "GET", f"{GRAPH_API}/me/mailFolders/sentitems/messages",
+        params={"$filter": f"internetMessageId eq '{message_id}'", "$select": "id"}
+    )
+    _check_status("outlook", status, retry_after)
+    messages = found.get("value") or []
+    return messages[0]["id"] if messages else None
+
+SENDERS = {
+    "google": _send_gmail,
+    "outlook": _send_outlook,
+}
+
+# Look a message up by Message-ID among the user's sent mail
+SENT_LOOKUPS = {
+    "google": _find_sent_gmail,
+    "outlook": _find_sent_outlook,
+}
+
+def _publish(outbound: OutboundEmail):
+    realtime_hub.publish(outbound.user_id, "email_send_status", {
+        "id": outbound.id,
+        "email_id": outbound.email_id,
+        "status": outbound.status,
+        "error": outbound.last_error
+    })
+
+async def _acquire_send_slot(bucket: TokenBucket, job: JobContext) -> bool:
+    """Wait for send budget, heartbeating the job so a long wait is not taken for a dead worker.
+
+    False when the job was claimed again meanwhile; the caller must not send.
+    """
+    waiter = asyncio.ensure_future(bucket.acquire())
+    try:
+        while True:
+            done, _ = await asyncio.wait({waiter}, timeout=settings.JOB_VISIBILITY_TIMEOUT_SECONDS / 3)
+            if not job.heartbeat():
+                return False
+            if done:
+                return True
+    finally:
+        waiter.cancel()
+
+def _mark_sent(db: Session, outbound: OutboundEmail, external_id: Optional[str]) -> Dict[str, Any]:
+    outbound.external_id = external_id
+    outbound.status = "sent"
+    outbound.last_error = None
+    outbound.sent_at = datetime.utcnow()
+    db.commit()
+    _publish(outbound)
+    return {"status": outbound.status, "external_id": outbound.external_id}
+
+@job_handler("email_send")
+async def send_outbound_email(job: JobContext) -> Dict[str, Any]:
+    """Send one queued reply.
+
+    The row is claimed with a conditional update, so two attempts can
+    never both send it. Sends wait for the provider's token bucket while
+    heartbeating the job. A row still 'sending' from an attempt that died
+    is first looked up by Message-ID in the sent folder and only resent
+    when it is not there. Throttling and provider errors are retried by
+    the job queue with backoff; rejected messages fail at once.
+    """
+    db: Session = SessionLocal()
+    try:
+        outbound = db.get(OutboundEmail, job.payload["outbound_id"])
+        if outbound is None or outbound.status in ("sent", "failed"):
+            return {"skipped": outbound.status if outbound else "not found"}
+        user = db.get(User, outbound.user_id)
+        email = db.get(EmailMessage, outbound.email_id) if outbound.email_id else None
+        send = SENDERS.get(outbound.provider)
+        if user is None or email is None or send is None:
+            outbound.status = "failed"
+            outbound.last_error = "The original email or account is no longer available"
+            db.commit()
+            _publish(outbound)
+            return {"status": outbound.status}
+
+        if outbound.status == "sending" and outbound.message_id:
+            sent_id = await SENT_LOOKUPS[outbound.provider](db, user, outbound)
+            if sent_id is not None:
+                return _mark_sent(db, outbound, sent_id)
+
+        # Compare-and-set on what was read; a concurrent attempt makes this match nothing
+        claimed = db.query(OutboundEmail).filter(
+            OutboundEmail.id == outbound.id,
+            OutboundEmail.status == outbound.status,
+            OutboundEmail.attempts == outbound.attempts
+        ).update({
+            "status": "sending",
+            "attempts": job.attempts,
+            "message_id": outbound.message_id or (make_msgid() if outbound.provider == "google" else None)
+        }, synchronize_session=False)
+        db.commit()
+        if not claimed:
+            return {"skipped": "claimed by another attempt"}
+        db.refresh(outbound)
+
+        bucket = _bucket(outbound.provider)
+        if not await _acquire_send_slot(bucket, job):
+            return {"skipped": "job was claimed again"}
+        try:
+            external_id = await send(db, user, email, outbound)
+        except Exception as e:
+            retry = getattr(e, "retry", True) and job.attempts < job.max_attempts
+            if getattr(e, "retry_after", None):
+                bucket.drain(e.retry_after)
+            if not retry:
+                outbound.status = "failed"
+            elif isinstance(e, SendError):
+                outbound.status = "queued"  # the provider answered and did not take it
+            # Otherwise the outcome is unknown; staying 'sending' makes the retry look first
+            outbound.last_error = str(e)
+            db.commit()
+            _publish(outbound)
+            if retry:
+                raise
+            logging.error(f"Sending reply {outbound.id} failed: {e}")
+            return {"status": outbound.status, "error": outbound.last_error}
+
+        return _mark_sent(db, outbound, external_id)
+    finally:
+        db.close()
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import smtplib
+from collections import defaultdict
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.notification_outbox import NotificationOutbox
+from app.models.user import User
+
+def enqueue_email_notification(
+    db: Session,
+    user_id: str,
+    subject: str,
+    body: str,
+    suggestion_id: Optional[str] = None
+) -> NotificationOutbox:
+    """Add an email notification to the outbox; the caller commits"""
+    item = NotificationOutbox(
+        user_id=user_id,
+        channel="email",
+        subject=subject,
+        body=body,
+        suggestion_id=suggestion_id,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.add(item)
+    return item
+
+def build_digest(items: List[NotificationOutbox]) -> Tuple[str, str]:
+    """Combine a user's pending notifications into one message"""
+    if len(items) == 1:
+        return items[0].subject, items[0].body
+    subject = f"AI Assistant: {len(items)} new notifications"
+    body = "\n\n".join(f"- {item.subject}\n  {item.body}" for item in items)
+    return subject, body
+
+def purge_delivered_notifications(db: Session, older_than_days: Optional[int] = None) -> int:
+    """Delete sent and failed outbox rows older than NOTIFICATION_RETENTION_DAYS"""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days or settings.NOTIFICATION_RETENTION_DAYS)
+    deleted = db.query(NotificationOutbox).filter(
+        NotificationOutbox.status.in_(["sent", "failed"]),
+        NotificationOutbox.created_at < cutoff
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+class NotificationDeliveryWorker:
+    """Drain the notification outbox over one reused SMTP connection per batch.
+
+    Pending rows are grouped into a digest per user. Failed digests are
+    retried with exponential backoff up to NOTIFICATION_MAX_ATTEMPTS.
+    SMTP_HOST/SMTP_PORT can point at a local SMTP stand-in for testing.
+    """
+
+    def __init__(self, batch_size: Optional[int] = None):
+        self.batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+
+    def _backoff(self, attempts: int) -> timedelta:
+        seconds = settings.NOTIFICATION_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+        return timedelta(seconds=min(seconds, 6 * 60 * 60))
+
+    def _send_batch(self, messages: Dict[str, MIMEText]) -> Dict[str, Optional[str]]:
+        """Send every digest over one SMTP session; returns an error per failed user"""
+        errors: Dict[str, Optional[str]] = {}
+        try:
+            with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=30) as smtp:
+                if settings.SMTP_USER and settings.SMTP_PASSWORD:
+                    smtp.starttls()
+                    smtp.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+                for user_id, msg in messages.items():
+                    try:
+                        smtp.send_message(msg)
+                        errors[user_id] = None
+                    except smtplib.SMTPServerDisconnected:
+                        raise
+                    except Exception as e:
+                        errors[user_id] = str(e)
+        except Exception as e:
+            # Connection-level failure: everything not yet sent is retried
+            for user_id in messages:
+                errors.setdefault(user_id, str(e))
+        return errors
+
+    async def run_once(self) -> Dict[str, int]:
+        now = datetime.utcnow()
+        db: Session = SessionLocal()
+        try:
+            pending = db.query(NotificationOutbox).filter(
+                NotificationOutbox.status == "pending",
+                NotificationOutbox.channel == "email",
+                NotificationOutbox.next_attempt_at <= now
+            ).order_by(NotificationOutbox.next_attempt_at).limit(self.batch_size).all()
+            if not pending:
+                return {"sent": 0, "failed": 0}
+
+            by_user: Dict[str, List[NotificationOutbox]] = defaultdict(list)
+            for item in pending:
+                by_user[item.user_id].append(item)
+            recipients = dict(db.query(User.id, User.email).filter(User.id.in_(by_user.keys())).all())
+
+            messages: Dict[str, MIMEText] = {}
+            for user_id, items in by_user.items():
+                if not recipients.get(user_id):
+                    continue
+                subject, body = build_digest(items)
+                msg = MIMEText(body)
+                msg['Subject'] = subject
+                msg['From'] = settings.EMAIL_FROM
+                msg['To'] = recipients[user_id]
+                messages[user_id] = msg
+
+            errors = await asyncio.to_thread(self._send_batch, messages) if messages else {}
+
+            counts = {"sent": 0, "failed": 0}
+            for user_id, items in by_user.items():
+                error = errors.get(user_id, "User has no email address")
+                for item in items:
+                    item.attempts += 1
+                    if error is None:
+                        item.status = "sent"
+                        item.sent_at = now
+                        item.last_error = None
+                    else:
+                        item.last_error = error
+                        if item.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+                            item.status = "failed"
+                        else:
+                            item.next_attempt_at = now + self._backoff(item.attempts)
+                counts["sent" if error is None else "failed"] += len(items)
+            db.commit()
+            if counts["failed"]:
+                logging.error(f"Notification delivery: {counts['failed']} notifications failed, will retry")
+            return counts
+        finally:
+            db.close()
+
+notification_worker = NotificationDeliveryWorker()
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+
+import aiohttp
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.user import User
+
+GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
+OUTLOOK_TOKEN_URL = "https://login.microsoftonline.com/common/oauth2/v2.0/token"
+# Refreshes run on the event loop; a stalled token endpoint must not hold it up
+REFRESH_TIMEOUT = aiohttp.ClientTimeout(total=15)
+
+async def _request_tokens(url: str, data: dict, provider: str) -> dict:
+    """POST a refresh grant; the new tokens, or {} when the provider refused or was unreachable"""
+    try:
+        async with aiohttp.ClientSession(timeout=REFRESH_TIMEOUT) as session:
+            async with session.post(url, data=data) as resp:
+                if resp.status < 400:
+                    return await resp.json(content_type=None)
+                logging.error(f"Failed to refresh {provider} token: {await resp.text()}")
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        logging.error(f"Failed to refresh {provider} token: {e!r}")
+    return {}
+
+async def refresh_google_token(user: User, db: Session) -> bool:
+    if not user.google_refresh_token:
+        return False
+    data = {
+        "client_id": settings.GOOGLE_CLIENT_ID,
+        "client_secret": settings.GOOGLE_CLIENT_SECRET,
+        "refresh_token": user.google_refresh_token,
+        "grant_type": "refresh_token",
+    }
+    tokens = await _request_tokens(GOOGLE_TOKEN_URL, data, "Google")
+    if "access_token" not in tokens:
+        return False
+    user.update_google_token(tokens["access_token"], tokens["expires_in"])
+    db.commit()
+    return True
+
+async def refresh_outlook_token(user: User, db: Session) -> bool:
+    if not user.outlook_refresh_token:
+        return False
+    data = {
+        "client_id": settings.OUTLOOK_CLIENT_ID,
+        "client_secret": settings.OUTLOOK_CLIENT_SECRET,
+        "refresh_token": user.outlook_refresh_token,
+        "grant_type": "refresh_token",
+        "scope": "https://graph.microsoft.com/.default offline_access",
+    }
+    tokens = await _request_tokens(OUTLOOK_TOKEN_URL, data, "Outlook")
+    if "access_token" not in tokens:
+        return False
+    user.update_outlook_token(tokens["access_token"], tokens["expires_in"])
+    db.commit()
+    return True
+
+async def google_headers(user: User, db: Session) -> dict:
+    """Authorization headers for Google APIs, refreshing an expiring token first"""
+    if user.is_google_token_expired():
+        await refresh_google_token(user, db)
+    return {"Authorization": f"Bearer {user.google_access_token}"}
+
+async def outlook_headers(user: User, db: Session) -> dict:
+    """Authorization headers for Microsoft Graph, refreshing an expiring token first"""
+    if user.is_outlook_token_expired():
+        await refresh_outlook_token(user, db)
+    return {"Authorization": f"Bearer {user.outlook_access_token}"}
@@ -0,0 +1,265 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlencode
+
+import aiohttp
+from sqlalchemy.orm import Session
+
+from app.core.bulk import bulk_upsert
+from app.core.compression import TextCodec
+from app.core.config import settings
+from app.models.calendar_event import CalendarEvent
+from app.models.email_attachment import EmailAttachment
+from app.models.email_message import EmailMessage
+from app.models.sync_change import SYNC_ENTITY_TYPES, record_changes
+from app.models.sync_state import get_sync_state
+from app.models.user import User
+from app.services.body_storage import body_codec_for
+from app.services.calendar_occurrences import refresh_series, series_roots
+from app.services.email_threads import refresh_threads, thread_keys_for
+from app.services.oauth_tokens import outlook_headers, refresh_outlook_token
+
+GRAPH_API = "https://graph.microsoft.com/v1.0"
+PROVIDER = "outlook"
+PAGE_SIZE = 100
+MESSAGE_FIELDS = "conversationId,subject,from,toRecipients,body,bodyPreview,isRead,importance,flag,hasAttachments,receivedDateTime"
+
+# Downloads can outlast the pool's total timeout; only stalls are cut off
+STREAM_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_read=60)
+
+ProgressCallback = Optional[Callable[[Dict[str, Any]], None]]
+
+_session: Optional[aiohttp.ClientSession] = None
+
+class DeltaExpired(Exception):
+    """Graph no longer recognizes the stored delta or skip token (410 Gone)"""
+
+class GraphError(Exception):
+    """Graph answered with an unexpected status"""
+
+def graph_session() -> aiohttp.ClientSession:
+    """Connection pool shared by every Microsoft Graph call in the process"""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=30)
+        )
+    return _session
+
+async def close():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+def parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    """Parse the ISO 8601 timestamps Graph and Google return into naive UTC"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+async def graph_pages(db: Session, user: User, url: str) -> AsyncIterator[Dict[str, Any]]:
+    """Yield each page of a Graph collection, following @odata.nextLink"""
+    headers = {**await outlook_headers(user, db), "Prefer": f"odata.maxpagesize={PAGE_SIZE}"}
+    refreshed = False
+    while url:
+        async with graph_session().get(url, headers=headers) as resp:
+            status = resp.status
+            page = await resp.json(content_type=None) if status < 400 else None
+        if status == 401 and not refreshed and await refresh_outlook_token(user, db):
+            refreshed = True
+            headers.update(await outlook_headers(user, db))
+            continue
+        if status == 410:
+            raise DeltaExpired(url)
+        if status >= 400:
+            raise GraphError(f"Graph {url} returned {status}")
+        yield page
+        url = page.get("@odata.nextLink")
+
+def _known_row_ids(db: Session, user: User, model, external_ids: List[str]) -> List[str]:
+    if not external_ids:
+        return []
+    return [row.id for row in db.query(model.id).filter(
+        model.user_id == user.id,
+        model.provider == PROVIDER,
+        model.external_id.in_(external_ids)
+    )]
+
+def _delete_external(db: Session, user: User, model, external_ids: List[str]) -> int:
+    ids = _known_row_ids(db, user, model, external_ids)
+    if ids:
+        db.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+        record_changes(db, user.id, SYNC_ENTITY_TYPES[model.__tablename__], ids, op="delete")
+    return len(ids)
+
+def _remove_external(db: Session, user: User, model, removed: List[str], changed_ids: Optional[List[str]] = None) -> int:
+    """Delete removed items, refreshing the threads or series they and `changed_ids` belong to"""
+    changed_ids = changed_ids or []
+    if model is CalendarEvent:
+        series = series_roots(db, user.id, changed_ids + _known_row_ids(db, user, model, removed))
+        deleted = _delete_external(db, user, model, removed)
+        refresh_series(db, user.id, series)
+        return deleted
+    if model is not EmailMessage:
+        return _delete_external(db, user, model, removed)
+    removed_ids = _known_row_ids(db, user, model, removed)
+    threads = thread_keys_for(db, changed_ids + removed_ids)
+    if removed_ids:
+        db.query(EmailAttachment).filter(EmailAttachment.email_id.in_(removed_ids)).delete(synchronize_session=False)
+    deleted = _delete_external(db, user, model, removed)
+    refresh_threads(db, user.id, threads)
+    return deleted
+
+def _apply_delta_page(
+    db: Session,
+    user: User,
+    model,
+    items: List[Dict[str, Any]],
+    to_row: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]
+) -> Tuple[int, int, List[str]]:
+    """Upsert changed items and delete removed ones; returns (changed, deleted, upserted external ids)"""
+    removed = [item["id"] for item in items if "@removed" in item]
+    rows = [row for row in (to_row(item) for item in items if "@removed" not in item) if row]
+    stats = bulk_upsert(db, model, "external_id", user.id, rows, scope={"provider": PROVIDER})
+    deleted = _remove_external(db, user, model, removed, stats["ids"])
+    return stats["inserted"] + stats["updated"], deleted, [row["external_id"] for row in rows]
+
+def _prune_unseen(db: Session, user: User, model, seen: Set[str], window: Optional[Tuple[datetime, datetime]] = None) -> int:
+    """Delete rows a complete full round no longer returned.
+
+    A full round lists only what exists, so items deleted while the delta
+    link was stale would otherwise stay forever. With a window, only rows
+    inside it are candidates; the listing says nothing about the rest.
+    """
+    query = db.query(model.external_id).filter(model.user_id == user.id, model.provider == PROVIDER)
+    if window is not None:
+        query = query.filter(model.end_time >= window[0], model.start_time <= window[1])
+    stale = [row.external_id for row in query if row.external_id not in seen]
+    return _remove_external(db, user, model, stale) if stale else 0
+
+async def delta_sync(
+    db: Session,
+    user: User,
+    resource: str,
+    initial_url: str,
+    model,
+    to_row: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+    on_progress: ProgressCallback = None,
+    window: Optional[Tuple[datetime, datetime]] = None
+) -> Dict[str, Any]:
+    """Run one Graph delta round for a resource.
+
+    Starts from the stored deltaLink, or from `initial_url` when there is
+    none. The nextLink is checkpointed with every committed page, so an
+    interrupted round resumes from there; the final page's deltaLink
+    becomes the cursor for the next round. An expired link restarts the
+    round from scratch. A full round that ran from its first page ends by
+    deleting the rows it did not return (within `window`, if given).
+    """
+    state = get_sync_state(db, user.id, PROVIDER, resource)
+    for attempt in range(2):
+        stats = {
+            "mode": "incremental" if state.cursor else "full",
+            "resumed": state.backfill_page_token is not None,
+            "pages": 0,
+            "changed": 0,
+            "deleted": 0
+        }
+        url = state.backfill_page_token or state.cursor or initial_url
+        seen: Set[str] = set()
+        try:
+            async for page in graph_pages(db, user, url):
+                changed, deleted, upserted = _apply_delta_page(db, user, model, page.get("value", []), to_row)
+                seen.update(upserted)
+                stats["changed"] += changed
+                stats["deleted"] += deleted
+                stats["pages"] += 1
+                state.backfill_page_token = page.get("@odata.nextLink")
+                if page.get("@odata.deltaLink"):
+                    state.cursor = page["@odata.deltaLink"]
+                db.commit()
+                if on_progress:
+                    on_progress(dict(stats))
+            break
+        except DeltaExpired:
+            if attempt:
+                raise
+            db.rollback()
+            logging.error(f"Outlook {resource} delta expired for user {user.id}, running a full sync")
+            state.cursor = None
+            state.backfill_page_token = None
+            db.commit()
+    if stats["mode"] == "full":
+        if not stats["resumed"]:
+            stats["deleted"] += _prune_unseen(db, user, model, seen, window)
+        state.last_full_sync_at = datetime.utcnow()
+    state.last_synced_at = datetime.utcnow()
+    db.commit()
+    return stats
+
+def _message_row(msg: Dict[str, Any], codec: TextCodec) -> Dict[str, Any]:
+    return {
+        "external_id": msg["id"],
+        "thread_id": msg.get("conversationId"),
+        "subject": msg.get("subject") or "(No Subject)",
+        "sender": (msg.get("from") or {}).get("emailAddress", {}).get("address", ""),
+        "recipients": [r.get("emailAddress", {}).get("address", "") for r in msg.get("toRecipients", [])],
+        "body_z": codec.encode((msg.get("body") or {}).get("content", "")),
+        "body_plain_z": codec.encode(msg.get("bodyPreview", "")),
+        "is_read": msg.get("isRead", False),
+        "is_important": msg.get("importance", "normal") == "high",
+        "is_starred": (msg.get("flag") or {}).get("flagStatus") == "flagged",
+        "has_attachments": msg.get("hasAttachments", False),
+        "received_at": parse_datetime(msg.get("receivedDateTime")) or datetime.utcnow()
+    }
+
+def _event_row(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    start = (event.get("start") or {}).get("dateTime")
+    end = (event.get("end") or {}).get("dateTime")
+    if not start or not end:
+        return None
+    return {
+        "external_id": event["id"],
+        "title": event.get("subject") or "(No Title)",
+        "description": event.get("bodyPreview"),
+        "location": (event.get("location") or {}).get("displayName"),
+        "start_time": parse_datetime(start),
+        "end_time": parse_datetime(end),
+        "all_day": event.get("isAllDay"),
+        "calendar_id": (event.get("organizer") or {}).get("emailAddress", {}).get("address"),
+        "attendees": str(event.get("attendees"))
+    }
+
+async def sync_outlook_mail(db: Session, user: User, on_progress: ProgressCallback = None) -> Dict[str, Any]:
+    """Sync the Outlook inbox through a messages delta query"""
+    initial_url = f"{GRAPH_API}/me/mailFolders/inbox/messages/delta?$select={MESSAGE_FIELDS}"
+    codec = body_codec_for(db, user.id)
+    return await delta_sync(
+        db, user, "mail", initial_url, EmailMessage,
+        lambda msg: _message_row(msg, codec), on_progress
+    )
+
+async def sync_outlook_calendar(db: Session, user: User, on_progress: ProgressCallback = None) -> Dict[str, Any]:
+    """Sync the Outlook calendar through a calendarView delta query.
+
+    A delta round is bound to the window it started with, so the window is
+    re-anchored with a full round once it has drifted by the past horizon.
+    """
+    state = get_sync_state(db, user.id, PROVIDER, "calendar")
+    horizon = timedelta(days=settings.CALENDAR_SYNC_PAST_DAYS)
+    if state.cursor and state.last_full_sync_at and state.last_full_sync_at < datetime.utcnow() - horizon:
+        state.cursor = None
+    now = datetime.utcnow()
+    window = (now - horizon, now + timedelta(days=settings.CALENDAR_SYNC_FUTURE_DAYS))
+    query = urlencode({
+        "startDateTime": window[0].strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "endDateTime": window[1].strftime("%Y-%m-%dT%H:%M:%SZ")
+    })
+    initial_url = f"{GRAPH_API}/me/calendarView/delta?{query}"
+    return await delta_sync(db, user, "calendar", initial_url, CalendarEvent, _event_row, on_progress, window)
@@ -0,0 +1,190 @@
+import asyncio
+import base64
+import json
+import logging
+import os
+import struct
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.push_subscription import PushSubscription
+
+# Record size advertised in the aes128gcm header (RFC 8188)
+RECORD_SIZE = 4096
+# Push services reject VAPID tokens valid for more than 24 hours
+VAPID_TOKEN_LIFETIME = 12 * 60 * 60
+
+def _b64url_encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _hkdf(salt: bytes, ikm: bytes, info: bytes, length: int) -> bytes:
+    return HKDF(algorithm=hashes.SHA256(), length=length, salt=salt, info=info).derive(ikm)
+
+def _raw_public_key(key: ec.EllipticCurvePrivateKey) -> bytes:
+    return key.public_key().public_bytes(
+        serialization.Encoding.X962,
+        serialization.PublicFormat.UncompressedPoint
+    )
+
+def load_vapid_private_key(value: str) -> ec.EllipticCurvePrivateKey:
+    """Load a VAPID key given as PEM or as the base64url raw scalar web-push tools print"""
+    if "BEGIN" in value:
+        return serialization.load_pem_private_key(value.encode(), password=None)
+    scalar = int.from_bytes(_b64url_decode(value.strip()), "big")
+    return ec.derive_private_key(scalar, ec.SECP256R1())
+
+def encrypt_payload(payload: bytes, p256dh: str, auth: str) -> bytes:
+    """Encrypt a push message body with aes128gcm as specified by RFC 8291"""
+    ua_public = _b64url_decode(p256dh)
+    auth_secret = _b64url_decode(auth)
+    ua_key = ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256R1(), ua_public)
+
+    as_private = ec.generate_private_key(ec.SECP256R1())
+    as_public = _raw_public_key(as_private)
+    shared_secret = as_private.exchange(ec.ECDH(), ua_key)
+
+    ikm = _hkdf(auth_secret, shared_secret, b"WebPush: info\x00" + ua_public + as_public, 32)
+    salt = os.urandom(16)
+    cek = _hkdf(salt, ikm, b"Content-Encoding: aes128gcm\x00", 16)
+    nonce = _hkdf(salt, ikm, b"Content-Encoding: nonce\x00", 12)
+
+    # Single record: payload followed by the last-record padding delimiter
+    ciphertext = AESGCM(cek).encrypt(nonce, payload + b"\x02", None)
+    header = salt + struct.pack("!IB", RECORD_SIZE, len(as_public)) + as_public
+    return header + ciphertext
+
+class WebPushSender:
+    """Deliver Web Push messages to stored PushSubscriptions.
+
+    Requests are VAPID-signed, encrypted per subscription and sent over one
+    pooled aiohttp session. Subscriptions the push service reports as gone
+    (404/410) are pruned. Endpoints are plain URLs, so a local HTTP server
+    can stand in for the push service in tests.
+    """
+
+    def __init__(
+        self,
+        private_key: Optional[str] = None,
+        subject: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        ttl: Optional[int] = None
+    ):
+        private_key = private_key or settings.VAPID_PRIVATE_KEY
+        self.subject = subject or settings.VAPID_SUBJECT
+        self.concurrency = concurrency or settings.WEB_PUSH_CONCURRENCY
+        self.ttl = ttl if ttl is not None else settings.WEB_PUSH_TTL
+        self._private_key = load_vapid_private_key(private_key) if private_key else None
+        self.public_key = _b64url_encode(_raw_public_key(self._private_key)) if self._private_key else None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._tokens: Dict[str, Tuple[str, float]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._private_key is not None
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        """Attach the event loop used by `schedule` for calls from worker threads"""
+        self._loop = loop
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=15)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _vapid_token(self, endpoint: str) -> str:
+        parsed = urlparse(endpoint)
+        audience = f"{parsed.scheme}://{parsed.netloc}"
+        cached = self._tokens.get(audience)
+        now = time.time()
+        if cached and cached[1] - now > 60 * 60:
+            return cached[0]
+        expires = int(now) + VAPID_TOKEN_LIFETIME
+        header = _b64url_encode(json.dumps({"typ": "JWT", "alg": "ES256"}).encode())
+        claims = _b64url_encode(json.dumps({"aud": audience, "exp": expires, "sub": self.subject}).encode())
+        signing_input = f"{header}.{claims}".encode()
+        r, s = decode_dss_signature(self._private_key.sign(signing_input, ec.ECDSA(hashes.SHA256())))
+        signature = _b64url_encode(r.to_bytes(32, "big") + s.to_bytes(32, "big"))
+        token = f"{header}.{claims}.{signature}"
+        self._tokens[audience] = (token, expires)
+        return token
+
+    async def send(self, subscription: PushSubscription, payload: Dict[str, Any]) -> int:
+        """Send one message and return the push service's HTTP status"""
+        body = encrypt_payload(json.dumps(payload).encode(), subscription.p256dh, subscription.auth)
+        headers = {
+            "Authorization": f"vapid t={self._vapid_token(subscription.endpoint)}, k={self.public_key}",
+            "Content-Encoding": "aes128gcm",
+            "Content-Type": "application/octet-stream",
+            "TTL": str(self.ttl),
+            "Urgency": "normal"
+        }
+        session = await self._get_session()
+        async with session.post(subscription.endpoint, data=body, headers=headers) as resp:
+            return resp.status
+
+    async def send_to_user(self, user_id: str, payload: Dict[str, Any]) -> Dict[str, int]:
+        """Fan a message out to every device of a user concurrently"""
+        results = {"sent": 0, "failed": 0, "pruned": 0}
+        if not self.enabled:
+            return results
+        db = SessionLocal()
+        try:
+            subscriptions = db.query(PushSubscription).filter(PushSubscription.user_id == user_id).all()
+            if not subscriptions:
+                return results
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def deliver(subscription):
+                async with semaphore:
+                    try:
+                        return await self.send(subscription, payload)
+                    except Exception as e:
+                        logging.error(f"Web push to {subscription.endpoint[:40]} failed: {e}")
+                        return None
+
+            statuses = await asyncio.gather(*(deliver(sub) for sub in subscriptions))
+            gone = []
+            for subscription, status in zip(subscriptions, statuses):
+                if status in (404, 410):
+                    gone.append(subscription.id)
+                elif status is not None and 200 <= status < 300:
+                    results["sent"] += 1
+                else:
+                    results["failed"] += 1
+            if gone:
+                db.query(PushSubscription).filter(PushSubscription.id.in_(gone)).delete(synchronize_session=False)
+                db.commit()
+                results["pruned"] = len(gone)
+            return results
+        finally:
+            db.close()
+
+    def schedule(self, user_id: str, payload: Dict[str, Any]):
+        """Queue a send on the bound event loop. Safe to call from any thread."""
+        if not self.enabled or self._loop is None or self._loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self.send_to_user(user_id, payload), self._loop)
+
+web_push_sender = WebPushSender()
@@ -0,0 +1,64 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+
+class RealtimeHub:
+    """Per-user fan-out of realtime events to connected clients.
+
+    Events are delivered in-process. `publish` is the only entry point
+    producers use, so a shared broker (Redis pub/sub, Postgres NOTIFY) can
+    later be slotted in by publishing to the broker and calling `_deliver`
+    from its listener in every process.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        """Attach the event loop that owns the subscriber queues"""
+        self._loop = loop
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+
+    def connection_count(self, user_id: Optional[str] = None) -> int:
+        if user_id is not None:
+            return len(self._subscribers.get(user_id, ()))
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def publish(self, user_id: str, event_type: str, data: Dict[str, Any]):
+        """Queue an event for every connection of a user. Safe to call from any thread."""
+        if user_id not in self._subscribers or self._loop is None or self._loop.is_closed():
+            return
+        message = {
+            "type": event_type,
+            "data": data,
+            "sent_at": datetime.utcnow().isoformat()
+        }
+        try:
+            self._loop.call_soon_threadsafe(self._deliver, user_id, message)
+        except RuntimeError as e:
+            logging.error(f"Realtime publish failed: {e}")
+
+    def _deliver(self, user_id: str, message: Dict[str, Any]):
+        for queue in list(self._subscribers.get(user_id, ())):
+            if queue.full():
+                # Slow consumer: drop its oldest event rather than block others
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+realtime_hub = RealtimeHub()
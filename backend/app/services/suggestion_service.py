@@ -0,0 +1,65 @@
+from sqlalchemy import update, case
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from collections import defaultdict
+from typing import Dict, Optional
+import logging
+
+from app.core.config import settings
+from app.models.suggestion import Suggestion
+from app.models.user import User
+from app.models.sync_change import record_changes
+
+def adjust_unread_count(db: Session, user_id: str, delta: int):
+    """Shift the user's unread suggestion counter; the caller commits"""
+    if not delta:
+        return
+    shifted = User.unread_suggestion_count + delta
+    db.execute(
+        update(User)
+        .where(User.id == user_id, User.unread_suggestion_count.isnot(None))
+        .values(unread_suggestion_count=case((shifted < 0, 0), else_=shifted))
+        .execution_options(synchronize_session=False)
+    )
+
+def get_unread_count(db: Session, user: User) -> int:
+    """Read the counter, rebuilding it once for rows that predate it"""
+    if user.unread_suggestion_count is None:
+        user.unread_suggestion_count = db.query(Suggestion).filter(
+            Suggestion.user_id == user.id,
+            Suggestion.is_read == False,
+            Suggestion.archived_at.is_(None)
+        ).count()
+        db.commit()
+    return user.unread_suggestion_count
+
+def apply_retention(db: Session, batch_size: int = 1000, now: Optional[datetime] = None) -> int:
+    """Delete or archive read suggestions older than SUGGESTION_RETENTION_DAYS"""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=settings.SUGGESTION_RETENTION_DAYS)
+    archive = settings.SUGGESTION_RETENTION_MODE == "archive"
+    processed = 0
+    while True:
+        rows = db.query(Suggestion.id, Suggestion.user_id).filter(
+            Suggestion.is_read == True,
+            Suggestion.archived_at.is_(None),
+            Suggestion.created_at < cutoff
+        ).limit(batch_size).all()
+        if not rows:
+            break
+        ids = [row.id for row in rows]
+        by_user: Dict[str, list] = defaultdict(list)
+        for row in rows:
+            by_user[row.user_id].append(row.id)
+        if archive:
+            db.query(Suggestion).filter(Suggestion.id.in_(ids)).update(
+                {Suggestion.archived_at: datetime.utcnow()}, synchronize_session=False
+            )
+        else:
+            db.query(Suggestion).filter(Suggestion.id.in_(ids)).delete(synchronize_session=False)
+        for user_id, user_ids in by_user.items():
+            record_changes(db, user_id, "suggestion", user_ids, op="delete")
+        db.commit()
+        processed += len(ids)
+    if processed:
+        logging.info(f"Suggestion retention: {'archived' if archive else 'deleted'} {processed} read suggestions")
+    return processed
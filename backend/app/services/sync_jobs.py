@@ -0,0 +1,83 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.models.user import User
+from app.services.body_storage import ensure_user_dictionary
+from app.services.calendar_sync import sync_google_calendar
+from app.services.email_priority import score_emails
+from app.services.gmail_sync import sync_gmail
+from app.services.job_queue import JobContext, job_handler
+from app.services.outlook_sync import sync_outlook_calendar, sync_outlook_mail
+from app.services.realtime import realtime_hub
+
+# (result key, is the account connected, sync coroutine)
+Provider = Tuple[str, Callable[[User], Any], Callable[..., Awaitable[Dict[str, Any]]]]
+
+EMAIL_PROVIDERS: List[Provider] = [
+    ("gmail", lambda user: user.google_access_token, sync_gmail),
+    ("outlook", lambda user: user.outlook_access_token, sync_outlook_mail),
+]
+
+CALENDAR_PROVIDERS: List[Provider] = [
+    ("google", lambda user: user.google_access_token, sync_google_calendar),
+    ("outlook", lambda user: user.outlook_access_token, sync_outlook_calendar),
+]
+
+async def _run_providers(job: JobContext, source: str, providers: List[Provider]) -> Dict[str, Any]:
+    """Sync every connected provider, reporting per-provider progress on the job.
+
+    A provider failure is recorded in the result; the job is only retried
+    when every connected provider failed.
+    """
+    db: Session = SessionLocal()
+    try:
+        user = db.get(User, job.user_id)
+        if user is None:
+            return {"skipped": "user not found"}
+        results: Dict[str, Any] = {}
+        progress: Dict[str, Any] = {}
+        attempted = failed = 0
+        for name, connected, sync in providers:
+            if not connected(user):
+                continue
+            attempted += 1
+
+            def on_progress(stats, name=name):
+                progress[name] = stats
+                job.report_progress(dict(progress))
+
+            try:
+                results[name] = await sync(db, user, on_progress)
+            except Exception as e:
+                db.rollback()
+                failed += 1
+                logging.error(f"{source} sync error ({name}) for user {user.id}: {e}")
+                results[f"{name}_error"] = str(e)
+        if source == "email" and failed < attempted:
+            try:
+                ensure_user_dictionary(db, user.id)
+            except Exception as e:
+                db.rollback()
+                logging.error(f"Error preparing body dictionary for user {user.id}: {e}")
+            try:
+                results["priority"] = score_emails(db, user)
+            except Exception as e:
+                db.rollback()
+                logging.error(f"Error scoring emails for user {user.id}: {e}")
+        realtime_hub.publish(user.id, "sync_complete", {"source": source, "results": results})
+        if attempted and failed == attempted:
+            raise RuntimeError(f"All {source} providers failed: {results}")
+        return results
+    finally:
+        db.close()
+
+@job_handler("email_sync")
+async def run_email_sync(job: JobContext):
+    return await _run_providers(job, "email", EMAIL_PROVIDERS)
+
+@job_handler("calendar_sync")
+async def run_calendar_sync(job: JobContext):
+    return await _run_providers(job, "calendar", CALENDAR_PROVIDERS)
@@ -0,0 +1,160 @@
+"""Compare database size and read latency of stored email bodies per codec.
+
+Usage (from backend/):  python -m benchmarks.bench_body_compression [--emails 5000]
+
+Each codec writes the same synthetic mailbox into a throwaway SQLite file,
+then times listing a page without bodies, opening single bodies and
+reading every body. zstd is included when zstandard is installed.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.core.compression import TextCodec, build_dictionary, zstandard
+from app.core.database import Base
+from app.models import EmailMessage, User
+from app.models import compression_dictionary
+from app.models.compression_dictionary import CompressionDictionary
+
+USER_ID = "bench-user"
+PAGE_SIZE = 50
+SINGLE_READS = 200
+
+TEMPLATES = [
+    ("<html><body><table width=\"100%\" cellpadding=\"0\" cellspacing=\"0\"><tr><td style=\"font-family:Arial,sans-serif;font-size:14px;color:#333333\">"
+     "<h1>{product} weekly digest</h1><p>Hi {name},</p><p>Here is what happened in your workspace this week: {count} new comments, "
+     "{other} tasks completed and {third} mentions.</p><p><a href=\"https://example.com/digest/{id}\">View the full digest</a></p>"
+     "<p style=\"font-size:11px;color:#999999\">You are receiving this email because you subscribed to {product} updates. "
+     "<a href=\"https://example.com/unsubscribe/{id}\">Unsubscribe</a> | <a href=\"https://example.com/preferences\">Preferences</a></p>"
+     "</td></tr></table></body></html>"),
+    ("<div dir=\"ltr\">Hi {name},<br><br>Thanks for the update on {product}. I went through the numbers and the {count} open items look fine, "
+     "but can we move the review to {day}? I will send the revised draft before then.<br><br>Best,<br>{sender}</div>"
+     "<br><div class=\"gmail_quote\"><div dir=\"ltr\" class=\"gmail_attr\">On {day}, {name} wrote:<br></div>"
+     "<blockquote class=\"gmail_quote\" style=\"margin:0px 0px 0px 0.8ex;border-left:1px solid rgb(204,204,204);padding-left:1ex\">"
+     "Here are the latest figures for {product}: {other} signups and {third} renewals.</blockquote></div>"),
+    ("<html><head><meta charset=\"utf-8\"></head><body><p>Your order #{id} has shipped.</p><table><tr><th>Item</th><th>Qty</th></tr>"
+     "<tr><td>{product}</td><td>{count}</td></tr></table><p>Track your package: <a href=\"https://example.com/track/{id}\">example.com/track/{id}</a></p>"
+     "<p>Questions? Reply to this email or visit our help center. Thank you for shopping with us.</p></body></html>"),
+]
+WORDS = ["Atlas", "Beacon", "Compass", "Delta", "Ember", "Falcon", "Granite", "Harbor"]
+NAMES = ["Alex", "Sam", "Jordan", "Taylor", "Morgan", "Casey"]
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+
+def synthetic_bodies(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    bodies = []
+    for i in range(count):
+        html = rng.choice(TEMPLATES).format(
+            product=rng.choice(WORDS), name=rng.choice(NAMES), sender=rng.choice(NAMES),
+            day=rng.choice(DAYS), id=rng.randint(10000, 99999),
+            count=rng.randint(1, 50), other=rng.randint(1, 50), third=rng.randint(1, 50)
+        )
+        plain = " ".join(html.replace("<", " <").split())[:400]
+        bodies.append((html, plain))
+    return bodies
+
+def codecs():
+    """(label, algorithm, with dictionary) for every codec to compare"""
+    yield "plain", "none", False
+    yield "zlib", "zlib", False
+    yield "zlib+dict", "zlib", True
+    if zstandard is not None:
+        yield "zstd", "zstd", False
+        yield "zstd+dict", "zstd", True
+
+def populate(db, bodies, algorithm, with_dictionary):
+    db.add(User(id=USER_ID, email="bench@example.com", name="Bench"))
+    codec = TextCodec(algorithm)
+    if with_dictionary:
+        samples = [value for pair in bodies[:500] for value in pair]
+        dictionary = CompressionDictionary(user_id=USER_ID, algorithm=algorithm, data=build_dictionary(samples, algorithm))
+        db.add(dictionary)
+        db.flush()
+        codec = TextCodec(algorithm, dictionary.id, dictionary.data)
+    base = datetime(2024, 1, 1)
+    db.bulk_insert_mappings(EmailMessage, [
+        {
+            "id": f"email-{i:06d}",
+            "user_id": USER_ID,
+            "provider": "google",
+            "external_id": f"msg-{i:06d}",
+            "subject": f"Subject {i}",
+            "sender": "sender@example.com",
+            "body_z": codec.encode(html),
+            "body_plain_z": codec.encode(plain),
+            "received_at": base + timedelta(minutes=i)
+        }
+        for i, (html, plain) in enumerate(bodies)
+    ])
+    db.commit()
+
+def timed(fn, repeat: int = 1) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+def run(bodies, algorithm, with_dictionary):
+    # Dictionary ids restart in every throwaway database
+    compression_dictionary._dictionaries.clear()
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        db = Session()
+        populate(db, bodies, algorithm, with_dictionary)
+        with engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+        size = os.path.getsize(path)
+        rng = random.Random(2)
+        ids = [f"email-{rng.randrange(len(bodies)):06d}" for _ in range(SINGLE_READS)]
+
+        def list_page():
+            db.expunge_all()
+            [email.subject for email in db.query(EmailMessage).order_by(EmailMessage.received_at.desc()).limit(PAGE_SIZE)]
+
+        def open_one():
+            db.expunge_all()
+            db.get(EmailMessage, ids[rng.randrange(SINGLE_READS)]).body
+
+        def read_all():
+            db.expunge_all()
+            total = 0
+            for email in db.query(EmailMessage).enable_eagerloads(False).yield_per(500):
+                total += len(email.body) + len(email.body_plain)
+            return total
+
+        result = {
+            "size": size,
+            "list": timed(list_page, 50),
+            "open": timed(open_one, SINGLE_READS),
+            "all": timed(read_all)
+        }
+        db.close()
+        return result
+    finally:
+        engine.dispose()
+        os.remove(path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--emails", type=int, default=5000)
+    args = parser.parse_args()
+
+    bodies = synthetic_bodies(args.emails)
+    print(f"{args.emails} emails")
+    print(f"{'codec':<12}{'db size (KB)':>14}{'list page (ms)':>16}{'open one (ms)':>15}{'read all (s)':>14}")
+    for label, algorithm, with_dictionary in codecs():
+        r = run(bodies, algorithm, with_dictionary)
+        print(f"{label:<12}{r['size'] / 1024:>14.0f}{r['list'] * 1000:>16.2f}{r['open'] * 1000:>15.3f}{r['all']:>14.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Compare per-item ORM upserts with bulk_upsert on synthetic provider items.
+
+Usage (from backend/):  python -m benchmarks.bench_bulk_upsert [--items 10000]
+
+Runs against a throwaway in-memory SQLite database: an initial import,
+a re-sync where nothing changed, and a re-sync where 10% of items changed.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.bulk import bulk_upsert
+from app.core.compression import TextCodec
+from app.core.database import Base
+from app.models import EmailMessage
+
+USER_ID = "bench-user"
+
+def synthetic_items(count: int, changed_ratio: float = 0.0, seed: int = 1):
+    rng = random.Random(seed)
+    codec = TextCodec()
+    base = datetime(2024, 1, 1)
+    items = []
+    for i in range(count):
+        changed = rng.random() < changed_ratio
+        items.append({
+            "external_id": f"msg-{i:06d}",
+            "thread_id": f"thread-{i // 4:06d}",
+            "subject": f"Subject {i}" + (" (edited)" if changed else ""),
+            "sender": f"sender{i % 97}@example.com",
+            "recipients": [f"me{i % 3}@example.com"],
+            "body_plain_z": codec.encode(f"Snippet for message {i}"),
+            "is_read": bool(i % 2) != changed,
+            "is_important": i % 11 == 0,
+            "is_starred": i % 17 == 0,
+            "received_at": base + timedelta(minutes=i)
+        })
+    return items
+
+def naive_upsert(db, items):
+    """The per-item pattern the sync routines used before"""
+    for item in items:
+        em = db.query(EmailMessage).filter_by(
+            user_id=USER_ID, provider="google", external_id=item["external_id"]
+        ).first()
+        if not em:
+            em = EmailMessage(user_id=USER_ID, provider="google", external_id=item["external_id"])
+            db.add(em)
+        for field, value in item.items():
+            setattr(em, field, value)
+    db.commit()
+
+def bulk(db, items):
+    bulk_upsert(db, EmailMessage, "external_id", USER_ID, items, scope={"provider": "google"})
+    db.commit()
+
+def run(strategy, count):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    timings = []
+    for label, ratio, seed in (("initial", 0.0, 1), ("unchanged", 0.0, 1), ("10% changed", 0.1, 2)):
+        items = synthetic_items(count, ratio, seed)
+        started = time.perf_counter()
+        strategy(db, items)
+        timings.append((label, time.perf_counter() - started))
+    db.close()
+    engine.dispose()
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=10000)
+    args = parser.parse_args()
+
+    results = {name: run(strategy, args.items) for name, strategy in (("per-item", naive_upsert), ("bulk", bulk))}
+    print(f"{args.items} items")
+    print(f"{'pass':<14}{'per-item (s)':>14}{'bulk (s)':>12}{'speedup':>10}")
+    for (label, naive), (_, fast) in zip(results["per-item"], results["bulk"]):
+        print(f"{label:<14}{naive:>14.3f}{fast:>12.3f}{naive / fast:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,22 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import uvicorn
 from contextlib import asynccontextmanager
+import asyncio
 import os
 from dotenv import load_dotenv
 
 from app.core.config import settings
 from app.core.database import init_db, get_db
-from app.api.routes import chat, tasks, calendar, email, voice, auth, search, health, agent, suggestions, notifications
+from app.api.routes import chat, tasks, calendar, email, voice, auth, search, health, agent, suggestions, notifications, sync, realtime, jobs
 from app.services.ai_service import AIService
 from app.services.voice_service import VoiceService
+from app.services.realtime import realtime_hub
+from app.services.push_service import web_push_sender
+from app.services.job_queue import job_queue_pool
+from app.services import ai_jobs  # registers AI job handlers
+from app.services import sync_jobs  # registers sync job handlers
+from app.services import gmail_sync, outlook_sync
+from app.services import mail_outbox  # registers the outbound mail job handler
 from app.core import ai_scheduler
 
 # Load environment variables
@@ -26,11 +34,21 @@ async def lifespan(app: FastAPI):
     # Initialize services
     app.state.ai_service = AIService()
     app.state.voice_service = VoiceService()
+    realtime_hub.bind_loop(asyncio.get_running_loop())
+    web_push_sender.bind_loop(asyncio.get_running_loop())
+    ai_scheduler.start()
+    job_queue_pool.start()
     
     yield
     
     # Shutdown
     print("🛑 Shutting down AI Assistant...")
+    await job_queue_pool.stop()
+    await ai_scheduler.stop()
+    await ai_jobs.close()
+    await web_push_sender.close()
+    await gmail_sync.close()
+    await outlook_sync.close()
 
 # Create FastAPI app
 app = FastAPI(
@@ -59,7 +77,11 @@ app.include_router(email.router, prefix="/api/email", tags=["Email"])
 app.include_router(search.router, prefix="/api", tags=["Search"])
 app.include_router(health.router, prefix="/api", tags=["Health"])
 app.include_router(agent.router, prefix="/api", tags=["Agent"])
+app.include_router(suggestions.router, prefix="/api", tags=["Suggestions"])
 app.include_router(notifications.router, prefix="/api", tags=["Notifications"])
+app.include_router(sync.router, prefix="/api", tags=["Sync"])
+app.include_router(realtime.router, prefix="/api", tags=["Realtime"])
+app.include_router(jobs.router, prefix="/api", tags=["Jobs"])
 
 @app.get("/")
 async def root():